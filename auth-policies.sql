@@ -19,4 +19,22 @@ CREATE POLICY "Authenticated users can read supplier_config" ON supplier_config
     FOR SELECT TO authenticated
     USING (true);
 
+-- Product matches - require authentication
+DROP POLICY IF EXISTS "Allow public read on product_matches" ON product_matches;
+CREATE POLICY "Authenticated users can read product_matches" ON product_matches
+    FOR SELECT TO authenticated
+    USING (true);
+
+-- Price history - require authentication
+DROP POLICY IF EXISTS "Allow public read on price_history" ON price_history;
+CREATE POLICY "Authenticated users can read price_history" ON price_history
+    FOR SELECT TO authenticated
+    USING (true);
+
+-- Insight summary - require authentication
+DROP POLICY IF EXISTS "Allow public read on insight_summary" ON insight_summary;
+CREATE POLICY "Authenticated users can read insight_summary" ON insight_summary
+    FOR SELECT TO authenticated
+    USING (true);
+
 -- Service role still has full access (no changes needed)
@@ -10,7 +10,7 @@ CREATE TABLE IF NOT EXISTS products (
     category TEXT,
     sku TEXT,
     description TEXT,
-    scraped_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+    scraped_at TIMESTAMPTZ NOT NULL DEFAULT NOW()  -- When the row was last inserted or changed
 );
 
 -- Index for fast queries
@@ -18,6 +18,117 @@ CREATE INDEX IF NOT EXISTS idx_products_source ON products(source);
 CREATE INDEX IF NOT EXISTS idx_products_name ON products(name);
 CREATE INDEX IF NOT EXISTS idx_products_scraped_at ON products(scraped_at);
 
+-- Stable product key used by the scraper's differential upsert.
+-- Drop duplicate (source, url) rows left by older scrapes before adding it.
+UPDATE products SET url = '' WHERE url IS NULL;
+DELETE FROM products a USING products b
+    WHERE a.source = b.source AND a.url = b.url AND a.id > b.id;
+ALTER TABLE products ALTER COLUMN url SET DEFAULT '';
+ALTER TABLE products ALTER COLUMN url SET NOT NULL;
+DO $$ BEGIN
+    ALTER TABLE products ADD CONSTRAINT products_source_url_key UNIQUE (source, url);
+EXCEPTION WHEN duplicate_table OR duplicate_object THEN NULL;
+END $$;
+
+-- Server-side product search. The scraper writes search_name with
+-- matching.search_text(): the name lowercased, symbols, bracketed text and
+-- " - " suffixes dropped, and stop words removed (normalize()/tokenize() in
+-- insights.html). product_search_text() applies the same rules in SQL, to
+-- backfill older rows and to normalize search queries.
+CREATE EXTENSION IF NOT EXISTS pg_trgm WITH SCHEMA extensions;
+
+ALTER TABLE products ADD COLUMN IF NOT EXISTS search_name TEXT;
+
+CREATE OR REPLACE FUNCTION product_search_text(name TEXT)
+RETURNS TEXT
+LANGUAGE plpgsql IMMUTABLE
+AS $$
+DECLARE
+    stop_words CONSTANT TEXT[] := ARRAY[
+        'the','a','an','and','or','for','of','in','with','to','is','by','at','on',
+        'all','new','free','per','mm','kg','ltr','litre','ml','pack','set','each',
+        'pair','x','gst','excl','inc'];
+    sep TEXT;
+    i INTEGER;
+BEGIN
+    name := regexp_replace(lower(coalesce(name, '')), '^\s+|\s+$', '', 'g');
+    name := regexp_replace(name, '[®™©�\x01-\x1f]', '', 'g');
+    name := regexp_replace(name, '\s*\([^)]*\)\s*', ' ', 'g');
+    FOREACH sep IN ARRAY ARRAY[' - ', ' – ', ' — '] LOOP
+        i := strpos(name, sep);
+        IF i > 11 THEN
+            name := left(name, i - 1);
+        END IF;
+    END LOOP;
+    RETURN (
+        SELECT coalesce(string_agg(tok, ' ' ORDER BY pos), '')
+        FROM (
+            SELECT m[1] AS tok, min(n) AS pos
+            FROM regexp_matches(name, '[a-z0-9]+', 'g') WITH ORDINALITY AS t(m, n)
+            WHERE m[1] <> ALL (stop_words)
+            GROUP BY m[1]
+        ) tokens
+    );
+END;
+$$;
+
+UPDATE products SET search_name = product_search_text(name) WHERE search_name IS NULL;
+
+ALTER TABLE products ADD COLUMN IF NOT EXISTS search_vector TSVECTOR
+    GENERATED ALWAYS AS (to_tsvector('simple', coalesce(search_name, ''))) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_products_search_vector ON products USING GIN (search_vector);
+CREATE INDEX IF NOT EXISTS idx_products_search_trgm ON products USING GIN (search_name extensions.gin_trgm_ops);
+
+-- Ranked, paginated product search:
+--   POST /rest/v1/rpc/search_products {"query": "oak hybrid", "sources": ["kevmor"], "page": 1}
+-- Matches every query token as a word prefix, or the whole query by trigram
+-- similarity (catching typos), and ranks by both. total_count is the number
+-- of matches across all pages. Runs with the caller's row level security.
+CREATE OR REPLACE FUNCTION search_products(
+    query TEXT,
+    sources TEXT[] DEFAULT NULL,
+    page INTEGER DEFAULT 1,
+    page_size INTEGER DEFAULT 50
+)
+RETURNS TABLE (
+    id BIGINT,
+    source TEXT,
+    name TEXT,
+    price NUMERIC,
+    price_display TEXT,
+    url TEXT,
+    image TEXT,
+    category TEXT,
+    sku TEXT,
+    rank REAL,
+    total_count BIGINT
+)
+LANGUAGE sql STABLE
+SET search_path = public, extensions
+AS $$
+    WITH q AS (
+        SELECT terms, to_tsquery('simple', (
+                   SELECT string_agg(tok || ':*', ' & ')
+                   FROM unnest(string_to_array(terms, ' ')) AS tok
+               )) AS ts
+        FROM product_search_text(query) AS terms
+    ),
+    bounds AS (
+        SELECT LEAST(GREATEST(page_size, 1), 200) AS size
+    )
+    SELECT p.id, p.source, p.name, p.price, p.price_display, p.url, p.image, p.category, p.sku,
+           (ts_rank(p.search_vector, q.ts) + similarity(p.search_name, q.terms))::REAL AS rank,
+           count(*) OVER () AS total_count
+    FROM products p, q
+    WHERE q.terms <> ''
+      AND (p.search_vector @@ q.ts OR p.search_name % q.terms)
+      AND (sources IS NULL OR p.source = ANY (sources))
+    ORDER BY rank DESC, p.name, p.id
+    LIMIT (SELECT size FROM bounds)
+    OFFSET (GREATEST(page, 1) - 1) * (SELECT size FROM bounds);
+$$;
+
 -- Scrape log table
 CREATE TABLE IF NOT EXISTS scrape_log (
     id BIGSERIAL PRIMARY KEY,
@@ -29,6 +140,28 @@ CREATE TABLE IF NOT EXISTS scrape_log (
     status TEXT NOT NULL DEFAULT 'success'
 );
 
+-- Per-run write counts from the differential upsert
+ALTER TABLE scrape_log ADD COLUMN IF NOT EXISTS inserted_count INTEGER;
+ALTER TABLE scrape_log ADD COLUMN IF NOT EXISTS updated_count INTEGER;
+ALTER TABLE scrape_log ADD COLUMN IF NOT EXISTS removed_count INTEGER;
+ALTER TABLE scrape_log ADD COLUMN IF NOT EXISTS sync_mode TEXT;  -- 'full', 'incremental' or 'partial' (NULL: full, before incremental sync)
+
+-- Per-run telemetry (timers are summed across the scraper's worker threads)
+ALTER TABLE scrape_log ADD COLUMN IF NOT EXISTS request_count INTEGER;
+ALTER TABLE scrape_log ADD COLUMN IF NOT EXISTS bytes_downloaded BIGINT;
+ALTER TABLE scrape_log ADD COLUMN IF NOT EXISTS status_counts JSONB;       -- {"200": 41, "304": 12, ...}
+ALTER TABLE scrape_log ADD COLUMN IF NOT EXISTS session_resets INTEGER;    -- WooCommerce session re-establishments
+ALTER TABLE scrape_log ADD COLUMN IF NOT EXISTS retry_count INTEGER;       -- Requests retried after an error, 429 or 5xx
+ALTER TABLE scrape_log ADD COLUMN IF NOT EXISTS wall_seconds NUMERIC(10,2);
+ALTER TABLE scrape_log ADD COLUMN IF NOT EXISTS throttle_seconds NUMERIC(10,2); -- Waiting on the host rate limit
+ALTER TABLE scrape_log ADD COLUMN IF NOT EXISTS fetch_seconds NUMERIC(10,2);
+ALTER TABLE scrape_log ADD COLUMN IF NOT EXISTS parse_seconds NUMERIC(10,2);
+ALTER TABLE scrape_log ADD COLUMN IF NOT EXISTS write_seconds NUMERIC(10,2);
+ALTER TABLE scrape_log ADD COLUMN IF NOT EXISTS category_seconds JSONB;    -- {"Hybrid Flooring": 41.2, ...} for suppliers crawled by category
+
+-- Run history per supplier, read by incremental sync and the scheduler
+CREATE INDEX IF NOT EXISTS idx_scrape_log_source ON scrape_log(source, started_at);
+
 -- Supplier configuration table
 CREATE TABLE IF NOT EXISTS supplier_config (
     id BIGSERIAL PRIMARY KEY,
@@ -43,10 +176,197 @@ CREATE TABLE IF NOT EXISTS supplier_config (
     updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
 );
 
+-- Per-supplier fetch limits (safe to re-run on an existing database).
+-- NULL means use the scraper's default for that supplier.
+ALTER TABLE supplier_config ADD COLUMN IF NOT EXISTS page_concurrency INTEGER;        -- Pages (Kevmor: categories) fetched in parallel
+ALTER TABLE supplier_config ADD COLUMN IF NOT EXISTS requests_per_second NUMERIC(6,2); -- Token bucket rate for the supplier's host
+
+-- Scheduling bounds for scrape.py --schedule (NULL: 20 and 168 hours).
+-- Between them a supplier is scraped once its observed change rate makes it due.
+ALTER TABLE supplier_config ADD COLUMN IF NOT EXISTS min_interval_hours NUMERIC(6,1);  -- Never scraped more often than this
+ALTER TABLE supplier_config ADD COLUMN IF NOT EXISTS max_interval_hours NUMERIC(6,1);  -- Always scraped (in full) at least this often
+
+-- One of Gibbon's own catalogs: insights.html compares it with the
+-- competitors (every supplier that isn't home) rather than counting it as one
+ALTER TABLE supplier_config ADD COLUMN IF NOT EXISTS home BOOLEAN NOT NULL DEFAULT false;
+UPDATE supplier_config SET home = true WHERE key IN ('gibbon', 'gibbon_web', 'gibbon_csv') AND NOT home;
+
+-- Append-only price history: one row per product each time its price or
+-- price_display changes (plus one when the product is first seen)
+CREATE TABLE IF NOT EXISTS price_history (
+    id BIGSERIAL PRIMARY KEY,
+    source TEXT NOT NULL,
+    url TEXT NOT NULL,
+    price NUMERIC(10,2),
+    price_display TEXT,
+    observed_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_price_history_product ON price_history(source, url, observed_at);
+CREATE INDEX IF NOT EXISTS idx_price_history_observed_at ON price_history(observed_at);
+
+-- The scraper keys products by their canonical URL (scraper/product.py
+-- canonical_url): no fragment, no utm_*/fbclid/gclid/mc_cid/mc_eid query
+-- parameters, no default port, and a lowercase scheme and host. This gives
+-- the same result in SQL, to migrate URLs stored before that.
+CREATE OR REPLACE FUNCTION canonical_product_url(url TEXT)
+RETURNS TEXT
+LANGUAGE plpgsql IMMUTABLE
+AS $$
+DECLARE
+    parts TEXT[];
+    prefix TEXT := '';
+    rest TEXT;
+    host TEXT;
+    query TEXT := '';
+BEGIN
+    IF url IS NULL OR url = '' THEN
+        RETURN '';
+    END IF;
+    rest := split_part(url, '#', 1);
+    parts := regexp_match(rest, '^(?:([A-Za-z][A-Za-z0-9+.-]*):)?//([^/?]*)(.*)$');
+    IF parts IS NOT NULL THEN
+        host := lower(parts[2]);
+        IF (lower(parts[1]) = 'http' AND host LIKE '%:80') THEN
+            host := left(host, -3);
+        ELSIF (lower(parts[1]) = 'https' AND host LIKE '%:443') THEN
+            host := left(host, -4);
+        END IF;
+        prefix := coalesce(lower(parts[1]) || ':', '') || '//' || host;
+        rest := parts[3];
+    END IF;
+    IF strpos(rest, '?') > 0 THEN
+        SELECT coalesce(string_agg(param, '&' ORDER BY n), '') INTO query
+        FROM unnest(string_to_array(substr(rest, strpos(rest, '?') + 1), '&')) WITH ORDINALITY AS p(param, n)
+        WHERE NOT lower(split_part(param, '=', 1)) ~ '^(utm_|fbclid|gclid|mc_cid|mc_eid)';
+        rest := left(rest, strpos(rest, '?') - 1);
+    END IF;
+    RETURN prefix || rest || CASE WHEN query <> '' THEN '?' || query ELSE '' END;
+END;
+$$;
+
+-- Migrate stored URLs to that key (a no-op once done). Of products whose
+-- URLs become the same, the one already under the canonical URL (else the
+-- oldest) is kept; the price history of all of them continues under it.
+DELETE FROM products WHERE id IN (
+    SELECT id FROM (
+        SELECT id, row_number() OVER (
+            PARTITION BY source, canonical_product_url(url)
+            ORDER BY url = canonical_product_url(url) DESC, id
+        ) AS n
+        FROM products
+    ) ranked
+    WHERE n > 1
+);
+UPDATE products SET url = canonical_product_url(url) WHERE url <> canonical_product_url(url);
+UPDATE price_history SET url = canonical_product_url(url) WHERE url <> canonical_product_url(url);
+
+-- Seed history with the current price of products that have none yet
+INSERT INTO price_history (source, url, price, price_display, observed_at)
+SELECT p.source, p.url, p.price, p.price_display, p.scraped_at
+FROM products p
+WHERE NOT EXISTS (
+    SELECT 1 FROM price_history h WHERE h.source = p.source AND h.url = p.url
+);
+
+-- Staging for the scraper's direct Postgres store (scraper/storage.py). Each
+-- batch is COPYed here during a scrape, and merged into products and
+-- price_history in one transaction when the supplier finishes. Unlogged:
+-- rows lost in a database crash are simply picked up by the next run.
+CREATE UNLOGGED TABLE IF NOT EXISTS products_staging (
+    id BIGSERIAL PRIMARY KEY,
+    source TEXT NOT NULL,
+    url TEXT NOT NULL,
+    name TEXT NOT NULL,
+    price NUMERIC(10,2),
+    price_display TEXT,
+    image TEXT,
+    category TEXT,
+    sku TEXT,
+    description TEXT,
+    search_name TEXT,
+    scraped_at TIMESTAMPTZ NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_products_staging_source ON products_staging(source, url);
+
+CREATE UNLOGGED TABLE IF NOT EXISTS price_history_staging (
+    id BIGSERIAL PRIMARY KEY,
+    source TEXT NOT NULL,
+    url TEXT NOT NULL,
+    price NUMERIC(10,2),
+    price_display TEXT,
+    observed_at TIMESTAMPTZ NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_price_history_staging_source ON price_history_staging(source, url);
+
+-- Rows staged by a scrape from before canonical URLs
+UPDATE products_staging SET url = canonical_product_url(url) WHERE url <> canonical_product_url(url);
+UPDATE price_history_staging SET url = canonical_product_url(url) WHERE url <> canonical_product_url(url);
+
+-- Cross-supplier match groups, recomputed by the scraper after each run
+CREATE TABLE IF NOT EXISTS product_matches (
+    id BIGSERIAL PRIMARY KEY,
+    group_id INTEGER NOT NULL,
+    position SMALLINT NOT NULL,     -- 0 = product the group was built around
+    source TEXT NOT NULL,
+    product_id BIGINT NOT NULL REFERENCES products(id) ON DELETE CASCADE,
+    score NUMERIC(4,3) NOT NULL,    -- Token similarity to the position-0 product
+    computed_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_product_matches_group ON product_matches(group_id, position);
+CREATE INDEX IF NOT EXISTS idx_product_matches_product ON product_matches(product_id);
+
+-- Replace every product_matches row in one transaction, so readers see the
+-- old groups or the new ones, never an empty or half-written table:
+--   POST /rest/v1/rpc/replace_product_matches {"matches": [{"group_id": 1, ...}, ...]}
+-- Returns the number of rows written.
+CREATE OR REPLACE FUNCTION replace_product_matches(matches JSONB)
+RETURNS INTEGER
+LANGUAGE plpgsql
+SET search_path = public
+AS $$
+DECLARE
+    written INTEGER;
+BEGIN
+    DELETE FROM product_matches WHERE group_id >= 0;
+    INSERT INTO product_matches (group_id, position, source, product_id, score)
+    SELECT m.group_id, m.position, m.source, m.product_id, m.score
+    FROM jsonb_to_recordset(matches)
+         AS m(group_id INTEGER, position SMALLINT, source TEXT, product_id BIGINT, score NUMERIC);
+    GET DIAGNOSTICS written = ROW_COUNT;
+    RETURN written;
+END;
+$$;
+
+-- Per-supplier price competitiveness and coverage, recomputed by the scraper
+-- after each run (scraper/insights.py) so insights.html needn't derive it
+CREATE TABLE IF NOT EXISTS insight_summary (
+    source TEXT PRIMARY KEY,
+    product_count INTEGER NOT NULL,     -- Excluding replacement parts
+    compared INTEGER NOT NULL,          -- Priced products in a match group with a priced rival
+    cheapest INTEGER NOT NULL,
+    most_expensive INTEGER NOT NULL,
+    middle INTEGER NOT NULL,
+    price_advantages JSONB NOT NULL DEFAULT '[]',     -- [{product_id, name, price, other_price, diff}]
+    price_disadvantages JSONB NOT NULL DEFAULT '[]',
+    covered INTEGER,                    -- Competitors (suppliers not home): products Gibbon also sells
+    gaps INTEGER,                       -- Competitors: products Gibbon is missing
+    gap_product_ids JSONB NOT NULL DEFAULT '[]',
+    unique_count INTEGER,               -- Gibbon: products no competitor sells
+    computed_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
 -- Enable Row Level Security
 ALTER TABLE products ENABLE ROW LEVEL SECURITY;
 ALTER TABLE scrape_log ENABLE ROW LEVEL SECURITY;
 ALTER TABLE supplier_config ENABLE ROW LEVEL SECURITY;
+ALTER TABLE product_matches ENABLE ROW LEVEL SECURITY;
+ALTER TABLE price_history ENABLE ROW LEVEL SECURITY;
+ALTER TABLE insight_summary ENABLE ROW LEVEL SECURITY;
+-- No policies: only the scraper's direct connection uses the staging tables
+ALTER TABLE products_staging ENABLE ROW LEVEL SECURITY;
+ALTER TABLE price_history_staging ENABLE ROW LEVEL SECURITY;
 
 -- Allow public read access (anon key)
 DROP POLICY IF EXISTS "Allow public read on products" ON products;
@@ -61,6 +381,18 @@ DROP POLICY IF EXISTS "Allow public read on supplier_config" ON supplier_config;
 CREATE POLICY "Allow public read on supplier_config" ON supplier_config
     FOR SELECT USING (true);
 
+DROP POLICY IF EXISTS "Allow public read on product_matches" ON product_matches;
+CREATE POLICY "Allow public read on product_matches" ON product_matches
+    FOR SELECT USING (true);
+
+DROP POLICY IF EXISTS "Allow public read on price_history" ON price_history;
+CREATE POLICY "Allow public read on price_history" ON price_history
+    FOR SELECT USING (true);
+
+DROP POLICY IF EXISTS "Allow public read on insight_summary" ON insight_summary;
+CREATE POLICY "Allow public read on insight_summary" ON insight_summary
+    FOR SELECT USING (true);
+
 -- Allow service_role full access (for scraper and API)
 DROP POLICY IF EXISTS "Allow service write on products" ON products;
 CREATE POLICY "Allow service write on products" ON products
@@ -73,3 +405,26 @@ CREATE POLICY "Allow service write on scrape_log" ON scrape_log
 DROP POLICY IF EXISTS "Allow service write on supplier_config" ON supplier_config;
 CREATE POLICY "Allow service write on supplier_config" ON supplier_config
     FOR ALL USING (true) WITH CHECK (true);
+
+DROP POLICY IF EXISTS "Allow service write on product_matches" ON product_matches;
+CREATE POLICY "Allow service write on product_matches" ON product_matches
+    FOR ALL USING (true) WITH CHECK (true);
+
+DROP POLICY IF EXISTS "Allow service write on price_history" ON price_history;
+CREATE POLICY "Allow service write on price_history" ON price_history
+    FOR ALL USING (true) WITH CHECK (true);
+
+DROP POLICY IF EXISTS "Allow service write on insight_summary" ON insight_summary;
+CREATE POLICY "Allow service write on insight_summary" ON insight_summary
+    FOR ALL USING (true) WITH CHECK (true);
+
+-- Catalog snapshots published by the scraper (see scraper/snapshot.py).
+-- Private bucket: the dashboard reads it with the signed-in user's token.
+INSERT INTO storage.buckets (id, name, public)
+VALUES ('snapshots', 'snapshots', false)
+ON CONFLICT (id) DO NOTHING;
+
+DROP POLICY IF EXISTS "Authenticated users can read snapshots" ON storage.objects;
+CREATE POLICY "Authenticated users can read snapshots" ON storage.objects
+    FOR SELECT TO authenticated
+    USING (bucket_id = 'snapshots');
@@ -0,0 +1,75 @@
+"""
+Micro-benchmark for the scraper's HTML parsing paths.
+
+Times Kevmor category page parsing with each BeautifulSoup backend (full tree
+vs. SoupStrainer-limited) and description stripping with BeautifulSoup vs.
+html_to_text, and prints products parsed per second for each.
+
+Usage:
+    python bench_parsers.py                   # synthetic 48-product category page
+    python bench_parsers.py --html page.html  # a saved Kevmor category page
+    python bench_parsers.py --repeat 50
+"""
+
+import sys
+import time
+import argparse
+import importlib.util
+from types import SimpleNamespace
+
+from bs4 import BeautifulSoup
+
+import replay
+import scrape
+from replay import DESCRIPTION
+
+
+def synthetic_page(products: int = 48) -> str:
+    return replay.kevmor_page(range(products))
+
+
+def bench(fn, repeat: int) -> float:
+    """Best-of-3 seconds for `repeat` calls of fn."""
+    best = float("inf")
+    for _ in range(3):
+        t0 = time.perf_counter()
+        for _ in range(repeat):
+            fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark scraper HTML parsing.")
+    parser.add_argument("--html", help="saved Kevmor category page to parse")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    html = open(args.html, encoding="utf-8").read() if args.html else synthetic_page()
+    page = SimpleNamespace(text=html)
+    per_page = len(scrape._parse_kevmor_page(page, "Bench", "html.parser", False)["products"])
+    if not per_page:
+        sys.exit("No article.product-miniature products found in the page")
+
+    backends = ["html.parser"]
+    if importlib.util.find_spec("lxml"):
+        backends.append("lxml")
+
+    print(f"Kevmor category page ({len(html) / 1024:.0f} KB, {per_page} products), "
+          f"default backend: {scrape.HTML_PARSER}")
+    for backend in backends:
+        for label, strained in (("full tree", False), ("strained", True)):
+            secs = bench(lambda backend=backend, strained=strained:
+                         scrape._parse_kevmor_page(page, "Bench", backend, strained), args.repeat)
+            print(f"  {backend:12s} {label:10s} {per_page * args.repeat / secs:10,.0f} products/s")
+
+    print(f"Description stripping ({len(DESCRIPTION)} chars)")
+    n = args.repeat * 100
+    secs = bench(lambda: BeautifulSoup(DESCRIPTION, "html.parser").get_text(strip=True), n)
+    print(f"  {'BeautifulSoup':23s} {n / secs:10,.0f} products/s")
+    secs = bench(lambda: scrape.html_to_text(DESCRIPTION), n)
+    print(f"  {'html_to_text':23s} {n / secs:10,.0f} products/s")
+
+
+if __name__ == "__main__":
+    main()
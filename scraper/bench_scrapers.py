@@ -0,0 +1,276 @@
+"""
+Throughput benchmark for the scrapers and the product writer, fully offline.
+
+Runs _scrape_woocommerce, _scrape_shopify and scrape_kevmor against generated
+(or recorded, see replay.py) fixtures on a local stub server, and
+upsert_products through each storage backend (storage.py): the REST store
+against the in-memory Supabase stand-in (memdb.py), a temporary SQLite file
+and, with --database-url, a real Postgres database. Reports
+pages/s, products/s, peak Python memory and wall time for each, and the
+memory --products scraped products take while held as the writer's rows. With
+--baseline, exits non-zero when a case's products/s falls more than
+--tolerance below the baseline run, so regressions fail CI.
+
+Usage:
+    python bench_scrapers.py                          # generated fixtures, 20 ms latency
+    python bench_scrapers.py --pages 50 --latency 0.1 --error-rate 0.02
+    python bench_scrapers.py --fixtures fixtures/     # recorded fixtures (*.json, *.json.gz)
+    python bench_scrapers.py --json results.json --baseline baseline.json
+    python bench_scrapers.py --database-url postgresql://localhost/bench  # adds the Postgres store
+"""
+
+import os
+import sys
+import json
+import glob
+import time
+import logging
+import argparse
+import tempfile
+import tracemalloc
+from datetime import datetime, timezone
+
+import replay
+import scrape
+import storage
+from httpcache import HttpCache
+from memdb import MemorySupabase
+
+
+# Set from --no-memory; tracing allocations slows parse-heavy cases noticeably
+TRACE_MEMORY = True
+
+
+def measure(name: str, run) -> dict:
+    """Run `run(stats)`, which returns the number of products handled, and
+    collect its throughput figures."""
+    stats = scrape.ScrapeStats(name)
+    if TRACE_MEMORY:
+        tracemalloc.start()
+    t0 = time.perf_counter()
+    products = run(stats)
+    wall = time.perf_counter() - t0
+    peak = 0
+    if TRACE_MEMORY:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return {
+        "case": name,
+        "pages": stats.requests,
+        "products": products,
+        "wall_seconds": round(wall, 3),
+        "pages_per_second": round(stats.requests / wall, 1) if wall else 0.0,
+        "products_per_second": round(products / wall, 1) if wall else 0.0,
+        "peak_memory_mb": round(peak / 2**20, 2),
+        "retries": stats.retries,
+    }
+
+
+def consume(batches) -> int:
+    """Drain a scraper generator the way _run_supplier would, keeping nothing."""
+    return sum(len(batch) for _, batch in batches)
+
+
+def scraper_case(kind: str, base_url: str, fixture: replay.Fixture, args):
+    opts = {"concurrency": args.concurrency, "rate": args.rate}
+    if kind == "woocommerce":
+        return lambda stats: consume(scrape._scrape_woocommerce(base_url, "bench", stats=stats, **opts))
+    if kind == "shopify":
+        return lambda stats: consume(scrape._scrape_shopify(base_url, "bench", stats=stats, **opts))
+    categories = fixture.category_urls(base_url)
+    return lambda stats: consume(scrape.scrape_kevmor(stats=stats, categories=categories, **opts))
+
+
+def synthetic_products(n: int, changed_every: int = 0) -> list:
+    """`n` products as the scrapers yield them."""
+    return [scrape.Product.from_dict(p) for p in synthetic_dicts(n, changed_every)]
+
+
+def synthetic_dicts(n: int, changed_every: int = 0) -> list:
+    """`n` products as parsed from a page (or read back from the HTTP cache)."""
+    products = []
+    for i in range(n):
+        price = 19.95 + i % 500
+        if changed_every and i % changed_every == 0:
+            price += 1
+        products.append({
+            "source": "bench",
+            "name": f"Bench Product {i}",
+            "price": round(price, 2),
+            "price_display": f"${price:,.2f} GST excl.",
+            "url": f"https://bench.example/product/{i}/",
+            "image": f"https://bench.example/uploads/{i}-300x300.jpg",
+            "category": f"Category {i % 40}, Timber",
+            "sku": f"B-{i:06d}",
+            "description": replay.DESCRIPTION[:200],
+        })
+    return products
+
+
+def upsert_cases(n: int, store: storage.Store, label: str = "upsert") -> list:
+    """Initial load, an unchanged re-run and a re-run with 10% price changes,
+    written through `store`."""
+    scrape.set_store(store)
+    initial = synthetic_products(n)
+    repriced = synthetic_products(n, changed_every=10)
+
+    def write(products):
+        def run(stats):
+            scrape.upsert_products("bench", products, datetime.now(timezone.utc), stats)
+            return len(products)
+        return run
+
+    try:
+        return [
+            measure(f"{label} (insert)", write(initial)),
+            measure(f"{label} (unchanged)", write(initial)),
+            measure(f"{label} (10% repriced)", write(repriced)),
+        ]
+    finally:
+        store.close()
+
+
+def held_case(n: int, page_size: int = 100) -> dict:
+    """Memory of `n` products held at once, as the writer's rows: parsed a
+    page at a time from JSON, so every string is a fresh copy as it is when
+    the HTTP cache replays a page."""
+    pages = [json.dumps(synthetic_dicts(n)[i:i + page_size]) for i in range(0, n, page_size)]
+    now = datetime.now(timezone.utc).isoformat()
+
+    def run(stats):
+        held = []
+        for page in pages:
+            held.extend(scrape.Product.from_dict(p) for p in json.loads(page))
+        for row in held:
+            row.search_name = scrape.matching.search_text(row.name)
+            row.scraped_at = now
+        return len(held)
+
+    return measure("products held", run)
+
+
+def clear_postgres(database_url: str):
+    """Remove what an earlier benchmark left in the database."""
+    import psycopg
+
+    with psycopg.connect(database_url) as conn:
+        for table in ("products", "price_history", "scrape_log", "products_staging", "price_history_staging"):
+            conn.execute(f"DELETE FROM {table} WHERE source = 'bench'")
+
+
+def store_cases(args, tmp: str) -> list:
+    """upsert_cases for each storage backend; the REST store keeps the plain
+    "upsert" case names so older baselines still compare."""
+    scrape.set_supabase(MemorySupabase())
+    results = upsert_cases(args.products, storage.RestStore(scrape.get_supabase))
+    results += upsert_cases(args.products, storage.SqliteStore(os.path.join(tmp, "bench.sqlite")),
+                            "sqlite upsert")
+    if args.database_url:
+        clear_postgres(args.database_url)
+        results += upsert_cases(args.products, storage.PostgresStore(args.database_url), "postgres upsert")
+    return results
+
+
+def load_fixtures(args) -> dict:
+    """{name: fixture}, recorded from --fixtures or generated."""
+    if args.fixtures:
+        paths = sorted(glob.glob(os.path.join(args.fixtures, "*.json")) +
+                       glob.glob(os.path.join(args.fixtures, "*.json.gz")))
+        if not paths:
+            sys.exit(f"No fixtures in {args.fixtures}")
+        return {os.path.basename(p).split(".")[0]: replay.Fixture.load(p) for p in paths}
+    return {
+        "woocommerce": replay.generate("woocommerce", args.pages),
+        "shopify": replay.generate("shopify", args.pages),
+        "kevmor": replay.generate("kevmor", 3, categories=args.pages),
+    }
+
+
+def print_results(results: list):
+    header = (f"{'case':<32}{'pages':>7}{'products':>10}{'wall s':>9}{'pages/s':>10}"
+              f"{'products/s':>12}{'peak MB':>9}{'retries':>9}")
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(f"{r['case']:<32}{r['pages']:>7}{r['products']:>10}{r['wall_seconds']:>9.2f}"
+              f"{r['pages_per_second']:>10.1f}{r['products_per_second']:>12,.0f}"
+              f"{r['peak_memory_mb']:>9.1f}{r['retries']:>9}")
+
+
+def regressions(results: list, baseline: list, tolerance: float) -> list:
+    """Cases whose products/s fell more than `tolerance` below the baseline."""
+    previous = {r["case"]: r for r in baseline}
+    slower = []
+    for r in results:
+        base = previous.get(r["case"])
+        if base and r["products_per_second"] < base["products_per_second"] * (1 - tolerance):
+            slower.append(f"{r['case']}: {r['products_per_second']:,.0f} products/s "
+                          f"(baseline {base['products_per_second']:,.0f})")
+    return slower
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the scrapers offline.")
+    parser.add_argument("--fixtures", help="directory of recorded fixtures (default: generated)")
+    parser.add_argument("--pages", type=int, default=20,
+                        help="pages per generated fixture (Kevmor: categories of 3 pages)")
+    parser.add_argument("--products", type=int, default=10000, help="products per upsert case")
+    parser.add_argument("--database-url", default=os.environ.get("BENCH_DATABASE_URL"),
+                        help="Postgres database with schema.sql applied, for the postgres store "
+                             "cases; its 'bench' rows are replaced (default BENCH_DATABASE_URL)")
+    parser.add_argument("--latency", type=float, default=0.02, help="stub response latency, seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="extra random latency, seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests failing")
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--retry-after", type=float, help="Retry-After sent with injected errors")
+    parser.add_argument("--concurrency", type=int, default=scrape.DEFAULT_PAGE_CONCURRENCY,
+                        help="pages (Kevmor: categories) in flight per scraper")
+    parser.add_argument("--rate", type=float, default=1000.0, help="requests/sec allowed per host")
+    parser.add_argument("--cache", action="store_true",
+                        help="run each scraper twice through a fresh HTTP cache (cold, then warm)")
+    parser.add_argument("--no-memory", action="store_true",
+                        help="skip peak memory tracing, which slows the timed runs")
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--baseline", help="results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed products/s drop against the baseline (default 0.25)")
+    parser.add_argument("--verbose", action="store_true", help="show the scrapers' own logging")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logging.getLogger("scrape").setLevel(logging.WARNING)
+    global TRACE_MEMORY
+    TRACE_MEMORY = not args.no_memory
+
+    fixtures = load_fixtures(args)
+    results = []
+    with replay.StubServer(fixtures, args.latency, args.jitter, args.error_rate, args.error_status,
+                           args.retry_after) as stub, tempfile.TemporaryDirectory() as tmp:
+        for name, fixture in fixtures.items():
+            run = scraper_case(fixture.kind, stub.url(name), fixture, args)
+            if args.cache:
+                scrape.http_cache = HttpCache(os.path.join(tmp, f"{name}.sqlite"))
+                results.append(measure(f"{name} (cold cache)", run))
+                results.append(measure(f"{name} (warm cache)", run))
+                scrape.http_cache.close()
+                scrape.http_cache = None
+            else:
+                results.append(measure(name, run))
+        results.extend(store_cases(args, tmp))
+        if TRACE_MEMORY:
+            results.append(held_case(args.products))
+
+    print_results(results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=1)
+    if args.baseline:
+        with open(args.baseline) as f:
+            slower = regressions(results, json.load(f), args.tolerance)
+        if slower:
+            print("Regressions:\n  " + "\n  ".join(slower))
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
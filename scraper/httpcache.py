@@ -0,0 +1,214 @@
+"""
+Persistent HTTP cache for the supplier scrapers.
+
+Responses are stored in a SQLite file keyed by request URL. On the next run
+the cached ETag / Last-Modified validators are sent as a conditional GET, so
+an unchanged page costs a 304 instead of a full download. Each cached body is
+also hashed, and callers can store what they parsed from it: when a page comes
+back with the same content hash, the parsed result is reused and the page is
+not parsed again.
+
+Usage:
+    cache = HttpCache("scraper/.http_cache.sqlite")
+    r = cache.get(session, url, timeout=30)
+    products = cache.parse(r, parse_page)
+    ...
+    cache.evict(max_bytes=200 * 2**20, max_age_days=14)
+    cache.close()
+"""
+
+import json
+import sqlite3
+import hashlib
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Response headers worth keeping with a cached body. A 304 usually omits
+# them, and the scrapers read X-WP-TotalPages to know when to stop.
+KEPT_HEADERS = ("Content-Type", "ETag", "Last-Modified", "X-WP-Total", "X-WP-TotalPages")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    url TEXT PRIMARY KEY,
+    etag TEXT,
+    last_modified TEXT,
+    headers TEXT NOT NULL,
+    body BLOB NOT NULL,
+    content_hash TEXT NOT NULL,
+    parsed_key TEXT,
+    parsed TEXT,
+    size INTEGER NOT NULL,
+    fetched_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_responses_accessed_at ON responses(accessed_at);
+"""
+
+
+def _digest(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+class HttpCache:
+    """SQLite-backed conditional-GET cache, safe to share between threads."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "revalidated": 0, "misses": 0, "unchanged": 0,
+                      "parse_reused": 0, "bytes_saved": 0}
+
+    def _count(self, key: str, n: int = 1):
+        with self._lock:
+            self.stats[key] += n
+
+    def _row(self, url: str):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT etag, last_modified, headers, body, content_hash FROM responses WHERE url = ?",
+                (url,),
+            ).fetchone()
+
+    def get(self, session, url: str, **kwargs):
+        """GET `url` through `session`, revalidating any cached copy.
+
+        The returned response always carries the full body. Two attributes are
+        added: `content_hash`, and `cache_status`, which is "revalidated" (304
+        served from cache), "unchanged" (200 with the same body as last time)
+        or "miss".
+        """
+        self._count("requests")
+        cached = self._row(url)
+        headers = dict(kwargs.pop("headers", None) or {})
+        if cached:
+            etag, last_modified = cached[0], cached[1]
+            if etag:
+                headers["If-None-Match"] = etag
+            if last_modified:
+                headers["If-Modified-Since"] = last_modified
+
+        r = session.get(url, headers=headers or None, **kwargs)
+        r.cache_key = url
+        now = time.time()
+
+        if r.status_code == 304 and cached:
+            stored_headers, body, content_hash = json.loads(cached[2]), cached[3], cached[4]
+            r.status_code = 200
+            r._content = body
+            for k, v in stored_headers.items():
+                r.headers.setdefault(k, v)
+            r.content_hash = content_hash
+            r.cache_status = "revalidated"
+            self._count("revalidated")
+            self._count("bytes_saved", len(body))
+            with self._lock:
+                self._conn.execute("UPDATE responses SET accessed_at = ? WHERE url = ?", (now, url))
+                self._conn.commit()
+            return r
+
+        if r.status_code != 200:
+            r.content_hash = None
+            r.cache_status = "miss"
+            return r
+
+        body = r.content
+        r.content_hash = _digest(body)
+        if cached and cached[4] == r.content_hash:
+            r.cache_status = "unchanged"
+            self._count("unchanged")
+        else:
+            r.cache_status = "miss"
+            self._count("misses")
+
+        kept = {k: r.headers[k] for k in KEPT_HEADERS if k in r.headers}
+        with self._lock:
+            self._conn.execute(
+                """INSERT INTO responses (url, etag, last_modified, headers, body, content_hash,
+                                          size, fetched_at, accessed_at)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                   ON CONFLICT(url) DO UPDATE SET
+                       etag = excluded.etag, last_modified = excluded.last_modified,
+                       headers = excluded.headers, body = excluded.body,
+                       content_hash = excluded.content_hash, size = excluded.size,
+                       fetched_at = excluded.fetched_at, accessed_at = excluded.accessed_at,
+                       parsed_key = CASE WHEN responses.content_hash = excluded.content_hash
+                                         THEN responses.parsed_key END,
+                       parsed = CASE WHEN responses.content_hash = excluded.content_hash
+                                     THEN responses.parsed END""",
+                (url, r.headers.get("ETag"), r.headers.get("Last-Modified"), json.dumps(kept),
+                 body, r.content_hash, len(body), now, now),
+            )
+            self._conn.commit()
+        return r
+
+    def parse(self, r, parse_fn, context: str = ""):
+        """Return parse_fn(r), reusing the stored result if the body is unchanged.
+
+        `context` must capture anything else the parse depends on (e.g. the
+        WooCommerce category map); results must be JSON-serialisable.
+        """
+        content_hash = getattr(r, "content_hash", None)
+        if not content_hash:
+            return parse_fn(r)
+        key = _digest(f"{content_hash}:{context}".encode())
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT parsed FROM responses WHERE url = ? AND parsed_key = ?",
+                (r.cache_key, key),
+            ).fetchone()
+        if row:
+            self._count("parse_reused")
+            return json.loads(row[0])
+        result = parse_fn(r)
+        with self._lock:
+            self._conn.execute(
+                "UPDATE responses SET parsed_key = ?, parsed = ? WHERE url = ?",
+                (key, json.dumps(result), r.cache_key),
+            )
+            self._conn.commit()
+        return result
+
+    def evict(self, max_bytes: int = None, max_age_days: float = None) -> int:
+        """Drop entries not used within `max_age_days`, then least recently
+        used entries until the cache is under `max_bytes`. Returns rows removed."""
+        removed = 0
+        with self._lock:
+            if max_age_days is not None:
+                cutoff = time.time() - max_age_days * 86400
+                removed += self._conn.execute(
+                    "DELETE FROM responses WHERE accessed_at < ?", (cutoff,)
+                ).rowcount
+            if max_bytes is not None:
+                total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+                if total > max_bytes:
+                    doomed = []
+                    for url, size in self._conn.execute(
+                        "SELECT url, size FROM responses ORDER BY accessed_at"
+                    ):
+                        if total <= max_bytes:
+                            break
+                        doomed.append((url,))
+                        total -= size
+                    self._conn.executemany("DELETE FROM responses WHERE url = ?", doomed)
+                    removed += len(doomed)
+            self._conn.commit()
+            if removed:
+                self._conn.execute("VACUUM")
+        return removed
+
+    def summary(self) -> str:
+        s = self.stats
+        hits = s["revalidated"] + s["unchanged"]
+        rate = 100 * hits / s["requests"] if s["requests"] else 0
+        return (f"{s['requests']} requests, {s['revalidated']} revalidated (304), "
+                f"{s['unchanged']} unchanged, {s['misses']} misses ({rate:.0f}% hit rate); "
+                f"{s['parse_reused']} parses skipped, {s['bytes_saved'] / 2**20:.1f} MB not downloaded")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,254 @@
+"""
+Precomputed price-competitiveness insights.
+
+Computes what insights.html used to derive in the browser on every page view
+(runAnalysis): where the home supplier is cheapest / most expensive / in the
+middle across match groups, its notable price advantages and disadvantages,
+and how much of each competitor's catalog it covers. Every supplier is
+analysed at once rather than just gibbon against kevmor and intafloors, and
+the result is one compact insight_summary row per supplier.
+
+Gibbon has several catalogs of its own (gibbon, gibbon_web, gibbon_csv;
+supplier_config.home). They are one seller: never each other's price rival,
+and not competitors whose coverage is measured. Every other supplier is a
+competitor, so a new one needs no code change.
+
+The catalog is loaded into columnar NumPy arrays (a source code and price per
+product, plus a flat token-id array for names), so the statistics reduce to
+array operations:
+
+  - Price positions sort each group's priced members once; a member's cheapest
+    and dearest rival is then the group's first / last price, or the best
+    price of another seller when the member's own seller holds that spot.
+  - Coverage joins the home supplier's token postings against every
+    competitor's, counts shared tokens per (product, product) pair and turns
+    them into Jaccard similarities. Only pairs with a token in common are
+    generated (the rest score 0), in chunks to bound memory.
+"""
+
+import numpy as np
+
+import matching
+
+HOME_SOURCE = "gibbon"
+
+# Gibbon's own catalogs, when supplier_config (its home column) can't be read
+HOME_SOURCES = ("gibbon", "gibbon_web", "gibbon_csv")
+
+# Best similarity at or above which a competitor product counts as stocked by
+# the home supplier (GAP_THRESHOLD in insights.html)
+GAP_THRESHOLD = 0.35
+
+# Price differences below this are not listed as advantages / disadvantages
+PRICE_MARGIN = 0.50
+
+# Upper bound on candidate pairs materialised per chunk of the coverage join
+MAX_PAIRS = 4_000_000
+
+
+class Catalog:
+    """Columnar view of the products table, replacement parts excluded.
+
+    `products_by_source` maps source -> products with at least "id", "source",
+    "name", "price" and "url". Row i of every array describes products[i].
+    """
+
+    def __init__(self, products_by_source: dict):
+        self.sources = sorted(products_by_source)
+        self.products = [
+            p for source in self.sources
+            for p in products_by_source[source]
+            if not matching.is_replacement_part(p)
+        ]
+        code = {source: i for i, source in enumerate(self.sources)}
+        self.source = np.array([code[p["source"]] for p in self.products], dtype=np.int32)
+        # 0 and missing prices are both "no price", as on the page
+        self.price = np.array([float(p["price"] or "nan") for p in self.products], dtype=np.float64)
+        self.price[self.price <= 0] = np.nan
+        self.row_of = {p["id"]: i for i, p in enumerate(self.products)}
+
+        vocab = {}
+        owners, tokens = [], []
+        for i, p in enumerate(self.products):
+            for tok in matching.tokenize(p["name"]):
+                owners.append(i)
+                tokens.append(vocab.setdefault(tok, len(vocab)))
+        self.token_owner = np.array(owners, dtype=np.int64)
+        self.token = np.array(tokens, dtype=np.int64)
+        self.vocab_size = len(vocab)
+        self.token_count = np.bincount(self.token_owner, minlength=len(self.products))
+
+    def __len__(self):
+        return len(self.products)
+
+    def rows(self, source: str) -> np.ndarray:
+        if source not in self.sources:
+            return np.empty(0, dtype=np.int64)
+        return np.flatnonzero(self.source == self.sources.index(source))
+
+
+def price_positions(catalog: Catalog, match_rows: list, seller: np.ndarray = None) -> dict:
+    """Each priced group member's cheapest and dearest priced rival.
+
+    `match_rows` are product_matches rows ("group_id", "product_id").
+    `seller` maps source codes to sellers; group members of the same seller
+    aren't rivals (default: every source is its own seller). Returns arrays
+    over the members that have a price and at least one priced rival: "row"
+    (catalog row), "min_other" and "max_other".
+    """
+    pairs = [(m["group_id"], catalog.row_of[m["product_id"]])
+             for m in match_rows if m["product_id"] in catalog.row_of]
+    empty = np.empty(0, dtype=np.int64)
+    if not pairs:
+        return {"row": empty, "min_other": empty.astype(np.float64), "max_other": empty.astype(np.float64)}
+    group, row = (np.array(col, dtype=np.int64) for col in zip(*pairs))
+    priced = ~np.isnan(catalog.price[row])
+    group, row = group[priced], row[priced]
+    if not len(row):
+        return {"row": empty, "min_other": empty.astype(np.float64), "max_other": empty.astype(np.float64)}
+    price = catalog.price[row]
+
+    order = np.lexsort((price, group))
+    group, row, price = group[order], row[order], price[order]
+    own = catalog.source[row] if seller is None else seller[catalog.source[row]]
+    starts = np.flatnonzero(np.r_[True, group[1:] != group[:-1]])
+    sizes = np.diff(np.r_[starts, len(group)])
+    first = np.repeat(starts, sizes)
+    last = first + np.repeat(sizes, sizes) - 1
+
+    # The best price of a seller other than the one holding the group's
+    # cheapest (dearest) spot: the rival price for that seller's members
+    alt_min = np.minimum.reduceat(np.where(own != own[first], price, np.inf), starts)
+    alt_max = np.maximum.reduceat(np.where(own != own[last], price, -np.inf), starts)
+    min_other = np.where(own == own[first], np.repeat(alt_min, sizes), price[first])
+    max_other = np.where(own == own[last], np.repeat(alt_max, sizes), price[last])
+    rivals = np.isfinite(min_other)
+    return {"row": row[rivals], "min_other": min_other[rivals], "max_other": max_other[rivals]}
+
+
+def _postings(catalog: Catalog, rows: np.ndarray):
+    """(token ids, owning rows) of `rows`' names, sorted by token."""
+    mask = np.isin(catalog.token_owner, rows)
+    tokens, owners = catalog.token[mask], catalog.token_owner[mask]
+    order = np.argsort(tokens, kind="stable")
+    return tokens[order], owners[order]
+
+
+def best_similarity(catalog: Catalog, rows: np.ndarray, against: np.ndarray):
+    """Best name similarity of each of `rows` to any of `against`, and of each
+    of `against` to any of `rows`, as two float arrays aligned with the inputs."""
+    best_rows = np.zeros(len(rows))
+    best_against = np.zeros(len(against))
+    if not len(rows) or not len(against):
+        return best_rows, best_against
+
+    local_rows = np.full(len(catalog), -1, dtype=np.int64)
+    local_rows[rows] = np.arange(len(rows))
+    local_against = np.full(len(catalog), -1, dtype=np.int64)
+    local_against[against] = np.arange(len(against))
+
+    a_tokens, a_owners = _postings(catalog, against)
+    per_token = np.bincount(a_tokens, minlength=catalog.vocab_size)
+    token_start = np.cumsum(per_token) - per_token
+
+    r_tokens, r_owners = _postings(catalog, rows)
+    fanout = per_token[r_tokens]
+    # Chunks hold whole products, so every shared token of a pair is counted together
+    pairs_per_row = np.bincount(local_rows[r_owners], weights=fanout, minlength=len(rows))
+    bounds = np.searchsorted(np.cumsum(pairs_per_row), np.arange(MAX_PAIRS, pairs_per_row.sum(), MAX_PAIRS))
+    for chunk in np.split(np.arange(len(rows)), bounds):
+        take = np.isin(local_rows[r_owners], chunk)
+        reps = fanout[take]
+        total = int(reps.sum())
+        if not total:
+            continue
+        left = np.repeat(local_rows[r_owners[take]], reps)
+        within = np.arange(total) - np.repeat(np.cumsum(reps) - reps, reps)
+        right = local_against[a_owners[np.repeat(token_start[r_tokens[take]], reps) + within]]
+
+        keys, shared = np.unique(left * len(against) + right, return_counts=True)
+        left, right = keys // len(against), keys % len(against)
+        sim = shared / (catalog.token_count[rows[left]] + catalog.token_count[against[right]] - shared)
+        np.maximum.at(best_rows, left, sim)
+        np.maximum.at(best_against, right, sim)
+    return best_rows, best_against
+
+
+def _price_list(catalog: Catalog, rows: np.ndarray, other: np.ndarray, diff: np.ndarray) -> list:
+    """[{product_id, name, price, other_price, diff}], largest difference first."""
+    order = np.argsort(-diff, kind="stable")
+    return [{
+        "product_id": catalog.products[rows[i]]["id"],
+        "name": catalog.products[rows[i]]["name"],
+        "price": round(float(catalog.price[rows[i]]), 2),
+        "other_price": round(float(other[i]), 2),
+        "diff": round(float(diff[i]), 2),
+    } for i in order]
+
+
+def build_insight_rows(products_by_source: dict, match_rows: list, home: str = HOME_SOURCE,
+                       home_sources=HOME_SOURCES) -> list:
+    """insight_summary rows, one per supplier.
+
+    Price columns compare each supplier with its rivals in `match_rows`
+    (product_matches groups); `home_sources`, the home supplier's own
+    catalogs, count as one seller. Every other supplier is a competitor:
+    covered / gaps / gap_product_ids measure its catalog against `home`'s
+    (None on the home sources' rows), and unique_count, on the home row,
+    counts home products no competitor sells.
+    """
+    catalog = Catalog(products_by_source)
+    n_sources = len(catalog.sources)
+    own_catalogs = set(home_sources) | {home}
+    seller = np.array([-1 if source in own_catalogs else code for code, source in enumerate(catalog.sources)],
+                      dtype=np.int64)
+
+    pos = price_positions(catalog, match_rows, seller)
+    price = catalog.price[pos["row"]]
+    cheapest = price <= pos["min_other"]
+    expensive = ~cheapest & (price >= pos["max_other"])
+    middle = ~cheapest & ~expensive
+    source = catalog.source[pos["row"]]
+
+    def per_source(mask):
+        return np.bincount(source[mask], minlength=n_sources)
+
+    compared = np.bincount(source, minlength=n_sources)
+    counts = {"cheapest": per_source(cheapest), "most_expensive": per_source(expensive),
+              "middle": per_source(middle)}
+    saving = pos["min_other"] - price
+    excess = price - pos["max_other"]
+    advantage = cheapest & (saving > PRICE_MARGIN)
+    disadvantage = expensive & (excess > PRICE_MARGIN)
+
+    home_rows = catalog.rows(home)
+    competitor_rows = np.flatnonzero(seller[catalog.source] >= 0)
+    best_competitor, best_home = best_similarity(catalog, competitor_rows, home_rows)
+    gap = best_competitor < GAP_THRESHOLD
+    gap_source = catalog.source[competitor_rows]
+
+    rows = []
+    for code, name in enumerate(catalog.sources):
+        mine = source == code
+        row = {
+            "source": name,
+            "product_count": int(np.count_nonzero(catalog.source == code)),
+            "compared": int(compared[code]),
+            **{k: int(v[code]) for k, v in counts.items()},
+            "price_advantages": _price_list(catalog, pos["row"][advantage & mine],
+                                            pos["min_other"][advantage & mine], saving[advantage & mine]),
+            "price_disadvantages": _price_list(catalog, pos["row"][disadvantage & mine],
+                                               pos["max_other"][disadvantage & mine], excess[disadvantage & mine]),
+        }
+        if name == home:
+            row.update(covered=None, gaps=None, gap_product_ids=[],
+                       unique_count=int(np.count_nonzero(best_home < GAP_THRESHOLD)))
+        elif name in own_catalogs:
+            row.update(covered=None, gaps=None, gap_product_ids=[], unique_count=None)
+        else:
+            theirs = gap_source == code
+            gap_ids = [catalog.products[i]["id"] for i in competitor_rows[theirs & gap]]
+            row.update(covered=int(np.count_nonzero(theirs & ~gap)), gaps=len(gap_ids),
+                       gap_product_ids=gap_ids, unique_count=None)
+        rows.append(row)
+    return rows
@@ -0,0 +1,160 @@
+"""
+Cross-supplier product matching.
+
+Python port of the matching rules in insights.html (normalize, tokenize,
+STOP_WORDS, PART_KEYWORDS and the greedy grouping in runAnalysis), so groups
+computed here are the same ones the page used to compute in the browser.
+
+Instead of scoring every pair, candidates for a product are taken from an
+inverted token index: two names with no token in common have similarity 0 and
+can never match. A length filter drops candidates whose token count rules out
+reaching the threshold before any set arithmetic happens.
+"""
+
+import re
+from collections import defaultdict
+
+# Suppliers grouped by the insights page, in the order it matches them. They
+# are matched first, so their groups are the page's whatever else is matched
+MATCH_SOURCES = ("gibbon", "kevmor", "intafloors")
+
+MATCH_THRESHOLD = 0.40
+
+STOP_WORDS = frozenset([
+    "the", "a", "an", "and", "or", "for", "of", "in", "with", "to", "is", "by", "at", "on",
+    "all", "new", "free", "per", "mm", "kg", "ltr", "litre", "ml", "pack", "set", "each",
+    "pair", "x", "gst", "excl", "inc",
+])
+
+# Keywords that indicate replacement parts/accessories (not complete products)
+PART_KEYWORDS = (
+    "replacement", "blade", "blades", "spare", "part", "parts",
+    "accessory", "accessories", "refill", "cartridge", "tip", "tips",
+    "attachment", "attachments", "bit", "bits", "pad", "pads",
+    "disc", "discs", "wheel", "wheels", "belt", "belts",
+)
+
+_SYMBOLS_RE = re.compile("[®™©�\u0000-\u001f]")
+_PARENS_RE = re.compile(r"\s*\(.*?\)\s*")
+_SPACES_RE = re.compile(r"\s+")
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def is_replacement_part(product: dict) -> bool:
+    name = product["name"].lower()
+    url = (product.get("url") or "").lower()
+    return any(k in name or k in url for k in PART_KEYWORDS)
+
+
+def normalize(name: str) -> str:
+    name = name.lower().strip()
+    name = _SYMBOLS_RE.sub("", name)
+    name = _PARENS_RE.sub(" ", name)
+    for sep in (" - ", " – ", " — "):
+        i = name.find(sep)
+        if i > 10:
+            name = name[:i]
+    return _SPACES_RE.sub(" ", name).strip()
+
+
+def tokenize(name: str) -> frozenset:
+    return frozenset(_TOKEN_RE.findall(normalize(name))) - STOP_WORDS
+
+
+def search_text(name: str) -> str:
+    """The products.search_name value for a name: its normalized tokens, stop
+    words dropped, in order of first appearance. schema.sql's
+    product_search_text() applies the same rules to search queries."""
+    tokens = (t for t in _TOKEN_RE.findall(normalize(name)) if t not in STOP_WORDS)
+    return " ".join(dict.fromkeys(tokens))
+
+
+def similarity(t1: frozenset, t2: frozenset) -> float:
+    """Jaccard similarity of two token sets."""
+    if not t1 or not t2:
+        return 0.0
+    inter = len(t1 & t2)
+    return inter / (len(t1) + len(t2) - inter)
+
+
+def match_groups(products: list, threshold: float = MATCH_THRESHOLD) -> list:
+    """Greedily group products from different sources with similar names.
+
+    `products` is an ordered list of dicts with at least "source" and "name".
+    Each product, in order, starts a group and claims every later unclaimed
+    product from a source not yet in the group whose similarity to it is at
+    least `threshold`. Returns groups of two or more as lists of
+    (index into products, score against the group's first product).
+    """
+    tokens = [tokenize(p["name"]) for p in products]
+    index = defaultdict(list)
+    for i, toks in enumerate(tokens):
+        for tok in toks:
+            index[tok].append(i)
+
+    used = [False] * len(products)
+    groups = []
+    for i, ti in enumerate(tokens):
+        if used[i]:
+            continue
+        used[i] = True
+        if not ti:
+            continue
+        # |A∩B|/|A∪B| >= t needs t*|A| <= |B| <= |A|/t
+        min_len, max_len = threshold * len(ti), len(ti) / threshold
+        candidates = sorted({j for tok in ti for j in index[tok] if j > i and not used[j]})
+        group = [(i, 1.0)]
+        sources = {products[i]["source"]}
+        for j in candidates:
+            if used[j] or products[j]["source"] in sources:
+                continue
+            tj = tokens[j]
+            if not min_len <= len(tj) <= max_len:
+                continue
+            score = similarity(ti, tj)
+            if score >= threshold:
+                group.append((j, score))
+                used[j] = True
+                sources.add(products[j]["source"])
+        if len(group) > 1:
+            groups.append(group)
+    return groups
+
+
+def match_order(sources) -> list:
+    """`sources` in matching order: MATCH_SOURCES first, the rest by name.
+
+    Greedy grouping only lets a product claim later ones, so products of the
+    sources appended after MATCH_SOURCES never change how those are grouped.
+    """
+    sources = set(sources)
+    return [s for s in MATCH_SOURCES if s in sources] + sorted(sources - set(MATCH_SOURCES))
+
+
+def build_match_rows(products_by_source: dict, sources=None,
+                     threshold: float = MATCH_THRESHOLD) -> list:
+    """product_matches rows for `sources` (default: every source, in
+    match_order), replacement parts excluded.
+
+    `products_by_source` maps source -> products in display (name) order; each
+    product needs "id", "name" and "url".
+    """
+    if sources is None:
+        sources = match_order(products_by_source)
+    ordered = [
+        p for source in sources
+        for p in products_by_source.get(source, [])
+        if not is_replacement_part(p)
+    ]
+    rows = []
+    for group_id, group in enumerate(match_groups(ordered, threshold), start=1):
+        for position, (idx, score) in enumerate(group):
+            p = ordered[idx]
+            rows.append({
+                "group_id": group_id,
+                "position": position,
+                "source": p["source"],
+                "product_id": p["id"],
+                "score": round(score, 3),
+            })
+    return rows
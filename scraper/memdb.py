@@ -0,0 +1,167 @@
+"""
+In-memory stand-in for the Supabase client.
+
+Implements the slice of the supabase-py query builder that scrape.py uses
+(select / insert / upsert / delete with eq, gte, in_, order, range and limit,
+plus storage upload / list / remove), over plain Python lists. It lets the
+writer path run offline, e.g. in bench_scrapers.py:
+
+    scrape.set_supabase(MemorySupabase())
+"""
+
+import itertools
+import threading
+from types import SimpleNamespace
+
+
+class _Query:
+    def __init__(self, db: "MemorySupabase", table: str):
+        self.db = db
+        self.table = table
+        self.op = "select"
+        self.columns = None
+        self.payload = None
+        self.on_conflict = None
+        self.filters = []
+        self.orders = []
+        self.bounds = None
+
+    def select(self, columns: str = "*", **kwargs):
+        if columns.strip() != "*":
+            self.columns = [c.strip() for c in columns.split(",")]
+        return self
+
+    def insert(self, rows):
+        self.op, self.payload = "insert", rows
+        return self
+
+    def upsert(self, rows, on_conflict: str = None, **kwargs):
+        self.op, self.payload, self.on_conflict = "upsert", rows, on_conflict
+        return self
+
+    def delete(self):
+        self.op = "delete"
+        return self
+
+    def eq(self, column: str, value):
+        self.filters.append(lambda row: row.get(column) == value)
+        return self
+
+    def gte(self, column: str, value):
+        self.filters.append(lambda row: row.get(column) is not None and row[column] >= value)
+        return self
+
+    def in_(self, column: str, values):
+        values = set(values)
+        self.filters.append(lambda row: row.get(column) in values)
+        return self
+
+    def order(self, column: str, desc: bool = False):
+        self.orders.append((column, desc))
+        return self
+
+    def range(self, start: int, end: int):
+        self.bounds = (start, end + 1)
+        return self
+
+    def limit(self, n: int):
+        self.bounds = (0, n)
+        return self
+
+    def execute(self):
+        with self.db.lock:
+            return SimpleNamespace(data=getattr(self, f"_{self.op}")())
+
+    def _insert(self):
+        rows = self.payload if isinstance(self.payload, list) else [self.payload]
+        table = self.db.tables.setdefault(self.table, [])
+        inserted = [{"id": next(self.db.ids), **row} for row in rows]
+        table.extend(inserted)
+        self.db.indexes.pop(self.table, None)
+        return inserted
+
+    def _upsert(self):
+        rows = self.payload if isinstance(self.payload, list) else [self.payload]
+        keys = tuple(k.strip() for k in (self.on_conflict or "id").split(","))
+        table = self.db.tables.setdefault(self.table, [])
+        index = self.db.index(self.table, keys)
+        written = []
+        for row in rows:
+            key = tuple(row.get(k) for k in keys)
+            existing = index.get(key)
+            if existing is None:
+                existing = index[key] = {"id": next(self.db.ids)}
+                table.append(existing)
+            existing.update(row)
+            written.append(dict(existing))
+        return written
+
+    def _matching(self) -> list:
+        return [row for row in self.db.tables.get(self.table, []) if all(f(row) for f in self.filters)]
+
+    def _delete(self):
+        doomed = self._matching()
+        ids = {id(row) for row in doomed}
+        self.db.tables[self.table] = [row for row in self.db.tables.get(self.table, [])
+                                      if id(row) not in ids]
+        self.db.indexes.pop(self.table, None)
+        return doomed
+
+    def _select(self):
+        rows = self._matching()
+        for column, desc in reversed(self.orders):
+            # NULLs sort as the largest value, as in Postgres
+            rows.sort(key=lambda row: (row.get(column) is None,
+                                       0 if row.get(column) is None else row[column]),
+                      reverse=desc)
+        if self.bounds:
+            rows = rows[self.bounds[0]:self.bounds[1]]
+        if self.columns:
+            return [{c: row.get(c) for c in self.columns} for row in rows]
+        return [dict(row) for row in rows]
+
+
+class _Bucket:
+    def __init__(self, objects: dict):
+        self.objects = objects
+
+    def upload(self, path: str, data: bytes, file_options: dict = None):
+        self.objects[path] = data
+
+    def list(self, prefix: str = "", options: dict = None):
+        prefix = prefix.rstrip("/") + "/" if prefix else ""
+        return [{"name": path[len(prefix):]} for path in self.objects
+                if path.startswith(prefix) and "/" not in path[len(prefix):]]
+
+    def remove(self, paths: list):
+        for path in paths:
+            self.objects.pop(path, None)
+
+
+class _Storage:
+    def __init__(self):
+        self.buckets = {}
+
+    def from_(self, bucket: str) -> _Bucket:
+        return _Bucket(self.buckets.setdefault(bucket, {}))
+
+
+class MemorySupabase:
+    """Thread-safe in-memory tables with the supabase-py calling convention."""
+
+    def __init__(self):
+        self.tables = {}
+        self.indexes = {}
+        self.ids = itertools.count(1)
+        self.lock = threading.Lock()
+        self.storage = _Storage()
+
+    def table(self, name: str) -> _Query:
+        return _Query(self, name)
+
+    def index(self, table: str, keys: tuple) -> dict:
+        """{key values: row} for upserts on `keys`; rebuilt after inserts and deletes."""
+        indexes = self.indexes.setdefault(table, {})
+        if keys not in indexes:
+            indexes[keys] = {tuple(row.get(k) for k in keys): row for row in self.tables.get(table, [])}
+        return indexes[keys]
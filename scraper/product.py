@@ -0,0 +1,114 @@
+"""
+Compact in-memory product records for the scrapers.
+
+A scrape holds thousands of products at once: pages in flight, batches
+queued for the writer and the rows being written. As plain dicts each one
+costs a hash table, and every stage copied it into a new dict. A Product
+keeps the same fields in slots, interns the handful of source and category
+strings that thousands of products share, and is itself the row the writer
+hands to the store: it reads like a products-table row (row["name"],
+row.get("sku")), so no per-stage copies are made.
+
+Parsers still return plain dicts, since the HTTP cache stores parse results
+as JSON; scrapers turn each parsed page into Products with from_dict().
+
+canonical_url() is the key products are deduplicated and stored under, so
+one product listed under several categories, or linked with a different
+fragment or tracking parameters, is only counted once.
+"""
+
+import sys
+from collections.abc import Mapping
+from urllib.parse import urlsplit, urlunsplit
+
+# products-table columns a scraper fills in, in row order
+ROW_FIELDS = ("source", "name", "price", "price_display", "url", "image", "category", "sku",
+              "description")
+
+# Columns ProductWriter fills in for the rows it writes
+WRITE_FIELDS = ("search_name", "scraped_at")
+
+_KEYS = frozenset(ROW_FIELDS + WRITE_FIELDS)
+
+# Query parameters that only track where a link was followed from
+TRACKING_PARAMS = ("utm_", "fbclid", "gclid", "mc_cid", "mc_eid")
+
+
+def canonical_url(url: str) -> str:
+    """`url` without its fragment, tracking parameters or default port, and
+    with a lowercase scheme and host.
+
+    Kevmor links a product from each category it's listed in, with the
+    selected variant in the fragment (e.g. "#/339-available_in-15_lt"); these
+    all name the same product page. Stored URLs were migrated to this form
+    by schema.sql.
+    """
+    if not url:
+        return ""
+    parts = urlsplit(url)
+    host = parts.netloc.lower()
+    scheme = parts.scheme.lower()
+    if (scheme, host[-3:]) == ("http", ":80") or (scheme, host[-4:]) == ("https", ":443"):
+        host = host.rsplit(":", 1)[0]
+    query = parts.query
+    if query:
+        # Filtered as written, not re-encoded, so schema.sql's
+        # canonical_product_url() gives the same result
+        query = "&".join(param for param in query.split("&")
+                         if not param.split("=", 1)[0].lower().startswith(TRACKING_PARAMS))
+    return urlunsplit((scheme, host, parts.path, query, ""))
+
+
+class Product(Mapping):
+    """One scraped product, readable as its products-table row.
+
+    The mapping's keys are ROW_FIELDS and WRITE_FIELDS (None until the
+    writer sets them). `updated_at`, Shopify's last modification time for
+    incremental syncs, is an attribute only, not a column.
+    """
+
+    __slots__ = ROW_FIELDS + WRITE_FIELDS + ("updated_at",)
+
+    def __init__(self, source: str, name: str, price=None, price_display: str = "", url: str = "",
+                 image: str = "", category: str = "", sku: str = "", description: str = "",
+                 updated_at: str = None):
+        self.source = sys.intern(source)
+        self.name = name
+        self.price = price
+        self.price_display = price_display or ""
+        self.url = canonical_url(url)
+        self.image = image or ""
+        self.category = sys.intern(category or "")
+        self.sku = sku or ""
+        self.description = description or ""
+        self.updated_at = updated_at
+        self.search_name = None
+        self.scraped_at = None
+
+    @classmethod
+    def from_dict(cls, p: dict, source: str = None) -> "Product":
+        """A Product from a parser's (or scraper plugin's) dict; `source`
+        overrides the dict's own."""
+        return cls(source or p["source"], p["name"], p.get("price"), p.get("price_display"),
+                   p.get("url"), p.get("image"), p.get("category"), p.get("sku"),
+                   p.get("description"), p.get("updated_at"))
+
+    def __getitem__(self, key):
+        if key not in _KEYS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key, default=None):
+        return getattr(self, key) if key in _KEYS else default
+
+    def __contains__(self, key):
+        return key in _KEYS
+
+    def __iter__(self):
+        return iter(ROW_FIELDS + WRITE_FIELDS)
+
+    def __len__(self):
+        return len(_KEYS)
+
+    def __repr__(self):
+        return f"Product({self.source!r}, {self.name!r}, url={self.url!r})"
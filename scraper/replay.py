@@ -0,0 +1,453 @@
+"""
+Offline fixtures for the supplier scrapers: record, generate and serve.
+
+A fixture holds the HTTP responses one scraper type needs, keyed by request
+path and query, so a scrape can be replayed without touching the live site.
+Fixtures are recorded from the real supplier, or generated with any number of
+pages. StubServer serves them from a local HTTP server, with configurable
+latency and injected errors, at a base URL the scrapers accept in place of
+the supplier's own.
+
+Fixture file (JSON, gzipped when the name ends in .gz):
+    {
+      "format": 1,
+      "kind": "woocommerce" | "shopify" | "kevmor",
+      "base_url": "https://intafloors.com.au",
+      "recorded_at": "2026-02-11T07:23:49+00:00",
+      "categories": [["/308-carpet-adhesive", "Carpet Adhesive"], ...],   # kevmor only
+      "responses": {
+        "/wp-json/wc/store/v1/products?per_page=100&page=1":
+            {"status": 200, "headers": {"X-WP-TotalPages": "12", ...}, "body": "[...]"},
+        ...
+      }
+    }
+
+A listing page past the last recorded one is answered the way the real site
+ends its catalog: a 400 from the WooCommerce Store API (an empty list for an
+unrecorded first page, as for a query nothing matches), an empty products list
+from Shopify, an empty category page from Kevmor. That keeps a recording cut
+short with --max-pages replayable.
+
+Usage:
+    python replay.py record woocommerce https://intafloors.com.au -o fixtures/intafloors.json.gz
+    python replay.py record kevmor https://kevmor.com.au -o fixtures/kevmor.json.gz --max-pages 5
+    python replay.py serve fixtures/*.json.gz --port 8000 --latency 0.05 --error-rate 0.02
+"""
+
+import os
+import sys
+import gzip
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+import multiprocessing
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+FORMAT = 1
+
+KINDS = ("woocommerce", "shopify", "kevmor")
+
+# Response headers kept in recordings
+RECORDED_HEADERS = ("Content-Type", "X-WP-Total", "X-WP-TotalPages")
+
+WOOCOMMERCE_PRODUCTS_PATH = "/wp-json/wc/store/v1/products?"
+SHOPIFY_PRODUCTS_PATH = "/products.json"
+
+
+class Fixture:
+    """Recorded (or generated) responses for one scraper type."""
+
+    def __init__(self, kind: str, base_url: str, categories: list = None, recorded_at: str = None):
+        if kind not in KINDS:
+            raise ValueError(f"Unknown fixture kind '{kind}'")
+        self.kind = kind
+        self.base_url = base_url.rstrip("/")
+        self.categories = categories or []
+        self.recorded_at = recorded_at or datetime.now(timezone.utc).isoformat()
+        self.responses = {}
+
+    def add(self, path: str, status: int, headers: dict, body: str):
+        self.responses[path] = {"status": status, "headers": headers, "body": body}
+
+    def lookup(self, path: str):
+        """(status, headers, body) for a request path, falling back to the
+        kind's end-of-catalog response for listing pages not recorded."""
+        resp = self.responses.get(path)
+        if resp is not None:
+            return resp["status"], resp["headers"], resp["body"]
+        if self.kind == "woocommerce" and path.startswith(WOOCOMMERCE_PRODUCTS_PATH):
+            if path.endswith("&page=1"):
+                # An empty listing, e.g. an incremental query with no changes
+                return 200, {"Content-Type": "application/json", "X-WP-Total": "0",
+                             "X-WP-TotalPages": "0"}, "[]"
+            return 400, {"Content-Type": "application/json"}, json.dumps(
+                {"code": "rest_invalid_param", "message": "Invalid parameter(s): page"})
+        if self.kind == "shopify" and path.startswith(SHOPIFY_PRODUCTS_PATH):
+            return 200, {"Content-Type": "application/json"}, '{"products":[]}'
+        if self.kind == "kevmor" and "page=" in path:
+            return 200, {"Content-Type": "text/html"}, kevmor_page([], has_next=False)
+        return 404, {"Content-Type": "text/plain"}, "Not found"
+
+    def category_urls(self, base_url: str) -> list:
+        """Kevmor (url, category) pairs rooted at `base_url`."""
+        return [(base_url.rstrip("/") + path, name) for path, name in self.categories]
+
+    def to_json(self) -> dict:
+        data = {"format": FORMAT, "kind": self.kind, "base_url": self.base_url,
+                "recorded_at": self.recorded_at}
+        if self.categories:
+            data["categories"] = self.categories
+        data["responses"] = self.responses
+        return data
+
+    @classmethod
+    def from_json(cls, data: dict) -> "Fixture":
+        if data.get("format") != FORMAT:
+            raise ValueError(f"Unsupported fixture format {data.get('format')}")
+        fixture = cls(data["kind"], data["base_url"], [tuple(c) for c in data.get("categories", [])],
+                      data.get("recorded_at"))
+        fixture.responses = data["responses"]
+        return fixture
+
+    def save(self, path: str):
+        data = json.dumps(self.to_json(), ensure_ascii=False).encode("utf-8")
+        if path.endswith(".gz"):
+            data = gzip.compress(data, mtime=0)
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(data)
+
+    @classmethod
+    def load(cls, path: str) -> "Fixture":
+        with open(path, "rb") as f:
+            data = f.read()
+        if path.endswith(".gz"):
+            data = gzip.decompress(data)
+        return cls.from_json(json.loads(data))
+
+
+# ---------------------------------------------------------------------------
+# Recording
+# ---------------------------------------------------------------------------
+
+class Recorder:
+    """Collects the responses http_get() returns into a fixture (see scrape.http_recorder)."""
+
+    def __init__(self, fixture: Fixture):
+        self.fixture = fixture
+        self._prefix = urlparse(fixture.base_url).path
+        self._lock = threading.Lock()
+
+    def record(self, url: str, r):
+        u = urlparse(url)
+        path = u.path[len(self._prefix):] if u.path.startswith(self._prefix) else u.path
+        path += f"?{u.query}" if u.query else ""
+        headers = {k: r.headers[k] for k in RECORDED_HEADERS if k in r.headers}
+        with self._lock:
+            self.fixture.add(path, r.status_code, headers, r.text)
+
+
+def record(kind: str, base_url: str, max_pages: int = None) -> Fixture:
+    """Run the scraper for `kind` against the live site and capture its responses.
+
+    `max_pages` stops after that many batches (pages; categories for Kevmor).
+    """
+    import scrape
+
+    categories = None
+    if kind == "kevmor":
+        categories = [(urlparse(url).path, name) for url, name in scrape.KEVMOR_CATEGORIES[:max_pages]]
+    fixture = Fixture(kind, base_url, categories)
+    scrape.http_recorder = Recorder(fixture)
+    try:
+        if kind == "woocommerce":
+            batches = scrape._scrape_woocommerce(base_url, urlparse(base_url).netloc)
+        elif kind == "shopify":
+            batches = scrape._scrape_shopify(base_url, urlparse(base_url).netloc)
+        else:
+            batches = scrape.scrape_kevmor(categories=fixture.category_urls(base_url))
+        for n, _ in enumerate(batches, start=1):
+            if max_pages and n >= max_pages:
+                batches.close()
+                break
+    finally:
+        scrape.http_recorder = None
+    return fixture
+
+
+# ---------------------------------------------------------------------------
+# Generated fixtures
+# ---------------------------------------------------------------------------
+
+KEVMOR_PRODUCT_TEMPLATE = """
+<article class="product-miniature js-product-miniature" data-id-product="{i}">
+  <div class="thumbnail-container">
+    <a href="https://kevmor.com.au/tools/{i}-product-{i}.html" class="thumbnail product-thumbnail">
+      <img src="https://kevmor.com.au/{i}-home_default/product-{i}.jpg" alt="Product {i}" loading="lazy">
+    </a>
+    <div class="product-description">
+      <h3 class="h3 product-title"><a href="https://kevmor.com.au/tools/{i}-product-{i}.html">Kevmor Tool&trade; {i} (Pack of 2)</a></h3>
+      <div class="product-price-and-shipping">
+        <span class="regular-price">$1{i}.00</span>
+        <span class="price" aria-label="Price">$ {i}.95 GST excl.</span>
+      </div>
+    </div>
+    <ul class="product-flags"><li class="product-flag new">New</li></ul>
+  </div>
+</article>
+"""
+
+KEVMOR_PAGE_TEMPLATE = """<!doctype html>
+<html lang="en"><head><title>Tools</title>
+<link rel="stylesheet" href="/themes/theme.css">{head_next}
+<script>var prestashop = {{"cart": {{"products": []}}}};</script>
+</head><body>
+<header><nav>{nav}</nav></header>
+<section id="products"><div class="products row">{products}</div>
+<nav class="pagination">{next}</nav></section>
+<footer>{nav}</footer>
+<script src="/themes/core.js"></script>
+</body></html>"""
+
+KEVMOR_NAV = "".join(f'<a href="/{i}-category">Category {i}</a>' for i in range(150))
+
+DESCRIPTION = ("<p>Premium <strong>water-based</strong> adhesive for carpet &amp; vinyl.</p>"
+               "<ul><li>Coverage: 4&ndash;5 m&sup2;/L</li><li>Open time: 20 min</li></ul>")
+
+
+def kevmor_page(product_ids, has_next: bool = True) -> str:
+    """A Kevmor (PrestaShop) category page listing the given product ids."""
+    return KEVMOR_PAGE_TEMPLATE.format(
+        nav=KEVMOR_NAV,
+        products="".join(KEVMOR_PRODUCT_TEMPLATE.format(i=i) for i in product_ids),
+        head_next='<link rel="next" href="?page=2">' if has_next else "",
+        next='<a rel="next" href="?page=2" class="next">Next</a>' if has_next else "",
+    )
+
+
+def _woocommerce_product(i: int, base_url: str) -> dict:
+    return {
+        "id": i,
+        "name": f"Flooring Product {i} - Oak Natural {i % 7 + 1}mm",
+        "permalink": f"{base_url}/product/flooring-product-{i}/",
+        "sku": f"FP-{i:05d}",
+        "short_description": DESCRIPTION,
+        "prices": {"price": str(1995 + i * 10), "regular_price": str(2495 + i * 10),
+                   "currency_minor_unit": 2, "currency_code": "AUD"},
+        "categories": [{"id": 10 + i % 5, "name": f"Category {i % 5}", "slug": f"category-{i % 5}"}],
+        "images": [{"id": i, "src": f"{base_url}/wp-content/uploads/p{i}.jpg",
+                    "thumbnail": f"{base_url}/wp-content/uploads/p{i}-300x300.jpg"}],
+    }
+
+
+def _shopify_product(i: int) -> dict:
+    return {
+        "id": 7000000 + i,
+        "title": f"Trade Adhesive {i} 15L",
+        "handle": f"trade-adhesive-{i}-15l",
+        "body_html": DESCRIPTION,
+        "product_type": f"Adhesives {i % 4}",
+        "variants": [{"id": 9000000 + i, "sku": f"TA-{i:05d}", "price": f"{89 + i % 50}.00",
+                      "compare_at_price": f"{99 + i % 50}.00" if i % 3 == 0 else None}],
+        "images": [{"id": i, "src": f"https://cdn.shopify.com/s/files/trade-adhesive-{i}.jpg"}],
+    }
+
+
+def generate(kind: str, pages: int = 10, per_page: int = None, categories: int = None) -> Fixture:
+    """A synthetic fixture with `pages` listing pages of `per_page` products.
+
+    For Kevmor, `pages` is pages per category, across `categories` categories.
+    """
+    if kind == "woocommerce":
+        per_page = per_page or 100
+        fixture = Fixture(kind, "https://woocommerce.example")
+        fixture.add("/shop/", 200, {"Content-Type": "text/html"}, "<html><body>Shop</body></html>")
+        fixture.add("/wp-json/wc/store/v1/products/categories?per_page=100", 200,
+                    {"Content-Type": "application/json"},
+                    json.dumps([{"id": 10 + c, "name": f"Category {c}"} for c in range(5)]))
+        for page in range(1, pages + 1):
+            products = [_woocommerce_product((page - 1) * per_page + i, fixture.base_url)
+                        for i in range(per_page)]
+            fixture.add(f"{WOOCOMMERCE_PRODUCTS_PATH}per_page=100&page={page}", 200,
+                        {"Content-Type": "application/json", "X-WP-Total": str(pages * per_page),
+                         "X-WP-TotalPages": str(pages)},
+                        json.dumps(products))
+    elif kind == "shopify":
+        per_page = per_page or 250
+        fixture = Fixture(kind, "https://shopify.example")
+        for page in range(1, pages + 1):
+            products = [_shopify_product((page - 1) * per_page + i) for i in range(per_page)]
+            fixture.add(f"{SHOPIFY_PRODUCTS_PATH}?limit=250&page={page}", 200,
+                        {"Content-Type": "application/json"}, json.dumps({"products": products}))
+    elif kind == "kevmor":
+        per_page = per_page or 24
+        categories = categories or 10
+        fixture = Fixture(kind, "https://kevmor.example",
+                          [(f"/{c}-category-{c}", f"Category {c}") for c in range(categories)])
+        next_id = 0
+        for path, _ in fixture.categories:
+            for page in range(1, pages + 1):
+                ids = range(next_id, next_id + per_page)
+                next_id += per_page
+                fixture.add(f"{path}?page={page}" if page > 1 else path, 200,
+                            {"Content-Type": "text/html; charset=utf-8"},
+                            kevmor_page(ids, has_next=page < pages))
+    else:
+        raise ValueError(f"Unknown fixture kind '{kind}'")
+    return fixture
+
+
+# ---------------------------------------------------------------------------
+# Stub server
+# ---------------------------------------------------------------------------
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, like the real sites
+
+    def do_GET(self):
+        server = self.server
+        name, _, rest = self.path.lstrip("/").partition("/")
+        fixture = server.fixtures.get(name)
+
+        delay = server.latency
+        if server.jitter:
+            with server.rng_lock:
+                delay += server.rng.uniform(0, server.jitter)
+        if delay:
+            time.sleep(delay)
+
+        with server.rng_lock:
+            fail = server.error_rate and server.rng.random() < server.error_rate
+        if fixture is None:
+            status, headers, body = 404, {"Content-Type": "text/plain"}, "No such fixture"
+        elif fail:
+            status, headers, body = server.error_status, {"Content-Type": "text/plain"}, "Injected error"
+            if server.retry_after is not None:
+                headers["Retry-After"] = str(server.retry_after)
+        else:
+            status, headers, body = fixture.lookup("/" + rest)
+
+        data = body.encode("utf-8")
+        etag = f'"{hashlib.sha256(data).hexdigest()[:16]}"'
+        if status == 200 and self.headers.get("If-None-Match") == etag:
+            status, data = 304, b""
+        self.send_response(status)
+        for k, v in headers.items():
+            self.send_header(k, v)
+        if status in (200, 304):
+            self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _serve(fixtures: dict, options: dict, port: int, ready):
+    server = ThreadingHTTPServer(("127.0.0.1", port), _Handler)
+    server.daemon_threads = True
+    server.fixtures = fixtures
+    server.latency = options["latency"]
+    server.jitter = options["jitter"]
+    server.error_rate = options["error_rate"]
+    server.error_status = options["error_status"]
+    server.retry_after = options["retry_after"]
+    server.rng = random.Random(options["seed"])
+    server.rng_lock = threading.Lock()
+    ready.put(server.server_address[1])
+    server.serve_forever()
+
+
+class StubServer:
+    """Local HTTP server for a set of fixtures, run in a child process.
+
+    Each fixture is mounted at /<name>, so url(name) is a base URL to hand
+    the scraper. Every response waits `latency` seconds plus up to `jitter`
+    more, and a fraction `error_rate` of requests fail with `error_status`
+    (carrying Retry-After when `retry_after` is set). Responses carry an ETag
+    and honour If-None-Match, so the HTTP cache can be exercised too.
+
+        with StubServer({"intafloors": fixture}, latency=0.02) as stub:
+            list(scrape._scrape_woocommerce(stub.url("intafloors"), "intafloors"))
+    """
+
+    def __init__(self, fixtures: dict, latency: float = 0.0, jitter: float = 0.0,
+                 error_rate: float = 0.0, error_status: int = 503, retry_after: float = None,
+                 seed: int = 0, port: int = 0):
+        self.fixtures = fixtures
+        self.options = {"latency": latency, "jitter": jitter, "error_rate": error_rate,
+                        "error_status": error_status, "retry_after": retry_after, "seed": seed}
+        self.port = port
+        self._process = None
+
+    def start(self) -> "StubServer":
+        ready = multiprocessing.Queue()
+        self._process = multiprocessing.Process(
+            target=_serve, args=(self.fixtures, self.options, self.port, ready), daemon=True)
+        self._process.start()
+        self.port = ready.get(timeout=30)
+        return self
+
+    def url(self, name: str) -> str:
+        return f"http://127.0.0.1:{self.port}/{name}"
+
+    def stop(self):
+        if self._process is not None:
+            self._process.terminate()
+            self._process.join()
+            self._process = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record and serve offline scraper fixtures.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    rec = sub.add_parser("record", help="capture a live scrape into a fixture file")
+    rec.add_argument("kind", choices=KINDS)
+    rec.add_argument("base_url", help="supplier base URL, e.g. https://intafloors.com.au")
+    rec.add_argument("-o", "--output", required=True, help="fixture file (.json or .json.gz)")
+    rec.add_argument("--max-pages", type=int, help="stop after this many pages (Kevmor: categories)")
+
+    srv = sub.add_parser("serve", help="serve fixture files over HTTP")
+    srv.add_argument("fixtures", nargs="+", help="fixture files; each is mounted at /<file stem>")
+    srv.add_argument("--port", type=int, default=8000)
+    srv.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    srv.add_argument("--jitter", type=float, default=0.0, help="up to this many extra seconds")
+    srv.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests that fail")
+    srv.add_argument("--error-status", type=int, default=503)
+    srv.add_argument("--retry-after", type=float, help="Retry-After sent with injected errors")
+    args = parser.parse_args()
+
+    if args.command == "record":
+        fixture = record(args.kind, args.base_url, args.max_pages)
+        fixture.save(args.output)
+        print(f"Recorded {len(fixture.responses)} responses to {args.output}")
+        return
+
+    fixtures = {os.path.basename(path).split(".")[0]: Fixture.load(path) for path in args.fixtures}
+    stub = StubServer(fixtures, args.latency, args.jitter, args.error_rate, args.error_status,
+                      args.retry_after, port=args.port).start()
+    for name, fixture in fixtures.items():
+        print(f"{fixture.kind:12s} {stub.url(name)}  ({len(fixture.responses)} responses)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        stub.stop()
+        sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+"""
+Change-rate-aware scheduling of supplier scrapes (scrape.py --schedule).
+
+Without it every run scrapes every enabled supplier in full, however rarely
+its catalog changes. With it, each supplier's scrape_log history decides
+whether it is due:
+
+  - Its change rate is the share of its catalog that each successful run
+    inserted, updated or removed, per hour since the run before. Times the
+    hours since its last run, that is the share of its stored products
+    expected to be stale; the supplier is due once it reaches DUE_STALENESS.
+  - It is never due before its minimum interval and always due after its
+    maximum interval (supplier_config min_interval_hours /
+    max_interval_hours). Suppliers without enough history are due whenever
+    the minimum interval allows.
+  - Due suppliers are scraped most stale first.
+
+Suppliers crawled by category (Kevmor) are planned per category instead. A
+category's change rate comes from its stored products' scraped_at, which is
+only set when a row is written and so marks its last change; when it was
+last crawled comes from the category_seconds of logged runs. Only the due
+categories are crawled and merged into the catalog, like an incremental
+sync. A full sweep, which also removes delisted products, runs once every
+category is due or the maximum interval has passed since the last one.
+
+Timestamps may be ISO 8601 strings or datetimes, as the stores return them.
+"""
+
+import statistics
+from collections import Counter
+from datetime import datetime, timedelta
+
+# A daily cron drifts by minutes, so the default minimum leaves some slack
+DEFAULT_MIN_INTERVAL_HOURS = 20
+DEFAULT_MAX_INTERVAL_HOURS = 168
+
+# Expected stale share of a catalog (or category) at which it is due
+DUE_STALENESS = 0.01
+
+# Change history considered, and successful runs loaded to cover it
+CHURN_WINDOW_DAYS = 30
+HISTORY_RUNS = 60
+
+CHANGE_COUNTS = ("inserted_count", "updated_count", "removed_count")
+
+
+def _timestamp(value) -> datetime:
+    return value if isinstance(value, datetime) else datetime.fromisoformat(value)
+
+
+def _hours(later: datetime, earlier: datetime) -> float:
+    return (later - earlier).total_seconds() / 3600
+
+
+def _is_full(run: dict) -> bool:
+    # Runs from before incremental sync have no sync_mode; they were full sweeps
+    return run.get("sync_mode") in (None, "full")
+
+
+def _plan(source: str, due: bool, priority: float, reason: str, categories: list = None) -> dict:
+    """A scheduling decision. `categories` lists the categories to crawl, or
+    is None for the whole supplier."""
+    return {"source": source, "due": due, "priority": priority, "reason": reason,
+            "categories": categories}
+
+
+def change_rate(runs: list, now: datetime):
+    """Share of the catalog changing per hour over the last CHURN_WINDOW_DAYS.
+
+    `runs` are successful scrape_log rows, newest first. Partial (category)
+    runs don't describe the whole catalog and are left out. None when there
+    aren't two comparable runs.
+    """
+    runs = [run for run in runs if run.get("sync_mode") != "partial"]
+    window_start = now - timedelta(days=CHURN_WINDOW_DAYS)
+    changed = hours = 0.0
+    for run, previous in zip(runs, runs[1:]):
+        started = _timestamp(run["started_at"])
+        if started < window_start:
+            break
+        span = _hours(started, _timestamp(previous["started_at"]))
+        # Runs logged before the write counts existed say nothing about churn
+        if span <= 0 or not run.get("product_count") or run.get("inserted_count") is None:
+            continue
+        changed += sum(run.get(k) or 0 for k in CHANGE_COUNTS) / run["product_count"]
+        hours += span
+    return changed / hours if hours else None
+
+
+def plan_supplier(source: str, runs: list, now: datetime,
+                  min_hours: float = DEFAULT_MIN_INTERVAL_HOURS,
+                  max_hours: float = DEFAULT_MAX_INTERVAL_HOURS) -> dict:
+    """Whether `source` is due, from its successful runs (newest first).
+
+    The priority is the expected stale share of its catalog; suppliers
+    without a measured change rate count as entirely stale.
+    """
+    if not runs:
+        return _plan(source, True, 1.0, "never scraped")
+    elapsed = _hours(now, _timestamp(runs[0]["started_at"]))
+    rate = change_rate(runs, now)
+    staleness = 1.0 if rate is None else rate * elapsed
+    if elapsed < min_hours:
+        return _plan(source, False, staleness, f"scraped {elapsed:.0f}h ago (minimum {min_hours:g}h)")
+    if elapsed >= max_hours:
+        return _plan(source, True, staleness, f"scraped {elapsed:.0f}h ago (maximum {max_hours:g}h)")
+    if rate is None:
+        return _plan(source, True, staleness, "no change history yet")
+    return _plan(source, staleness >= DUE_STALENESS, staleness,
+                 f"~{staleness:.1%} expected stale after {elapsed:.0f}h")
+
+
+def _churn_window_start(runs: list, now: datetime):
+    """Start of the window category churn is counted over, or None.
+
+    Products written by the oldest run in `runs` may be first sightings
+    rather than changes, so the window starts no earlier than the next run.
+    """
+    if len(runs) < 2:
+        return None
+    return max(now - timedelta(days=CHURN_WINDOW_DAYS), _timestamp(runs[-2]["started_at"]))
+
+
+def plan_categories(source: str, categories: list, runs: list, products: list, now: datetime,
+                    min_hours: float = DEFAULT_MIN_INTERVAL_HOURS,
+                    max_hours: float = DEFAULT_MAX_INTERVAL_HOURS) -> dict:
+    """Which of `categories` (labels, in crawl order) of `source` are due.
+
+    `products` are its stored products with "category" and "scraped_at".
+    The plan lists the due categories, or is a full sweep (categories None)
+    when all are due or the last full sweep is `max_hours` old.
+    """
+    full = [run for run in runs if _is_full(run)]
+    if not full:
+        return _plan(source, True, 1.0, "no full sweep logged")
+    since_full = _hours(now, _timestamp(full[0]["started_at"]))
+    if since_full >= max_hours:
+        return _plan(source, True, 1.0, f"full sweep {since_full:.0f}h ago (maximum {max_hours:g}h)")
+
+    last_crawled = {}
+    for run in runs:
+        crawled = categories if _is_full(run) else (run.get("category_seconds") or {})
+        for category in crawled:
+            last_crawled.setdefault(category, _timestamp(run["started_at"]))
+
+    window_start = _churn_window_start(runs, now)
+    size = Counter(p["category"] for p in products)
+    changed = Counter(p["category"] for p in products
+                      if window_start is not None and _timestamp(p["scraped_at"]) >= window_start)
+    window_hours = _hours(now, window_start) if window_start is not None else 0
+
+    due = []
+    priority = 0.0
+    for category in categories:
+        if category not in last_crawled:
+            due.append(category)
+            priority = 1.0
+            continue
+        elapsed = _hours(now, last_crawled[category])
+        if elapsed < min_hours:
+            continue
+        if not window_hours:
+            staleness = 1.0
+        else:
+            staleness = changed[category] / size[category] / window_hours * elapsed if size[category] else 0.0
+        if staleness >= DUE_STALENESS:
+            due.append(category)
+            priority = max(priority, staleness)
+
+    if not due:
+        return _plan(source, False, 0.0, f"no category due (full sweep {since_full:.0f}h ago)")
+    if len(due) == len(categories):
+        return _plan(source, True, priority, "every category due")
+    return _plan(source, True, priority, f"{len(due)} of {len(categories)} categories due", due)
+
+
+def expected_seconds(runs: list, categories: list = None):
+    """Likely wall time of a run, from logged runs (newest first): the median
+    of recent full runs, or for a list of `categories` the sum of their last
+    logged crawl times. None when there's no history to go on."""
+    if categories is None:
+        walls = [float(run["wall_seconds"]) for run in runs
+                 if _is_full(run) and run.get("wall_seconds") is not None][:5]
+        return statistics.median(walls) if walls else None
+    seconds = category_seconds(runs)
+    known = [seconds[c] for c in categories if c in seconds]
+    return sum(known) if known else None
+
+
+def category_seconds(runs: list) -> dict:
+    """{category: seconds} of each category's latest logged crawl."""
+    seconds = {}
+    for run in runs:
+        for category, s in (run.get("category_seconds") or {}).items():
+            seconds.setdefault(category, float(s))
+    return seconds
+
+
+def within_budget(plans: list, budget_seconds: float, workers: int):
+    """Split due `plans`, most urgent first, into those that fit the time
+    budget and those deferred to a later run.
+
+    Assumes `workers` hosts are scraped in parallel throughout, so this is
+    a rough fit. Plans with no expected duration always fit.
+    """
+    kept, deferred = [], []
+    total = 0.0
+    for plan in sorted(plans, key=lambda p: p["priority"], reverse=True):
+        seconds = plan.get("seconds") or 0.0
+        if kept and (total + seconds) / workers > budget_seconds:
+            deferred.append(plan)
+            continue
+        total += seconds
+        kept.append(plan)
+    return kept, deferred
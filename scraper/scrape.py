@@ -8,31 +8,729 @@ Usage:
     python scrape.py                  # scrape all enabled suppliers from database
     python scrape.py kevmor           # scrape one specific supplier
     python scrape.py intafloors gibbon  # scrape specific suppliers
+    python scrape.py --concurrency 2  # limit how many supplier hosts run at once
+    python scrape.py --profile        # print a per-supplier time/traffic breakdown
+    python scrape.py kevmor --dry-run # scrape without touching Supabase
+    python scrape.py --output products.jsonl  # dry run, products saved as JSON lines
+    python scrape.py --storage postgres  # write through direct Postgres connections
+    python scrape.py --storage sqlite    # local run into scraper/scrape.sqlite
+    python scrape.py --schedule          # only what is due by observed change rate
+    python scrape.py --schedule --budget 25  # ... fitting ~25 minutes of scraping
+    python scrape.py --shard 2/3      # one of three cost-balanced shards
+    python scrape.py --finalize       # combine the shards' results
+
+Suppliers are scraped in parallel, one worker per supplier host. Suppliers
+that share a host (e.g. gibbon and gibbon_web) run one after another on the
+same worker so each site only ever sees a single scraper at a time.
+
+Fetched pages are kept in an on-disk HTTP cache (see httpcache.py) and
+revalidated with conditional GETs on the next run; pages whose content hasn't
+changed are not parsed again.
+
+Each scraper yields products a page (Kevmor: a category) at a time; a writer
+thread diffs and flushes every batch to Supabase while fetching continues.
+Progress is checkpointed per batch, so a supplier interrupted mid-scrape
+resumes after its last completed page on the next run (--no-resume to
+start over).
+
+Products are held as compact slotted records, which are also the rows
+written, and are keyed by their canonical URL, so a product linked from
+several Kevmor categories is stored once (see product.py).
+
+Failed requests (connection errors, timeouts, 429 and 5xx) are retried with
+jittered exponential backoff, honouring Retry-After. A host that throttles
+has its request rate halved, and the rate recovers gradually. A host that
+keeps failing trips a circuit breaker. A supplier whose scrape fails part way
+is logged as an error, and none of its stored products are deleted. The
+same applies when a scrape comes back far smaller than its last successful
+run (--allow-shrink to accept it). The Postgres and SQLite stores also hold
+back the run's new and changed rows. The default REST store has already
+written them by then (see storage.py).
+
+Suppliers on WooCommerce and Shopify are synced incrementally. Only products
+modified since the supplier's last successful run are fetched and merged into
+the stored catalog. Every SCRAPE_FULL_SYNC_DAYS a full sweep runs instead,
+which also removes products the supplier no longer lists. Use --sync full or
+--sync incremental to force a mode.
+
+With --schedule, only suppliers due by their observed change rate are
+scraped, most stale first, within their supplier_config min_interval_hours
+and max_interval_hours (see schedule.py). Kevmor is planned per category:
+rarely changing categories are skipped, and the due ones are crawled and
+merged without removing anything until the next full sweep. --budget caps
+the expected scraping time, deferring the least stale suppliers.
+
+A run can be split across processes or CI jobs with --shard I/N: suppliers
+(and Kevmor's categories, when it would dominate a shard) are balanced by
+their logged durations, and --finalize then completes the suppliers split
+across shards and rebuilds everything downstream (see shards.py).
+
+Products are written through a pluggable store (see storage.py): Supabase
+REST by default, or direct Postgres connections that COPY each batch into a
+staging table and merge a supplier's whole run in one transaction, or a
+local SQLite file.
+
+After scraping, product_matches and the per-supplier insight_summary behind
+insights.html are recomputed (see insights.py; --no-matching to skip), and
+the products table is published as a compact sharded
+snapshot (see snapshot.py) to the "snapshots" storage bucket, which the
+dashboard loads instead of querying every product row (--no-snapshot to
+skip, --snapshot-dir DIR to also write it locally).
 
 Environment variables:
     SUPABASE_URL        - e.g. https://xxx.supabase.co
     SUPABASE_SERVICE_KEY - service_role JWT
+    SUPABASE_DB_URL     - Postgres connection string, for --storage postgres (needs requirements-postgres.txt)
+    SCRAPE_STORAGE      - default for --storage: rest, postgres or sqlite (default rest)
+    SCRAPE_SQLITE_PATH  - database file for --storage sqlite (default scraper/scrape.sqlite)
+    SCRAPE_CONCURRENCY  - default for --concurrency (default 4)
+    SCRAPE_CACHE_PATH   - HTTP cache file (default scraper/.http_cache.sqlite)
+    SCRAPE_CACHE_MAX_MB - evict least recently used entries above this size (default 200)
+    SCRAPE_CACHE_MAX_AGE_DAYS - evict entries unused for this many days (default 14)
+    SCRAPE_CHECKPOINT_DIR - resume checkpoints (default scraper/.checkpoints)
+    SCRAPE_SHARD_DIR    - default for --shard-dir (default scraper/.shards)
+    SCRAPE_FULL_SYNC_DAYS - days between full sweeps of incrementally synced suppliers (default 7)
+    SCRAPE_HTML_PARSER  - BeautifulSoup backend (default lxml if installed, else html.parser)
+    SCRAPE_PLUGINS      - extra custom scrapers, "key=module:function,..." (imported when used)
 """
 
 import os
 import re
+import json
 import sys
 import time
+import random
 import logging
-from datetime import datetime, timezone
+import argparse
+import functools
+import importlib.util
+import inspect
+import itertools
+import queue
+import threading
+from collections import Counter, deque
+from contextlib import ExitStack, contextmanager
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
+from html import unescape
+from html.entities import html5
+from html.parser import HTMLParser
+from urllib.parse import quote, urlparse
+
+import matching
+import schedule
+import shards
+import storage
+import snapshot
+from httpcache import HttpCache
+from product import Product, ROW_FIELDS
+
+# requests, cloudscraper, bs4 and supabase are imported where they are first
+# needed, so a run only pays for the scrapers and services it uses
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s [%(threadName)s] %(message)s")
+logger = logging.getLogger(__name__)
 
-import cloudscraper
-import requests
-from bs4 import BeautifulSoup
-from supabase import create_client
+_supabase = None
+_supabase_lock = threading.Lock()
 
-logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
-logger = logging.getLogger(__name__)
 
-SUPABASE_URL = os.environ["SUPABASE_URL"]
-SUPABASE_KEY = os.environ["SUPABASE_SERVICE_KEY"]
+def get_supabase():
+    """The Supabase client, created from SUPABASE_URL / SUPABASE_SERVICE_KEY on first use."""
+    global _supabase
+    with _supabase_lock:
+        if _supabase is None:
+            from supabase import create_client
+            _supabase = create_client(os.environ["SUPABASE_URL"], os.environ["SUPABASE_SERVICE_KEY"])
+        return _supabase
+
+
+def set_supabase(client):
+    """Use `client` (e.g. memdb.MemorySupabase) instead of connecting to Supabase."""
+    global _supabase
+    with _supabase_lock:
+        _supabase = client
+
+
+STORE = os.environ.get("SCRAPE_STORAGE", "rest")
+DATABASE_URL = os.environ.get("SUPABASE_DB_URL")
+SQLITE_PATH = os.environ.get("SCRAPE_SQLITE_PATH")
+
+_store = None
+
+
+def get_store() -> storage.Store:
+    """Where ProductWriter writes (see storage.py); Supabase REST unless set_store() chose another."""
+    global _store
+    with _supabase_lock:
+        if _store is None:
+            _store = storage.RestStore(get_supabase)
+        return _store
+
+
+def set_store(store: storage.Store):
+    global _store
+    with _supabase_lock:
+        _store = store
+
+# ---------------------------------------------------------------------------
+# Telemetry
+# ---------------------------------------------------------------------------
+
+class ScrapeStats:
+    """Request counts, traffic and time breakdown for one supplier's scrape.
+
+    Updated from the scraper's worker threads and its writer thread; timers
+    are summed across threads, so with concurrent fetching `fetch` can exceed
+    the wall time.
+    """
+
+    TIMERS = ("throttle", "fetch", "parse", "write")
+
+    def __init__(self, source: str):
+        self.source = source
+        self.requests = 0
+        self.bytes = 0
+        self.statuses = Counter()
+        self.session_resets = 0
+        self.retries = 0
+        self.seconds = dict.fromkeys(self.TIMERS, 0.0)
+        self.category_seconds = {}
+        self.wall = 0.0
+        self._started = time.monotonic()
+        self._lock = threading.Lock()
+
+    def add_time(self, kind: str, seconds: float):
+        with self._lock:
+            self.seconds[kind] += seconds
+
+    @contextmanager
+    def timer(self, kind: str):
+        t0 = time.monotonic()
+        try:
+            yield
+        finally:
+            self.add_time(kind, time.monotonic() - t0)
+
+    def record_category(self, category: str, seconds: float):
+        """Crawl time of one category, for scrapers that crawl by category."""
+        with self._lock:
+            self.category_seconds[category] = round(seconds, 1)
+
+    def record_response(self, r):
+        revalidated = getattr(r, "cache_status", None) == "revalidated"
+        with self._lock:
+            self.requests += 1
+            self.statuses[304 if revalidated else r.status_code] += 1
+            if not revalidated:
+                self.bytes += len(r.content)
+
+    def count_session_reset(self):
+        with self._lock:
+            self.session_resets += 1
+
+    def count_retry(self):
+        with self._lock:
+            self.retries += 1
+
+    def finish(self):
+        self.wall = time.monotonic() - self._started
+
+    def log_columns(self) -> dict:
+        """scrape_log columns for these stats."""
+        return {
+            "request_count": self.requests,
+            "bytes_downloaded": self.bytes,
+            "status_counts": {str(k): v for k, v in sorted(self.statuses.items())},
+            "session_resets": self.session_resets,
+            "retry_count": self.retries,
+            "wall_seconds": round(self.wall, 2),
+            **{f"{kind}_seconds": round(self.seconds[kind], 2) for kind in self.TIMERS},
+            "category_seconds": dict(self.category_seconds) or None,
+        }
+
+    def summary(self) -> str:
+        statuses = " ".join(f"{k}x{v}" for k, v in sorted(self.statuses.items()))
+        times = ", ".join(f"{kind} {self.seconds[kind]:.1f}s" for kind in self.TIMERS)
+        return (f"{self.requests} requests ({statuses or 'none'}), {self.bytes / 2**20:.1f} MB, "
+                f"{self.session_resets} session resets, {self.retries} retries; {times}; wall {self.wall:.1f}s")
+
+
+def print_profile(all_stats: list):
+    """Print a per-supplier breakdown table, slowest first."""
+    header = (f"{'source':<14}{'wall s':>8}{'fetch s':>9}{'throttle s':>11}{'parse s':>9}"
+              f"{'write s':>9}{'requests':>10}{'MB':>8}{'resets':>8}{'retries':>9}  statuses")
+    print(header)
+    print("-" * len(header))
+    for st in sorted(all_stats, key=lambda st: st.wall, reverse=True):
+        statuses = " ".join(f"{k}x{v}" for k, v in sorted(st.statuses.items()))
+        print(f"{st.source:<14}{st.wall:>8.1f}{st.seconds['fetch']:>9.1f}{st.seconds['throttle']:>11.1f}"
+              f"{st.seconds['parse']:>9.1f}{st.seconds['write']:>9.1f}{st.requests:>10}"
+              f"{st.bytes / 2**20:>8.1f}{st.session_resets:>8}{st.retries:>9}  {statuses}")
+
+
+# ---------------------------------------------------------------------------
+# HTTP helpers
+# ---------------------------------------------------------------------------
+
+# Defaults for suppliers whose supplier_config row doesn't override them
+DEFAULT_PAGE_CONCURRENCY = 4
+DEFAULT_REQUESTS_PER_SECOND = 3.0
+
+# Retries for connection errors, timeouts and these statuses
+MAX_RETRIES = 4
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+RETRY_BASE_DELAY = 1.0   # Backoff before retry n is uniform in [0, base * 2**n], capped
+RETRY_MAX_DELAY = 30.0
+RETRY_AFTER_MAX = 120.0  # Longest Retry-After honoured
+
+# Statuses that mean the host wants fewer requests; they halve its rate
+THROTTLE_STATUSES = (429, 503)
+MIN_RATE_FRACTION = 0.125  # Floor for the adaptive rate, as a fraction of the configured rate
+RATE_RECOVERY_STEP = 0.05  # Configured rate regained per successful request
+
+# Consecutive failed requests that open a host's circuit, and how long it stays open
+BREAKER_THRESHOLD = 8
+BREAKER_COOLDOWN = 60.0
+
+
+class ScrapeError(Exception):
+    """A supplier's catalog couldn't be fetched completely."""
+
+
+class CircuitOpenError(ScrapeError):
+    """Requests to a host are suspended after repeated failures."""
+
+
+def _host_of(url: str) -> str:
+    """Politeness key for a supplier URL (www. prefix ignored)."""
+    host = urlparse(url).netloc.lower()
+    return host[4:] if host.startswith("www.") else host
+
+
+class TokenBucket:
+    """Thread-safe token bucket allowing `rate` requests/sec, bursting to `capacity`.
+
+    The rate adapts to the host. throttle() halves it, down to a floor, and can
+    hold every request for a while. Each successful request wins a little of
+    it back, up to the configured `max_rate`.
+    """
+
+    def __init__(self, rate: float, capacity: float = 1.0):
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+        self.rate = rate
+        self.set_rate(rate)
+
+    def set_rate(self, rate: float):
+        """Set the configured rate. A throttled rate stays throttled (it only
+        drops, to the new rate if that is lower) and recovers towards `rate`."""
+        with self._lock:
+            self.max_rate = rate
+            self.min_rate = rate * MIN_RATE_FRACTION
+            self.rate = max(self.min_rate, min(self.rate, rate))
+
+    def acquire(self) -> float:
+        """Block until a request may be sent; returns the seconds waited."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    wait = self._paused_until - now
+                else:
+                    self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                    self._updated = now
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return waited
+                    wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+    def throttle(self, pause: float = 0.0) -> float:
+        """Back off after the host pushed back: halve the rate and hold every
+        request for `pause` seconds. Returns the new rate."""
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+            self._paused_until = max(self._paused_until, time.monotonic() + pause)
+            return self.rate
+
+    def recover(self):
+        """Creep back towards the configured rate after a successful request."""
+        with self._lock:
+            if self.rate < self.max_rate:
+                self.rate = min(self.max_rate, self.rate + self.max_rate * RATE_RECOVERY_STEP)
+
+
+class CircuitBreaker:
+    """Stops requests to a host that keeps failing.
+
+    The circuit opens after `threshold` consecutive failed requests. While it
+    is open, requests fail at once with CircuitOpenError. After `cooldown`
+    seconds a single trial request is let through. If it succeeds the circuit
+    closes, and if it fails the circuit opens again.
+    """
+
+    def __init__(self, host: str, threshold: int = BREAKER_THRESHOLD, cooldown: float = BREAKER_COOLDOWN):
+        self.host = host
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self._opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    def before_request(self):
+        """Raise CircuitOpenError unless a request to the host may be sent."""
+        with self._lock:
+            if self._opened_at is None:
+                return
+            if self._trial or time.monotonic() - self._opened_at < self.cooldown:
+                raise CircuitOpenError(f"{self.host}: circuit open after "
+                                       f"{self.failures} consecutive failed requests")
+            self._trial = True
+
+    def record(self, ok: bool):
+        with self._lock:
+            if ok:
+                if self._opened_at is not None:
+                    logger.info(f"{self.host}: circuit closed")
+                self.failures = 0
+                self._opened_at = None
+                self._trial = False
+                return
+            self.failures += 1
+            if self._trial or (self._opened_at is None and self.failures >= self.threshold):
+                logger.warning(f"{self.host}: circuit opened after {self.failures} consecutive "
+                               f"failed requests; pausing {self.cooldown:.0f}s")
+                self._opened_at = time.monotonic()
+                self._trial = False
+
+
+_host_buckets = {}
+_host_buckets_lock = threading.Lock()
+
+
+def host_bucket(url: str, rate: float = None) -> TokenBucket:
+    """Shared token bucket for the host of `url`; `rate` overrides the host's
+    configured rate, keeping any backoff already applied to it."""
+    host = _host_of(url)
+    with _host_buckets_lock:
+        bucket = _host_buckets.get(host)
+        if bucket is None:
+            bucket = _host_buckets[host] = TokenBucket(rate or DEFAULT_REQUESTS_PER_SECOND)
+        elif rate:
+            bucket.set_rate(rate)
+        return bucket
+
+
+_host_breakers = {}
+
+
+def host_breaker(url: str) -> CircuitBreaker:
+    """Shared circuit breaker for the host of `url`."""
+    host = _host_of(url)
+    with _host_buckets_lock:
+        breaker = _host_breakers.get(host)
+        if breaker is None:
+            breaker = _host_breakers[host] = CircuitBreaker(host)
+        return breaker
+
+
+CACHE_PATH = os.environ.get(
+    "SCRAPE_CACHE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".http_cache.sqlite")
+)
+CACHE_MAX_MB = float(os.environ.get("SCRAPE_CACHE_MAX_MB", "200"))
+CACHE_MAX_AGE_DAYS = float(os.environ.get("SCRAPE_CACHE_MAX_AGE_DAYS", "14"))
+
+# Set by main(); None disables caching
+http_cache = None
+
+# Set by replay.record() to capture responses into a fixture
+http_recorder = None
+
+
+def _retry_after(r) -> float:
+    """Seconds a Retry-After header asks to wait (capped), or None."""
+    value = r.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            seconds = (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds()
+        except (TypeError, ValueError):
+            return None
+    return min(max(seconds, 0.0), RETRY_AFTER_MAX)
+
+
+def http_get(session, url: str, bucket: TokenBucket = None, stats: ScrapeStats = None,
+             cache: bool = True, retries: int = MAX_RETRIES, **kwargs):
+    """session.get() for the scrapers.
+
+    Waits for the host's token bucket, goes through the HTTP cache when one is
+    enabled (and `cache` is set), and records the request in `stats`.
+
+    Connection errors, timeouts and RETRY_STATUSES are retried up to `retries`
+    times, after the Retry-After delay if the response gives one and otherwise
+    with jittered exponential backoff. A 429 or 503 also throttles `bucket`,
+    and the pause then applies to every request to the host. When retries run
+    out the last response is returned, or the last connection error re-raised.
+    Raises CircuitOpenError while the host's circuit breaker is open.
+    """
+    import requests
+
+    breaker = host_breaker(url)
+    for attempt in range(retries + 1):
+        breaker.before_request()
+        waited = bucket.acquire() if bucket is not None else 0.0
+        t0 = time.monotonic()
+        error = r = None
+        try:
+            if cache and http_cache is not None:
+                r = http_cache.get(session, url, **kwargs)
+            else:
+                r = session.get(url, **kwargs)
+        except requests.RequestException as e:
+            error = e
+        if stats is not None:
+            stats.add_time("throttle", waited)
+            stats.add_time("fetch", time.monotonic() - t0)
+            if r is not None:
+                stats.record_response(r)
+        if r is not None and http_recorder is not None:
+            http_recorder.record(url, r)
+
+        if r is not None and r.status_code not in RETRY_STATUSES:
+            breaker.record(True)
+            if bucket is not None:
+                bucket.recover()
+            return r
+        breaker.record(False)
+        if attempt == retries:
+            break
+
+        delay = _retry_after(r) if r is not None else None
+        if delay is None:
+            delay = random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt))
+        reason = error or f"HTTP {r.status_code}"
+        if stats is not None:
+            stats.count_retry()
+        if bucket is not None and r is not None and r.status_code in THROTTLE_STATUSES:
+            rate = bucket.throttle(delay)
+            logger.warning(f"{_host_of(url)} is throttling ({reason}); "
+                           f"rate now {rate:.2f}/s, retrying in {delay:.1f}s")
+        else:
+            logger.info(f"Retrying {url} in {delay:.1f}s ({reason})")
+            time.sleep(delay)
+            if stats is not None:
+                stats.add_time("throttle", delay)
+
+    if error is not None:
+        raise error
+    return r
+
+
+def parse_cached(r, parse_fn, context: str = "", stats: ScrapeStats = None):
+    """parse_fn(r), skipped in favour of the cached result if the page is unchanged."""
+    t0 = time.monotonic()
+    try:
+        if http_cache is None:
+            return parse_fn(r)
+        return http_cache.parse(r, parse_fn, context)
+    finally:
+        if stats is not None:
+            stats.add_time("parse", time.monotonic() - t0)
+
+
+# ---------------------------------------------------------------------------
+# Scraper plugins
+# ---------------------------------------------------------------------------
+
+class ScraperRegistry:
+    """Scraper plugins by name, resolved on first use.
+
+    A plugin is a scraper function, or a "module:function" path that is only
+    imported the first time the plugin is looked up.
+    """
+
+    def __init__(self):
+        self._plugins = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str, target=None):
+        """Register `target` under `name`; without a target, works as a decorator."""
+        if target is None:
+            return functools.partial(self.register, name)
+        with self._lock:
+            self._plugins[name] = target
+        return target
+
+    def get(self, name: str):
+        """The scraper function for `name`. Raises KeyError if none is registered,
+        ImportError if its module can't be loaded."""
+        with self._lock:
+            target = self._plugins[name]
+            if isinstance(target, str):
+                module, _, attr = target.partition(":")
+                target = self._plugins[name] = getattr(importlib.import_module(module), attr)
+            return target
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._plugins
+
+
+# Scrapers for supplier_config types, called as func(base_url, source, **opts)
+PLATFORMS = ScraperRegistry()
+
+# Scrapers for "custom" suppliers, by supplier key, called as func(**opts)
+CUSTOM_SCRAPERS = ScraperRegistry()
+
+# Extra custom scrapers as "key=module:function,...", loaded when first used
+for _entry in filter(None, os.environ.get("SCRAPE_PLUGINS", "").split(",")):
+    _key, _, _target = _entry.partition("=")
+    CUSTOM_SCRAPERS.register(_key.strip(), _target.strip())
+
+
+# ---------------------------------------------------------------------------
+# HTML parsing
+# ---------------------------------------------------------------------------
+
+HTML_PARSER = os.environ.get(
+    "SCRAPE_HTML_PARSER", "lxml" if importlib.util.find_spec("lxml") else "html.parser"
+)
+
+
+class _TextExtractor(HTMLParser):
+    """Collects stripped text nodes, skipping script, style and template contents.
+
+    HTMLParser may deliver one text node in several chunks (e.g. at a bare
+    "<"), so chunks are joined until the next tag, comment or declaration,
+    where the node ends, and only then stripped. Open tags are tracked the
+    way BeautifulSoup's tree builder does, so an end tag also closes the
+    tags opened inside it.
+
+    Character references are resolved as BeautifulSoup's html.parser builder
+    does it: as they are parsed (convert_charrefs=False), so markup HTMLParser
+    gives up on at the end of the input, such as an unfinished tag, is kept
+    verbatim rather than unescaped.
+    """
+
+    SKIPPED = frozenset(("script", "style", "template"))
+
+    # Tags BeautifulSoup treats as empty, which are never left open
+    VOID = frozenset(("area", "base", "br", "col", "embed", "hr", "img", "input", "keygen", "link",
+                      "menuitem", "meta", "param", "source", "track", "wbr", "basefont", "bgsound",
+                      "command", "frame", "image", "isindex", "nextid", "spacer"))
+
+    def __init__(self):
+        super().__init__(convert_charrefs=False)
+        self.parts = []
+        self._chunks = []
+        self._open = []
+        self._skip = 0  # SKIPPED tags in self._open
+
+    def _end_node(self):
+        if self._chunks:
+            text = "".join(self._chunks).strip()
+            self._chunks = []
+            if text:
+                self.parts.append(text)
+
+    def handle_starttag(self, tag, attrs):
+        self._end_node()
+        if tag not in self.VOID:
+            self._open.append(tag)
+            self._skip += tag in self.SKIPPED
+
+    def handle_startendtag(self, tag, attrs):
+        self._end_node()
+
+    def handle_endtag(self, tag):
+        self._end_node()
+        if tag in self._open:
+            while True:
+                closed = self._open.pop()
+                self._skip -= closed in self.SKIPPED
+                if closed == tag:
+                    break
 
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+    def handle_data(self, data):
+        if not self._skip:
+            self._chunks.append(data)
+
+    def handle_charref(self, name):
+        # HTML5's rules, except that control characters are kept, not dropped
+        code = int(name[1:], 16) if name[:1] in "xX" else int(name)
+        self.handle_data(unescape(f"&#{name};") or chr(code))
+
+    def handle_entityref(self, name):
+        # An unknown name is literal text, "&" and all
+        self.handle_data(html5.get(name + ";", "&" + name))
+
+    def handle_comment(self, data):
+        self._end_node()
+
+    def handle_decl(self, decl):
+        self._end_node()
+
+    def handle_pi(self, data):
+        self._end_node()
+
+    def unknown_decl(self, data):
+        self._end_node()
+        if data.startswith("CDATA["):
+            # BeautifulSoup keeps CDATA sections even inside skipped tags
+            self._chunks.append(data[6:])
+            self._end_node()
+
+    def close(self):
+        super().close()
+        self._end_node()
+
+
+def html_to_text(html: str) -> str:
+    """Text of an HTML fragment, as BeautifulSoup's get_text(strip=True) gives it,
+    without building a tree."""
+    if not html:
+        return ""
+    if "<" not in html and "&" not in html:
+        return html.strip()
+    extractor = _TextExtractor()
+    extractor.feed(html)
+    extractor.close()
+    return "".join(extractor.parts)
+
+
+def _fetch_pages(fetch_page, start: int, stop: int = None, concurrency: int = 1,
+                 name: str = "page"):
+    """Yield (page, future) for pages start..stop in page order.
+
+    Up to `concurrency` pages are in flight at once. With no `stop` pages are
+    fetched until the caller stops iterating; pages still queued at that point
+    are cancelled.
+    """
+    concurrency = max(1, concurrency)
+    pages = itertools.count(start) if stop is None else iter(range(start, stop + 1))
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix=name) as pool:
+        window = deque((page, pool.submit(fetch_page, page))
+                       for page in itertools.islice(pages, concurrency))
+        try:
+            while window:
+                page, future = window.popleft()
+                nxt = next(pages, None)
+                if nxt is not None:
+                    window.append((nxt, pool.submit(fetch_page, nxt)))
+                yield page, future
+        finally:
+            for _, future in window:
+                future.cancel()
 
 # ---------------------------------------------------------------------------
 # Kevmor
@@ -139,188 +837,364 @@ def _parse_kevmor_price(text: str):
         return None, text
 
 
-def scrape_kevmor():
-    logger.info("Starting Kevmor scrape...")
-    scraper = cloudscraper.create_scraper()
+KEVMOR_BASE_URL = "https://kevmor.com.au"
+KEVMOR_CONCURRENCY = 3             # Categories crawled in parallel
+KEVMOR_REQUESTS_PER_SECOND = 2.0   # Kept low: kevmor.com.au sits behind Cloudflare
+KEVMOR_MAX_PAGES = 20
+
+
+# Only product tiles and links (for rel=next) are parsed from category pages
+KEVMOR_STRAINER_TAGS = ("article", "a", "link")
+
+
+@functools.lru_cache(maxsize=None)
+def _kevmor_strainer():
+    from bs4 import SoupStrainer
+    return SoupStrainer(list(KEVMOR_STRAINER_TAGS))
+
+
+def _parse_kevmor_page(r, category: str, parser: str = None, strained: bool = True) -> dict:
+    """Products on one category page, plus whether a next page is linked.
+
+    `strained` limits the parse to KEVMOR_STRAINER_TAGS; the result is the same.
+    """
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(r.text, parser or HTML_PARSER,
+                         parse_only=_kevmor_strainer() if strained else None)
+    items = soup.select("article.product-miniature")
     products = []
-    seen_urls = set()
+    for item in items:
+        name_el = item.select_one(".product-title a, h3 a, h2 a")
+        price_el = item.select_one(".price, [class*=price]")
+        img_el = item.select_one("img")
+        link_el = item.select_one("a[href]")
+        name = name_el.get_text(strip=True) if name_el else None
+        if not name:
+            continue
+        href = (name_el or link_el or {}).get("href", "")
+        price_text = price_el.get_text(strip=True) if price_el else ""
+        price_val, price_display = _parse_kevmor_price(price_text)
+        img_src = img_el.get("src", "") if img_el else ""
+        products.append({
+            "source": "kevmor",
+            "name": name,
+            "price": price_val,
+            "price_display": price_display,
+            "url": href,
+            "image": img_src,
+            "category": category,
+        })
+    return {
+        "items": len(items),
+        "products": products,
+        "has_next": soup.select_one("a.next, [rel=next]") is not None,
+    }
+
+
+def _scrape_kevmor_category(sessions: queue.Queue, bucket: TokenBucket, url: str, category: str,
+                            stats: ScrapeStats = None):
+    """Crawl every page of one Kevmor category.
+
+    Borrows a cloudscraper session from `sessions` for the duration of the
+    category. Returns (products, pages fetched); raises ScrapeError if a page
+    can't be fetched, rather than returning part of the category. A 404 for
+    the first page is a category the site has removed, which has no products.
+    """
+    products = []
+    page = 0
+    scraper = sessions.get()
+    try:
+        while page < KEVMOR_MAX_PAGES:
+            page += 1
+            page_url = f"{url}?page={page}" if page > 1 else url
+            r = http_get(scraper, page_url, bucket, stats, timeout=20)
+            if r.status_code == 404 and page == 1:
+                logger.warning(f"Kevmor {category}: HTTP 404, category removed? Skipping it")
+                break
+            if r.status_code != 200:
+                raise ScrapeError(f"Kevmor {category} page {page}: HTTP {r.status_code}")
+            parsed = parse_cached(r, lambda r: _parse_kevmor_page(r, category), category, stats)
+            if not parsed["items"]:
+                break
+            products.extend(Product.from_dict(p) for p in parsed["products"])
+            if not parsed["has_next"]:
+                break
+    finally:
+        sessions.put(scraper)
+    return products, page
+
 
-    for idx, (url, category) in enumerate(KEVMOR_CATEGORIES):
-        logger.info(f"  Kevmor: {category} ({idx+1}/{len(KEVMOR_CATEGORIES)})")
+@CUSTOM_SCRAPERS.register("kevmor")
+def scrape_kevmor(concurrency=KEVMOR_CONCURRENCY, rate=None, start=0, stats=None, categories=None):
+    """Crawl KEVMOR_CATEGORIES (or `categories`), `concurrency` categories at a time.
+
+    Workers share a small pool of cloudscraper sessions and the kevmor.com.au
+    token bucket, so total request rate stays the same however many categories
+    run at once. Categories are yielded in list order as
+    (index of the next category, products), so a product listed in several
+    categories (under any variant fragment, see product.canonical_url) keeps
+    the first one, as in a sequential crawl. `start` skips
+    categories already written by an interrupted run.
+    """
+    import cloudscraper
+
+    logger.info("Starting Kevmor scrape...")
+    categories = categories or KEVMOR_CATEGORIES
+    concurrency = max(1, concurrency)
+    bucket = host_bucket(categories[0][0], rate or KEVMOR_REQUESTS_PER_SECOND)
+    sessions = queue.Queue()
+    for _ in range(concurrency):
+        sessions.put(cloudscraper.create_scraper())
+
+    def crawl(url, category):
+        started = time.monotonic()
+        found, pages = _scrape_kevmor_category(sessions, bucket, url, category, stats)
+        return found, pages, time.monotonic() - started
+
+    count = 0
+    seen_urls = set()
+    timings = []
+    total = len(categories)
+    todo = list(enumerate(categories))[start:]
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="kevmor") as pool:
+        futures = [pool.submit(crawl, url, category) for _, (url, category) in todo]
         try:
-            page = 1
-            while True:
-                page_url = f"{url}?page={page}" if page > 1 else url
-                r = scraper.get(page_url, timeout=20)
-                if r.status_code != 200:
-                    break
-                soup = BeautifulSoup(r.text, "html.parser")
-                items = soup.select("article.product-miniature")
-                if not items:
-                    break
-                for item in items:
-                    name_el = item.select_one(".product-title a, h3 a, h2 a")
-                    price_el = item.select_one(".price, [class*=price]")
-                    img_el = item.select_one("img")
-                    link_el = item.select_one("a[href]")
-                    name = name_el.get_text(strip=True) if name_el else None
-                    href = (name_el or link_el or {}).get("href", "")
-                    if not name or href in seen_urls:
+            for (idx, (_, category)), future in zip(todo, futures):
+                found, pages, elapsed = future.result()
+                batch = []
+                for p in found:
+                    if p.url in seen_urls:
                         continue
-                    seen_urls.add(href)
-                    price_text = price_el.get_text(strip=True) if price_el else ""
-                    price_val, price_display = _parse_kevmor_price(price_text)
-                    img_src = img_el.get("src", "") if img_el else ""
-                    products.append({
-                        "source": "kevmor",
-                        "name": name,
-                        "price": price_val,
-                        "price_display": price_display,
-                        "url": href,
-                        "image": img_src,
-                        "category": category,
-                    })
-                next_link = soup.select_one("a.next, [rel=next]")
-                if next_link and page < 20:
-                    page += 1
-                    time.sleep(0.3)
-                else:
-                    break
-            time.sleep(0.5)
-        except Exception as e:
-            logger.warning(f"Kevmor error on {category}: {e}")
+                    seen_urls.add(p.url)
+                    batch.append(p)
+                count += len(batch)
+                timings.append((elapsed, category))
+                if stats is not None:
+                    stats.record_category(category, elapsed)
+                logger.info(f"  Kevmor: {category} ({idx+1}/{total}) - "
+                            f"{len(batch)} new of {len(found)} in {pages} pages, {elapsed:.1f}s")
+                yield idx + 1, batch
+        finally:
+            for future in futures:
+                future.cancel()
 
-    logger.info(f"Kevmor done: {len(products)} products")
-    return products
+    slowest = ", ".join(f"{c} {t:.1f}s" for t, c in sorted(timings, reverse=True)[:5])
+    logger.info(f"Kevmor done: {count} products (slowest: {slowest})")
+
+
+# Suppliers whose scraper takes a `categories` subset of these (url, label)
+# pairs, so a run can crawl just some of them (see schedule.py)
+CATEGORY_SCRAPERS = {"kevmor": KEVMOR_CATEGORIES}
+
+# Their request rates without a supplier_config requests_per_second, which
+# sharding divides between the shares of a split supplier (see shards.py)
+CATEGORY_SCRAPER_RATES = {"kevmor": KEVMOR_REQUESTS_PER_SECOND}
 
 
 # ---------------------------------------------------------------------------
 # Intafloors (WooCommerce Store API)
 # ---------------------------------------------------------------------------
 
-def _scrape_woocommerce(base_url, source_name):
-    """Generic WooCommerce Store API scraper."""
+def _parse_woocommerce_product(p: dict, cat_map: dict, source: str) -> dict:
+    prices = p.get("prices", {})
+    price_raw = prices.get("price", "0")
+    regular_raw = prices.get("regular_price", "0")
+    minor_unit = prices.get("currency_minor_unit", 2)
+    try:
+        price_val = int(price_raw) / (10 ** minor_unit) if price_raw else 0
+        regular_val = int(regular_raw) / (10 ** minor_unit) if regular_raw else 0
+    except (ValueError, TypeError):
+        price_val, regular_val = 0, 0
+
+    if price_val == 0:
+        price_display = "Contact for Price"
+    elif price_val < regular_val:
+        price_display = f"${price_val:,.2f} (was ${regular_val:,.2f}) GST excl."
+    else:
+        price_display = f"${price_val:,.2f} GST excl."
+
+    cat_ids = [c["id"] for c in p.get("categories", [])]
+    cat_names = [cat_map.get(cid, f"cat-{cid}") for cid in cat_ids]
+    imgs = p.get("images", [])
+    img_src = imgs[0].get("thumbnail", "") if imgs else ""
+
+    return {
+        "source": source,
+        "name": p.get("name", "Unknown"),
+        "price": price_val if price_val > 0 else None,
+        "price_display": price_display,
+        "url": p.get("permalink", ""),
+        "image": img_src,
+        "category": ", ".join(cat_names[:2]) if cat_names else "Uncategorized",
+        "sku": p.get("sku", ""),
+        "description": html_to_text(p.get("short_description", ""))[:200],
+    }
+
+
+@PLATFORMS.register("woocommerce")
+def _scrape_woocommerce(base_url, source_name, concurrency=DEFAULT_PAGE_CONCURRENCY, rate=None,
+                        start=1, stats=None, since=None):
+    """Generic WooCommerce Store API scraper.
+
+    Yields (next page, products) for each page from `start` on. The first page
+    is fetched alone to learn X-WP-TotalPages; the remaining pages are fetched
+    `concurrency` at a time, throttled by the host's token bucket. A page that
+    still fails after retries raises ScrapeError.
+
+    With `since` (a UTC datetime) only products modified after it are listed,
+    oldest change first, using the Store API's modified-date filter.
+    """
+    import requests
+
     logger.info(f"Starting {source_name} scrape...")
+    source = source_name.lower().replace(" ", "_")
+    bucket = host_bucket(base_url, rate)
     session = requests.Session()
     session.headers.update({
         "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
                        "(KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36",
-        "Accept": "text/html,application/xhtml+xml",
+        "Accept": "application/json",
         "Accept-Language": "en-AU,en;q=0.9",
     })
 
+    def establish_session():
+        http_get(session, f"{base_url}/shop/", bucket, stats, cache=False, timeout=20,
+                 headers={"Accept": "text/html,application/xhtml+xml"})
+
     # Visit shop to establish session
-    session.get(f"{base_url}/shop/", timeout=20)
-    session.headers["Accept"] = "application/json"
+    establish_session()
 
     api = f"{base_url}/wp-json/wc/store/v1"
 
+    def get_api(url, timeout=30):
+        return http_get(session, url, bucket, stats, timeout=timeout)
+
     # Get categories
     cat_map = {}
     try:
-        r = session.get(f"{api}/products/categories?per_page=100", timeout=20)
+        r = get_api(f"{api}/products/categories?per_page=100", timeout=20)
         if r.status_code == 200:
             for cat in r.json():
                 cat_map[cat["id"]] = cat["name"]
     except Exception as e:
         logger.warning(f"{source_name} categories error: {e}")
-
-    products = []
-    page = 1
-    while True:
-        logger.info(f"  {source_name}: page {page} ({len(products)} so far)")
-        try:
-            r = session.get(f"{api}/products?per_page=100&page={page}", timeout=30)
-            if r.status_code != 200:
-                # Re-establish session
-                session.headers["Accept"] = "text/html"
-                session.get(f"{base_url}/shop/", timeout=20)
-                session.headers["Accept"] = "application/json"
-                r = session.get(f"{api}/products?per_page=100&page={page}", timeout=30)
-                if r.status_code != 200:
-                    break
-
-            data = r.json()
-            if not data:
-                break
-
-            for p in data:
-                prices = p.get("prices", {})
-                price_raw = prices.get("price", "0")
-                regular_raw = prices.get("regular_price", "0")
-                minor_unit = prices.get("currency_minor_unit", 2)
-                try:
-                    price_val = int(price_raw) / (10 ** minor_unit) if price_raw else 0
-                    regular_val = int(regular_raw) / (10 ** minor_unit) if regular_raw else 0
-                except (ValueError, TypeError):
-                    price_val, regular_val = 0, 0
-
-                if price_val == 0:
-                    price_display = "Contact for Price"
-                elif price_val < regular_val:
-                    price_display = f"${price_val:,.2f} (was ${regular_val:,.2f}) GST excl."
-                else:
-                    price_display = f"${price_val:,.2f} GST excl."
-
-                cat_ids = [c["id"] for c in p.get("categories", [])]
-                cat_names = [cat_map.get(cid, f"cat-{cid}") for cid in cat_ids]
-                imgs = p.get("images", [])
-                img_src = imgs[0].get("thumbnail", "") if imgs else ""
-
-                products.append({
-                    "source": source_name.lower().replace(" ", "_"),
-                    "name": p.get("name", "Unknown"),
-                    "price": price_val if price_val > 0 else None,
-                    "price_display": price_display,
-                    "url": p.get("permalink", ""),
-                    "image": img_src,
-                    "category": ", ".join(cat_names[:2]) if cat_names else "Uncategorized",
-                    "sku": p.get("sku", ""),
-                    "description": BeautifulSoup(
-                        p.get("short_description", ""), "html.parser"
-                    ).get_text(strip=True)[:200],
-                })
-
-            total_pages = int(r.headers.get("X-WP-TotalPages", 999))
-            if page >= total_pages:
-                break
-            page += 1
-            time.sleep(0.3)
-        except Exception as e:
-            logger.warning(f"{source_name} error on page {page}: {e}")
+    cat_context = repr(sorted(cat_map.items()))
+
+    def parse_page(r):
+        return [_parse_woocommerce_product(p, cat_map, source) for p in r.json()]
+
+    list_query = "per_page=100"
+    if since is not None:
+        after = quote(since.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S"))
+        list_query += f"&orderby=modified&order=asc&date_column=modified_gmt&after={after}"
+
+    def fetch_page(page):
+        """Return the products on a page, or None once the catalog is exhausted."""
+        url = f"{api}/products?{list_query}&page={page}"
+        r = get_api(url)
+        if r.status_code not in (200, 400) and r.status_code not in RETRY_STATUSES:
+            # Re-establish session
+            if stats is not None:
+                stats.count_session_reset()
+            establish_session()
+            r = get_api(url)
+        if r.status_code == 400 and page > 1:
+            # The Store API rejects page numbers past the last page. An empty
+            # catalog (or no changes since `since`) is a 200 with no products,
+            # so a 400 on the first page means the query itself was rejected.
+            return None, r
+        if r.status_code != 200:
+            raise ScrapeError(f"{source_name} page {page}: HTTP {r.status_code}")
+        rows = [Product.from_dict(p) for p in parse_cached(r, parse_page, cat_context, stats)]
+        return rows or None, r
+
+    count = 0
+    logger.info(f"  {source_name}: page {start}")
+    rows, r = fetch_page(start)
+    if rows is None:
+        logger.info(f"{source_name} done: {count} products")
+        return
+    count += len(rows)
+    yield start + 1, rows
+    total_pages = int(r.headers.get("X-WP-TotalPages", 0)) or None
+
+    for page, future in _fetch_pages(fetch_page, start + 1, total_pages, concurrency,
+                                     name=f"{source}-page"):
+        rows, _ = future.result()
+        if rows is None:
             break
+        count += len(rows)
+        logger.info(f"  {source_name}: page {page}/{total_pages or '?'} ({count} so far)")
+        yield page + 1, rows
 
-    logger.info(f"{source_name} done: {len(products)} products")
-    return products
-
-
-def scrape_intafloors():
-    return _scrape_woocommerce("https://intafloors.com.au", "intafloors")
-
-
-def scrape_gibbon():
-    return _scrape_woocommerce("https://gibbontrade.com.au", "gibbon_web")
-
+    logger.info(f"{source_name} done: {count} products")
 
-def scrape_marques():
-    return _scrape_woocommerce("https://marquesflooring.com.au", "marques")
 
+# ---------------------------------------------------------------------------
+# Shopify Store API
+# ---------------------------------------------------------------------------
 
-def scrape_floortrade():
-    return _scrape_woocommerce("https://www.floortrade.au", "floortrade")
+def _parse_shopify_product(p: dict, base_url: str, source: str) -> dict:
+    variant = p.get("variants", [{}])[0]
+    try:
+        price_val = float(variant.get("price", "0") or "0")
+    except (ValueError, TypeError):
+        price_val = 0
 
+    compare_at = None
+    try:
+        raw = variant.get("compare_at_price")
+        if raw:
+            compare_at = float(raw)
+    except (ValueError, TypeError):
+        pass
+
+    if price_val == 0:
+        price_display = "Contact for Price"
+    elif compare_at and compare_at > price_val:
+        price_display = f"${price_val:,.2f} (was ${compare_at:,.2f})"
+    else:
+        price_display = f"${price_val:,.2f}"
 
-def scrape_homely():
-    return _scrape_woocommerce("https://www.homelyflooring.com.au", "homely")
+    # Strip HTML from body_html for description
+    description = html_to_text(p.get("body_html") or "")[:200]
 
+    imgs = p.get("images", [])
+    img_src = imgs[0].get("src", "") if imgs else ""
 
-# ---------------------------------------------------------------------------
-# Shopify Store API
-# ---------------------------------------------------------------------------
+    return {
+        "source": source,
+        "name": p.get("title", "Unknown"),
+        "price": price_val if price_val > 0 else None,
+        "price_display": price_display,
+        "url": f"{base_url}/products/{p.get('handle', '')}",
+        "image": img_src,
+        "category": p.get("product_type", "") or "Uncategorized",
+        "sku": variant.get("sku", ""),
+        "description": description,
+        "updated_at": p.get("updated_at"),
+    }
+
+
+@PLATFORMS.register("shopify")
+def _scrape_shopify(base_url, source_name, concurrency=DEFAULT_PAGE_CONCURRENCY, rate=None,
+                    start=1, stats=None, since=None):
+    """Generic Shopify /products.json scraper.
+
+    Yields (next page, products) for each page from `start` on. Shopify
+    doesn't report a page count, so pages are requested `concurrency` ahead of
+    the last one parsed until an empty page is reached. A page that still
+    fails after retries raises ScrapeError.
+
+    With `since` (a UTC datetime) only products updated after it are asked
+    for with updated_at_min. Products are also filtered on their updated_at,
+    for storefronts that ignore the parameter.
+    """
+    import requests
 
-def _scrape_shopify(base_url, source_name):
-    """Generic Shopify /products.json scraper."""
     logger.info(f"Starting {source_name} scrape...")
+    bucket = host_bucket(base_url, rate)
     session = requests.Session()
     session.headers.update({
         "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
@@ -328,200 +1202,1127 @@ def _scrape_shopify(base_url, source_name):
         "Accept": "application/json",
     })
 
-    products = []
-    page = 1
-    while True:
-        logger.info(f"  {source_name}: page {page} ({len(products)} so far)")
-        try:
-            r = session.get(
-                f"{base_url}/products.json?limit=250&page={page}", timeout=30
-            )
-            if r.status_code != 200:
-                logger.warning(f"{source_name} HTTP {r.status_code} on page {page}")
-                break
+    list_query = "limit=250"
+    if since is not None:
+        list_query += f"&updated_at_min={quote(since.isoformat())}"
 
-            data = r.json().get("products", [])
-            if not data:
-                break
+    def fetch_page(page):
+        return http_get(session, f"{base_url}/products.json?{list_query}&page={page}", bucket, stats,
+                        timeout=30)
 
-            for p in data:
-                variant = p.get("variants", [{}])[0]
-                try:
-                    price_val = float(variant.get("price", "0") or "0")
-                except (ValueError, TypeError):
-                    price_val = 0
+    def changed(row):
+        return not row.updated_at or datetime.fromisoformat(row.updated_at) >= since
 
-                compare_at = None
-                try:
-                    raw = variant.get("compare_at_price")
-                    if raw:
-                        compare_at = float(raw)
-                except (ValueError, TypeError):
-                    pass
-
-                if price_val == 0:
-                    price_display = "Contact for Price"
-                elif compare_at and compare_at > price_val:
-                    price_display = f"${price_val:,.2f} (was ${compare_at:,.2f})"
-                else:
-                    price_display = f"${price_val:,.2f}"
-
-                # Strip HTML from body_html for description
-                body = p.get("body_html") or ""
-                description = BeautifulSoup(body, "html.parser").get_text(strip=True)[:200]
-
-                imgs = p.get("images", [])
-                img_src = imgs[0].get("src", "") if imgs else ""
-
-                products.append({
-                    "source": source_name,
-                    "name": p.get("title", "Unknown"),
-                    "price": price_val if price_val > 0 else None,
-                    "price_display": price_display,
-                    "url": f"{base_url}/products/{p.get('handle', '')}",
-                    "image": img_src,
-                    "category": p.get("product_type", "") or "Uncategorized",
-                    "sku": variant.get("sku", ""),
-                    "description": description,
-                })
+    def parse_page(r):
+        return [_parse_shopify_product(p, base_url, source_name) for p in r.json().get("products", [])]
 
-            page += 1
-            time.sleep(0.5)
-        except Exception as e:
-            logger.warning(f"{source_name} error on page {page}: {e}")
+    count = 0
+    for page, future in _fetch_pages(fetch_page, start, None, concurrency, name=f"{source_name}-page"):
+        logger.info(f"  {source_name}: page {page} ({count} so far)")
+        r = future.result()
+        if r.status_code != 200:
+            raise ScrapeError(f"{source_name} page {page}: HTTP {r.status_code}")
+        rows = [Product.from_dict(p) for p in parse_cached(r, parse_page, stats=stats)]
+        if not rows:
             break
+        if since is not None:
+            rows = [row for row in rows if changed(row)]
 
-    logger.info(f"{source_name} done: {len(products)} products")
-    return products
-
+        count += len(rows)
+        yield page + 1, rows
 
-def scrape_gluesntools():
-    return _scrape_shopify("https://gluesntools.com.au", "gluesntools")
+    logger.info(f"{source_name} done: {count} products")
 
 
 # ---------------------------------------------------------------------------
 # Database operations
 # ---------------------------------------------------------------------------
 
-def upsert_products(source: str, products: list, started_at: datetime):
-    """Delete old products for source and insert new ones."""
-    logger.info(f"Writing {len(products)} {source} products to Supabase...")
+# Columns compared to decide whether a stored product changed
+PRODUCT_FIELDS = ("name", "price", "price_display", "image", "category", "sku", "description")
 
-    # Delete existing products for this source
-    supabase.table("products").delete().eq("source", source).execute()
 
-    # Insert in batches of 500
-    batch_size = 500
-    for i in range(0, len(products), batch_size):
-        batch = products[i:i + batch_size]
-        rows = []
-        for p in batch:
-            rows.append({
-                "source": source,
-                "name": p["name"],
-                "price": p.get("price"),
-                "price_display": p.get("price_display", ""),
-                "url": p.get("url", ""),
-                "image": p.get("image", ""),
-                "category": p.get("category", ""),
-                "sku": p.get("sku", ""),
-                "description": p.get("description", ""),
-            })
-        supabase.table("products").insert(rows).execute()
-        logger.info(f"  Inserted batch {i//batch_size + 1} ({len(rows)} rows)")
+def _product_row(source: str, p) -> Product:
+    """`p` as a products row of `source`: the scraper's own Product, not a
+    copy, or a Product made from a scraper plugin's dict."""
+    if not isinstance(p, Product):
+        return Product.from_dict(p, source)
+    if p.source != source:
+        p.source = sys.intern(source)
+    return p
 
-    # Log the scrape
-    with_price = sum(1 for p in products if p.get("price"))
-    supabase.table("scrape_log").insert({
-        "source": source,
-        "product_count": len(products),
-        "products_with_price": with_price,
-        "started_at": started_at.isoformat(),
-        "status": "success",
-    }).execute()
 
-    logger.info(f"Done: {source} - {len(products)} products ({with_price} with price)")
+# Columns whose changes are recorded in price_history
+PRICE_FIELDS = ("price", "price_display")
+
+
+def _fingerprint(row: dict, fields=PRODUCT_FIELDS) -> int:
+    """Hash of a row's normalised field values, for change detection."""
+    values = []
+    for field in fields:
+        value = row.get(field)
+        if field == "price":
+            value = round(float(value), 2) if value is not None else None
+        else:
+            value = value or ""
+        values.append(value)
+    return hash(tuple(values))
+
+
+def _fetch_existing(source: str) -> dict:
+    """Stored products for a source as {url: (id, fingerprint, price fingerprint, priced)}."""
+    rows = get_store().load_products(source, PRODUCT_FIELDS)
+    return {
+        row["url"] or "": (row["id"], _fingerprint(row), _fingerprint(row, PRICE_FIELDS), bool(row["price"]))
+        for row in rows
+    }
+
+
+CHECKPOINT_DIR = os.environ.get(
+    "SCRAPE_CHECKPOINT_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".checkpoints")
+)
+CHECKPOINT_MAX_AGE_HOURS = 24
+
+# Counters carried in checkpoints so a resumed run logs whole-run totals
+WRITE_COUNTERS = ("priced", "inserted", "updated", "price_changes")
+
+
+class Checkpoint:
+    """Progress of one supplier's scrape, for resuming an interrupted run.
+
+    Stored as JSON lines in CHECKPOINT_DIR: a header with the run's start
+    time and sync mode, then one line per batch written with the scraper's
+    resume cursor, the batch's product urls and its write counts.
+    """
+
+    def __init__(self, source: str, started_at: datetime, mode: str = "full"):
+        self.path = os.path.join(CHECKPOINT_DIR, f"{source}.jsonl")
+        self.started_at = started_at
+        self.mode = mode
+        self.next_start = None
+        self.seen = set()
+        self.counts = dict.fromkeys(WRITE_COUNTERS, 0)
+
+    @classmethod
+    def open(cls, source: str, resume: bool = True, mode: str = "full") -> "Checkpoint":
+        """Load a recent checkpoint for `source` left by a run in the same sync
+        mode, or start a new one."""
+        cp = cls(source, datetime.now(timezone.utc), mode)
+        if resume and os.path.exists(cp.path):
+            try:
+                cp._load()
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning(f"Ignoring unreadable checkpoint {cp.path}: {e}")
+                cp = cls(source, datetime.now(timezone.utc), mode)
+            else:
+                age = datetime.now(timezone.utc) - cp.started_at
+                if (cp.next_start is not None and cp.mode == mode
+                        and age.total_seconds() < CHECKPOINT_MAX_AGE_HOURS * 3600):
+                    logger.info(f"Resuming {source} from {cp.next_start} "
+                                f"({len(cp.seen)} products already written)")
+                    return cp
+                cp = cls(source, datetime.now(timezone.utc), mode)
+        os.makedirs(CHECKPOINT_DIR, exist_ok=True)
+        with open(cp.path, "w") as f:
+            f.write(json.dumps({"started_at": cp.started_at.isoformat(), "mode": mode}) + "\n")
+        return cp
+
+    def _load(self):
+        with open(self.path) as f:
+            lines = f.read().splitlines()
+        header = json.loads(lines[0])
+        self.started_at = datetime.fromisoformat(header["started_at"])
+        self.mode = header.get("mode", "full")
+        for line in lines[1:]:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                break  # Partly written last line from an interrupted run
+            self.next_start = entry["next"]
+            self.seen.update(entry["urls"])
+            for key in WRITE_COUNTERS:
+                self.counts[key] += entry.get(key, 0)
+
+    def append(self, next_start, urls: list, counts: dict):
+        with open(self.path, "a") as f:
+            f.write(json.dumps({"next": next_start, "urls": urls, **counts}) + "\n")
+        self.next_start = next_start
+
+    def clear(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+# Product batches allowed to queue up between a scraper and its writer
+WRITE_QUEUE_BATCHES = 4
+
+# A scrape finding fewer than this fraction of the products of the supplier's
+# last successful run is treated as a failed scrape, not a catalog change
+MIN_COMPLETENESS = 0.5
+
+
+class IncompleteScrapeError(ScrapeError):
+    """A scrape came back far smaller than the supplier's last successful one."""
+
+
+def _last_product_count(source: str):
+    """product_count of the supplier's last successful scrape, or None."""
+    runs = get_store().successful_runs(source, 1)
+    return runs[0]["product_count"] if runs else None
+
+
+class ProductWriter:
+    """Streams one supplier's product batches into the store (see storage.py).
+
+    Batches are diffed against the stored rows and written on a background
+    thread while the scraper keeps fetching. Products are keyed by
+    (source, canonical url): new and changed rows are upserted, unchanged
+    rows are left alone, and new products and price changes are appended to
+    price_history.
+    close() then deletes products that were not seen this run and logs it, so
+    the dashboard never sees a supplier with zero products. If the run saw
+    fewer than `min_completeness` of the products of the last successful run,
+    close() deletes nothing and raises IncompleteScrapeError instead. Stores
+    that stage writes discard the run's rows at that point. RestStore writes
+    each batch as it goes, so the rows the run upserted stay.
+
+    An `incremental` writer is fed only the products changed since the last
+    sync, or only some categories (a "partial" checkpoint). It merges them
+    into the stored catalog and removes nothing.
+
+    A `deferred` writer handles one shard's share of a supplier split across
+    shards (see shards.py). close() removes and logs nothing, leaving that to
+    the finalize step, which combines every share's `seen`, `priced`,
+    `inserted`, `updated` and `price_changed` urls, so a product two shares
+    both saw is counted once.
+    """
+
+    def __init__(self, source: str, started_at: datetime, checkpoint: Checkpoint = None,
+                 stats: ScrapeStats = None, min_completeness: float = MIN_COMPLETENESS,
+                 incremental: bool = False, deferred: bool = False):
+        self.source = source
+        self.started_at = started_at
+        self.checkpoint = checkpoint
+        self.min_completeness = min_completeness
+        self.incremental = incremental
+        self.deferred = deferred
+        self.stats = stats or ScrapeStats(source)
+        self.store = get_store()
+        with self.stats.timer("write"):
+            self.existing = _fetch_existing(source)
+            # Other shares of a deferred supplier may already be writing
+            self.store.begin(source, resume=deferred or bool(checkpoint and checkpoint.seen))
+        self.seen = set(checkpoint.seen) if checkpoint else set()
+        self.priced = set()
+        self.inserted = set()
+        self.updated = set()
+        self.price_changed = set()
+        self.counts = dict(checkpoint.counts) if checkpoint else dict.fromkeys(WRITE_COUNTERS, 0)
+        self._queue = queue.Queue(maxsize=WRITE_QUEUE_BATCHES)
+        self._error = None
+        self._thread = threading.Thread(target=self._run, name=f"{source}-writer", daemon=True)
+        self._thread.start()
+
+    def put(self, next_start, products: list):
+        """Queue a batch; `next_start` is the scraper cursor to resume after it."""
+        if self._error:
+            raise self._error
+        self._queue.put((next_start, products))
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            if self._error:
+                continue  # Keep draining so put() never blocks
+            try:
+                with self.stats.timer("write"):
+                    self._write(*item)
+            except Exception as e:
+                self._error = e
+
+    def _write(self, next_start, products: list):
+        now = datetime.now(timezone.utc).isoformat()
+        counts = dict.fromkeys(WRITE_COUNTERS, 0)
+        changed = []
+        history = []
+        urls = []
+        for p in products:
+            row = _product_row(self.source, p)
+            url = row["url"]
+            # De-duplicate on the product key; the first listing wins
+            if url in self.seen:
+                continue
+            self.seen.add(url)
+            urls.append(url)
+            if row["price"]:
+                counts["priced"] += 1
+                if self.deferred:
+                    self.priced.add(url)
+
+            old = self.existing.get(url)
+            if old is None:
+                counts["inserted"] += 1
+                if self.deferred:
+                    self.inserted.add(url)
+            elif old[1] != _fingerprint(row):
+                counts["updated"] += 1
+                if self.deferred:
+                    self.updated.add(url)
+            else:
+                continue
+            # Derived from the name, so only computed for rows being written
+            row.search_name = matching.search_text(row.name)
+            row.scraped_at = now
+            changed.append(row)
+            if old is None or old[2] != _fingerprint(row, PRICE_FIELDS):
+                counts["price_changes"] += 1
+                if self.deferred:
+                    self.price_changed.add(url)
+                history.append({
+                    "source": self.source,
+                    "url": url,
+                    "price": row["price"],
+                    "price_display": row["price_display"],
+                    "observed_at": now,
+                })
+
+        if changed or history:
+            self.store.write(self.source, changed, history)
+        if changed:
+            logger.info(f"  {self.source}: wrote {len(changed)} of {len(urls)} rows")
+
+        for key in WRITE_COUNTERS:
+            self.counts[key] += counts[key]
+        if self.checkpoint is not None and next_start is not None:
+            self.checkpoint.append(next_start, urls, counts)
+
+    def _stop(self):
+        self._queue.put(None)
+        self._thread.join()
+
+    def abort(self):
+        """Stop writing, keeping the checkpoint so the next run can resume."""
+        self._stop()
+
+    def close(self):
+        """Flush queued batches, delete products no longer listed and log the run."""
+        self._stop()
+        if self._error:
+            raise self._error
+
+        if self.deferred:
+            self.stats.finish()
+            logger.info(f"Done: {self.source} (shard share) - {len(self.seen)} products; "
+                        f"{self.counts['inserted']} inserted, {self.counts['updated']} updated, "
+                        f"{self.counts['price_changes']} price changes")
+            return
+        if self.incremental:
+            self._log_incremental()
+            return
+
+        if self.min_completeness:
+            last_count = _last_product_count(self.source)
+            if last_count and len(self.seen) < last_count * self.min_completeness:
+                # Start afresh next time rather than resuming into the same result
+                if self.checkpoint is not None:
+                    self.checkpoint.clear()
+                self.store.discard(self.source)
+                raise IncompleteScrapeError(
+                    f"{self.source}: found {len(self.seen)} products, last successful scrape had "
+                    f"{last_count}; keeping stored products")
+
+        removed_ids = [entry[0] for url, entry in self.existing.items() if url not in self.seen]
+        c = self.counts
+        log = {
+            "source": self.source,
+            "product_count": len(self.seen),
+            "products_with_price": c["priced"],
+            "inserted_count": c["inserted"],
+            "updated_count": c["updated"],
+            "removed_count": len(removed_ids),
+            "started_at": self.started_at.isoformat(),
+            "status": "success",
+            "sync_mode": "full",
+        }
+        # The log row is written with the merge, so its timings stop here
+        self.stats.finish()
+        with self.stats.timer("write"):
+            # Removes the products that were not seen and logs the scrape
+            self.store.finish(self.source, removed_ids, {**log, **self.stats.log_columns()})
+        if self.checkpoint is not None:
+            self.checkpoint.clear()
+
+        logger.info(f"Done: {self.source} - {len(self.seen)} products ({c['priced']} with price); "
+                    f"{c['inserted']} inserted, {c['updated']} updated, {len(removed_ids)} removed, "
+                    f"{c['price_changes']} price changes")
+        logger.info(f"  {self.source} stats: {self.stats.summary()}")
+
+    def _log_incremental(self):
+        """Log an incremental run; counts describe the merged catalog."""
+        mode = self.checkpoint.mode if self.checkpoint is not None else "incremental"
+        c = self.counts
+        unchanged = [entry for url, entry in self.existing.items() if url not in self.seen]
+        total = len(unchanged) + len(self.seen)
+        priced = sum(1 for entry in unchanged if entry[3]) + c["priced"]
+        log = {
+            "source": self.source,
+            "product_count": total,
+            "products_with_price": priced,
+            "inserted_count": c["inserted"],
+            "updated_count": c["updated"],
+            "removed_count": 0,
+            "started_at": self.started_at.isoformat(),
+            "status": "success",
+            "sync_mode": mode,
+        }
+        self.stats.finish()
+        with self.stats.timer("write"):
+            self.store.finish(self.source, [], {**log, **self.stats.log_columns()})
+        if self.checkpoint is not None:
+            self.checkpoint.clear()
+
+        logger.info(f"Done: {self.source} ({mode}) - {len(self.seen)} of {total} products merged; "
+                    f"{c['inserted']} inserted, {c['updated']} updated, {c['price_changes']} price changes")
+        logger.info(f"  {self.source} stats: {self.stats.summary()}")
+
+
+def upsert_products(source: str, products: list, started_at: datetime, stats: ScrapeStats = None):
+    """Write a complete scrape for one source in a single batch."""
+    logger.info(f"Writing {len(products)} {source} products ({get_store().name} store)...")
+    writer = ProductWriter(source, started_at, stats=stats)
+    writer.put(None, products)
+    writer.close()
+
+
+def price_series(source: str, url: str = None, since: datetime = None) -> dict:
+    """Price history for a supplier, or one of its products, as time series.
+
+    Returns {url: [(observed_at, price, price_display), ...]} in time order.
+    Each point is a price change; the price holds until the next point.
+    """
+    series = {}
+    for row in get_store().price_series(source, url, since.isoformat() if since is not None else None):
+        price = float(row["price"]) if row["price"] is not None else None
+        series.setdefault(row["url"], []).append((row["observed_at"], price, row["price_display"]))
+    return series
+
+
+def update_product_matches() -> list:
+    """Recompute cross-supplier match groups, over every supplier, into
+    product_matches, and return the new rows."""
+    rows = storage.select_all(lambda: get_supabase().table("products")
+                              .select("id, source, name, url")
+                              .order("name")
+                              .order("id"))
+    by_source = {}
+    for row in rows:
+        by_source.setdefault(row["source"], []).append(row)
+    matches = matching.build_match_rows(by_source)
+
+    # One call, so the dashboard never reads a half-replaced table
+    get_supabase().rpc("replace_product_matches", {"matches": matches}).execute()
+    groups = matches[-1]["group_id"] if matches else 0
+    logger.info(f"Product matches: {groups} groups over {len(rows)} products")
+    return matches
+
+
+def update_insight_summary(matches: list = None):
+    """Recompute the insight_summary table (see insights.py) from the products
+    table and `matches`, by default the stored product_matches rows. Gibbon's
+    own catalogs are the supplier_config rows marked home."""
+    import insights  # Pulls in NumPy, which only this stage needs
+
+    try:
+        home_sources = [row["key"] for row in get_supabase().table("supplier_config")
+                        .select("key").eq("home", True).execute().data]
+    except Exception as e:
+        # schema.sql's home column not added yet
+        logger.warning(f"Failed to load home suppliers, assuming {', '.join(insights.HOME_SOURCES)}: {e}")
+        home_sources = insights.HOME_SOURCES
+
+    if matches is None:
+        matches = storage.select_all(lambda: get_supabase().table("product_matches")
+                                     .select("group_id, product_id")
+                                     .order("id"))
+    rows = storage.select_all(lambda: get_supabase().table("products")
+                              .select("id, source, name, price, url")
+                              .order("source")
+                              .order("name")
+                              .order("id"))
+    by_source = {}
+    for row in rows:
+        by_source.setdefault(row["source"], []).append(row)
+    summary = insights.build_insight_rows(by_source, matches, home_sources=home_sources)
+
+    # Replaced in place, keyed on source, so there's always a summary to
+    # read; then the rows of suppliers no longer scraped go
+    computed_at = datetime.now(timezone.utc).isoformat()
+    if summary:
+        get_supabase().table("insight_summary").upsert(
+            [{**row, "computed_at": computed_at} for row in summary], on_conflict="source"
+        ).execute()
+    get_supabase().table("insight_summary").delete().lt("computed_at", computed_at).execute()
+    logger.info(f"Insight summary: {len(summary)} suppliers over {len(rows)} products")
+
+
+SNAPSHOT_BUCKET = "snapshots"
+
+SNAPSHOT_CONTENT_TYPES = {".json": "application/json", ".gz": "application/gzip"}
+
+
+def publish_snapshot(supplier_meta: dict, out_dir: str = None, upload: bool = True):
+    """Export the products table as a sharded snapshot (see snapshot.py).
+
+    Shards are uploaded to the snapshots storage bucket and, with `out_dir`,
+    written locally. Shard names are content hashes, so shards that didn't
+    change this run are already in place and are skipped; superseded shards
+    are removed once the new manifest is up.
+    """
+    rows = storage.select_all(lambda: get_supabase().table("products")
+                              .select("id, source, name, price, price_display, url, image, category, sku")
+                              .order("source")
+                              .order("name")
+                              .order("id"))
+    by_source = {}
+    for row in rows:
+        by_source.setdefault(row["source"], []).append(row)
+    manifest, files = snapshot.build_snapshot(by_source, supplier_meta)
+    manifest_data = snapshot.manifest_bytes(manifest)
+
+    if out_dir:
+        os.makedirs(os.path.join(out_dir, "shards"), exist_ok=True)
+        for path, data in files.items():
+            with open(os.path.join(out_dir, path), "wb") as f:
+                f.write(data)
+        with open(os.path.join(out_dir, "manifest.json"), "wb") as f:
+            f.write(manifest_data)
+        for name in os.listdir(os.path.join(out_dir, "shards")):
+            if f"shards/{name}" not in files:
+                os.remove(os.path.join(out_dir, "shards", name))
+
+    uploaded = 0
+    if upload:
+        bucket = get_supabase().storage.from_(SNAPSHOT_BUCKET)
+        existing = {obj["name"] for obj in bucket.list("shards", {"limit": 10000})}
+        for path, data in files.items():
+            if path.split("/", 1)[1] in existing:
+                continue
+            ext = os.path.splitext(path)[1]
+            bucket.upload(path, data, {"content-type": SNAPSHOT_CONTENT_TYPES[ext],
+                                       "cache-control": "31536000", "upsert": "true"})
+            uploaded += 1
+        bucket.upload("manifest.json", manifest_data, {"content-type": "application/json",
+                                                       "cache-control": "no-cache", "upsert": "true"})
+        stale = [f"shards/{name}" for name in existing if f"shards/{name}" not in files]
+        if stale:
+            bucket.remove(stale)
+
+    total = sum(s["gzip_bytes"] for s in manifest["shards"].values())
+    logger.info(f"Snapshot {manifest['version']}: {len(manifest['shards'])} shards, "
+                f"{len(rows)} products, {total / 1024:.0f} KB gzipped; {uploaded} files uploaded")
+    return manifest
 
 
 # ---------------------------------------------------------------------------
 # Main
 # ---------------------------------------------------------------------------
 
-SCRAPERS = {
-    "kevmor": scrape_kevmor,
-    "intafloors": scrape_intafloors,
-    "gibbon_web": scrape_gibbon,
-    "marques": scrape_marques,
-    "floortrade": scrape_floortrade,
-    "gluesntools": scrape_gluesntools,
-    "homely": scrape_homely,
+# Suppliers scraped when the supplier_config table is unavailable (or with
+# --dry-run), as key -> (type, base URL)
+BUILTIN_SUPPLIERS = {
+    "kevmor": ("custom", KEVMOR_BASE_URL),
+    "intafloors": ("woocommerce", "https://intafloors.com.au"),
+    "gibbon_web": ("woocommerce", "https://gibbontrade.com.au"),
+    "marques": ("woocommerce", "https://marquesflooring.com.au"),
+    "floortrade": ("woocommerce", "https://www.floortrade.au"),
+    "gluesntools": ("shopify", "https://gluesntools.com.au"),
+    "homely": ("woocommerce", "https://www.homelyflooring.com.au"),
 }
 
+DEFAULT_CONCURRENCY = int(os.environ.get("SCRAPE_CONCURRENCY", "4"))
+
+
+def _resolve_scraper(source: str, db_suppliers: dict):
+    """Return (scraper_func, host) for a source, or None if it can't be scraped."""
+    config = db_suppliers.get(source)
+    if config is not None:
+        supplier_type, supplier_url = config["type"], config["url"]
+        logger.info(f"Queued {config['name']} ({source}) - type: {supplier_type}")
+
+        # Per-supplier fetching limits from supplier_config
+        fetch_opts = {
+            "rate": float(config["requests_per_second"]) if config.get("requests_per_second") else None,
+        }
+        if config.get("page_concurrency"):
+            fetch_opts["concurrency"] = config["page_concurrency"]
+    elif source in BUILTIN_SUPPLIERS:
+        supplier_type, supplier_url = BUILTIN_SUPPLIERS[source]
+        logger.info(f"Using built-in config for {source} - type: {supplier_type}")
+        fetch_opts = {}
+    else:
+        logger.error(f"Unknown source: {source}")
+        return None
 
-def main():
-    # Load supplier configuration from database
-    logger.info("Loading supplier configuration from database...")
     try:
-        response = supabase.table("supplier_config").select("*").eq("enabled", True).execute()
-        db_suppliers = {s["key"]: s for s in response.data}
-        logger.info(f"Loaded {len(db_suppliers)} enabled suppliers from database")
+        if supplier_type == "custom":
+            scraper_func = functools.partial(CUSTOM_SCRAPERS.get(source), **fetch_opts)
+        else:
+            scraper_func = functools.partial(PLATFORMS.get(supplier_type), supplier_url, source, **fetch_opts)
+    except KeyError:
+        logger.error(f"No scraper for {source} (type '{supplier_type}')")
+        return None
+    except ImportError as e:
+        logger.error(f"Failed to load the scraper for {source}: {e}")
+        return None
+    return scraper_func, _host_of(supplier_url)
+
+
+FULL_SYNC_DAYS = float(os.environ.get("SCRAPE_FULL_SYNC_DAYS", "7"))
+
+# Incremental syncs ask for changes since a little before the last run
+# started, to cover clock skew between us and the supplier
+SYNC_OVERLAP = timedelta(hours=1)
+
+# Recent runs searched for the last full sweep
+SYNC_HISTORY_RUNS = 100
+
+
+def _supports_since(scraper_func) -> bool:
+    """Whether a scraper takes a `since` cursor for incremental syncs."""
+    return "since" in inspect.signature(scraper_func).parameters
+
+
+def _sync_since(source: str, sync: str = "auto"):
+    """High-water mark for an incremental sync of `source`, or None for a full sweep.
+
+    The mark is the start of the supplier's last successful run, less
+    SYNC_OVERLAP. In "auto" mode a full sweep is due when none has succeeded
+    in the last FULL_SYNC_DAYS.
+    """
+    if sync == "full":
+        return None
+    runs = get_store().successful_runs(source, SYNC_HISTORY_RUNS)
+    if not runs:
+        return None
+    if sync == "auto":
+        # Runs from before incremental sync have no sync_mode; they were full sweeps
+        full = [run for run in runs if run.get("sync_mode") in (None, "full")]
+        last_full = datetime.fromisoformat(full[0]["started_at"]) if full else None
+        if last_full is None or datetime.now(timezone.utc) - last_full > timedelta(days=FULL_SYNC_DAYS):
+            return None
+    return datetime.fromisoformat(runs[0]["started_at"]) - SYNC_OVERLAP
+
+
+def _run_supplier(source: str, scraper_func, resume: bool = True,
+                  min_completeness: float = MIN_COMPLETENESS, sync: str = "auto",
+                  categories: list = None, part: shards.ShardResults = None,
+                  rate: float = None) -> ScrapeStats:
+    """Scrape one supplier, streaming batches to Supabase as pages arrive.
+
+    Progress is checkpointed after every batch written; if the run dies, the
+    next one resumes after the last completed page or category. Scrapers
+    that support it are synced incrementally (see _sync_since). With
+    `categories`, a subset of CATEGORY_SCRAPERS[source], only those are
+    crawled and merged into the stored catalog. With `part` as well, they
+    are this shard's share of a split supplier: nothing is removed or
+    logged, and what the share saw is recorded in `part` for --finalize.
+    `rate` overrides the supplier's requests/sec, for such a share.
+    """
+    if rate is not None:
+        scraper_func = functools.partial(scraper_func, rate=rate)
+    if categories is not None:
+        since = None
+        mode = "partial"
+        # The resume cursor indexes this run's subset, which the next run won't share
+        resume = False
+    else:
+        since = _sync_since(source, sync) if _supports_since(scraper_func) else None
+        mode = "full" if since is None else "incremental"
+    # Shares of one supplier in other shards would write the same checkpoint file
+    checkpoint = Checkpoint.open(source, resume, mode) if part is None else None
+    started = checkpoint.started_at if checkpoint is not None else datetime.now(timezone.utc)
+    stats = ScrapeStats(source)
+    writer = None
+    try:
+        if since is not None:
+            logger.info(f"Syncing {source} incrementally: changes since {since.isoformat()}")
+        if categories is not None:
+            logger.info(f"Crawling {len(categories)} {source} categories: "
+                        f"{', '.join(label for _, label in categories)}")
+        writer = ProductWriter(source, started, checkpoint, stats, min_completeness,
+                               incremental=mode != "full", deferred=part is not None)
+        opts = {}
+        if checkpoint is not None and checkpoint.next_start is not None:
+            opts["start"] = checkpoint.next_start
+        if since is not None:
+            opts["since"] = since
+        if categories is not None:
+            opts["categories"] = categories
+        for next_start, batch in scraper_func(stats=stats, **opts):
+            writer.put(next_start, batch)
+        writer.close()
+        if part is not None:
+            part.add({
+                "source": source,
+                "categories": [label for _, label in categories],
+                "started_at": started.isoformat(),
+                "status": "success",
+                "urls": list(writer.seen),
+                "priced": list(writer.priced),
+                "inserted": list(writer.inserted),
+                "updated": list(writer.updated),
+                "price_changed": list(writer.price_changed),
+                "stats": stats.log_columns(),
+            })
     except Exception as e:
-        logger.error(f"Failed to load supplier config from database: {e}")
-        logger.info("Falling back to hardcoded SCRAPERS")
-        db_suppliers = {}
+        if writer is not None:
+            writer.abort()
+        logger.exception(f"Failed to scrape {source}: {e}")
+        stats.finish()
+        if part is not None:
+            # --finalize logs the whole supplier's run
+            part.add({"source": source, "categories": [label for _, label in categories],
+                      "started_at": started.isoformat(), "status": f"error: {e}",
+                      "stats": stats.log_columns()})
+            return stats
+        get_store().log_run({
+            "source": source,
+            "product_count": 0,
+            "products_with_price": 0,
+            "started_at": started.isoformat(),
+            "status": f"error: {e}",
+            "sync_mode": mode,
+            **stats.log_columns(),
+        })
+    return stats
+
+
+class ProductFile:
+    """Destination for --dry-run / --output: scraped products as JSON lines
+    (one products-table row per line) in `path`, or just counted."""
+
+    def __init__(self, path: str = None):
+        self.path = path
+        self.counts = Counter()
+        self._seen = set()
+        self._file = open(path, "w", encoding="utf-8") if path else None
+        self._lock = threading.Lock()
+
+    def write(self, source: str, products: list):
+        with self._lock:
+            for p in products:
+                row = _product_row(source, p)
+                if (source, row["url"]) in self._seen:
+                    continue
+                self._seen.add((source, row["url"]))
+                self.counts[source] += 1
+                if self._file is not None:
+                    self._file.write(json.dumps({f: row[f] for f in ROW_FIELDS}, ensure_ascii=False) + "\n")
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _dry_run_supplier(source: str, scraper_func, output: ProductFile) -> ScrapeStats:
+    """Scrape one supplier into `output`, without touching Supabase."""
+    stats = ScrapeStats(source)
+    try:
+        for _, batch in scraper_func(stats=stats):
+            output.write(source, batch)
+    except Exception as e:
+        logger.exception(f"Failed to scrape {source}: {e}")
+    stats.finish()
+    logger.info(f"Done: {source} - {output.counts[source]} products (dry run)")
+    logger.info(f"  {source} stats: {stats.summary()}")
+    return stats
 
-    # Allow command-line override for specific suppliers
-    if len(sys.argv) > 1:
-        targets = sys.argv[1:]
-    else:
-        # Use database suppliers if available, otherwise fall back to hardcoded list
-        targets = list(db_suppliers.keys()) if db_suppliers else list(SCRAPERS.keys())
 
+def _run_host(host: str, jobs: list, run_supplier) -> list:
+    """Scrape every supplier on one host, one after another, with
+    run_supplier(source, scraper_func, **opts) for each (source, scraper_func, opts)."""
+    return [run_supplier(source, scraper_func, **opts) for source, scraper_func, opts in jobs]
+
+
+def plan_scrapes(targets: list, db_suppliers: dict) -> list:
+    """schedule.py plans for `targets` from their scrape_log history, most
+    stale first, each with its "seconds" expected."""
+    now = datetime.now(timezone.utc)
+    plans = []
     for source in targets:
-        # Get supplier config from database or fallback to hardcoded
-        if source in db_suppliers:
-            config = db_suppliers[source]
-            supplier_type = config["type"]
-            supplier_url = config["url"]
-            supplier_name = config["name"]
-
-            logger.info(f"Scraping {supplier_name} ({source}) - type: {supplier_type}")
-
-            # Determine which scraper function to use based on type
-            if supplier_type == "custom" and source in SCRAPERS:
-                # Use custom scraper function
-                scraper_func = SCRAPERS[source]
-            elif supplier_type == "woocommerce":
-                # Use generic WooCommerce scraper
-                scraper_func = lambda: _scrape_woocommerce(supplier_url, source)
-            elif supplier_type == "shopify":
-                # Use generic Shopify scraper
-                scraper_func = lambda: _scrape_shopify(supplier_url, source)
+        config = db_suppliers.get(source, {})
+        min_hours = float(config.get("min_interval_hours") or schedule.DEFAULT_MIN_INTERVAL_HOURS)
+        max_hours = float(config.get("max_interval_hours") or schedule.DEFAULT_MAX_INTERVAL_HOURS)
+        try:
+            runs = get_store().successful_runs(source, schedule.HISTORY_RUNS)
+            if source in CATEGORY_SCRAPERS:
+                labels = [label for _, label in CATEGORY_SCRAPERS[source]]
+                products = get_store().load_products(source, ("category", "scraped_at")) if runs else []
+                plan = schedule.plan_categories(source, labels, runs, products, now, min_hours, max_hours)
             else:
-                logger.error(f"Unknown scraper type '{supplier_type}' for {source}")
-                continue
-        elif source in SCRAPERS:
-            # Fallback to hardcoded scraper
-            logger.info(f"Using hardcoded scraper for {source}")
-            scraper_func = SCRAPERS[source]
+                plan = schedule.plan_supplier(source, runs, now, min_hours, max_hours)
+            plan["seconds"] = schedule.expected_seconds(runs, plan["categories"])
+        except Exception as e:
+            logger.warning(f"Couldn't plan {source} from its history, scraping it: {e}")
+            plan = {"source": source, "due": True, "priority": 1.0, "reason": "no history",
+                    "categories": None, "seconds": None}
+        plans.append(plan)
+    plans.sort(key=lambda p: p["priority"], reverse=True)
+    return plans
+
+
+def _categories(source: str, labels: list) -> list:
+    """The (url, label) pairs of CATEGORY_SCRAPERS[source] named in `labels`, in crawl order."""
+    labels = set(labels)
+    return [c for c in CATEGORY_SCRAPERS[source] if c[1] in labels]
+
+
+def plan_shards(targets: list, db_suppliers: dict, count: int, plans: list = None) -> dict:
+    """A shards.py plan spreading `targets` over `count` shards, costed from
+    their scrape_log history; with `plans` (--schedule), just the due
+    suppliers and categories."""
+    scheduled = {plan["source"]: plan for plan in plans or []}
+    if plans is not None:
+        targets = [plan["source"] for plan in plans]
+    suppliers = []
+    for source in targets:
+        config = db_suppliers.get(source)
+        url = config["url"] if config else BUILTIN_SUPPLIERS.get(source, (None, None))[1]
+        try:
+            runs = get_store().successful_runs(source, schedule.HISTORY_RUNS)
+        except Exception as e:
+            logger.warning(f"Couldn't load the scrape history of {source}: {e}")
+            runs = []
+        plan = scheduled.get(source)
+        supplier = {
+            "source": source,
+            # Unknown sources fail in their shard, like in an unsharded run
+            "host": _host_of(url) if url else source,
+            "categories": plan["categories"] if plan else None,
+            "seconds": plan["seconds"] if plan else schedule.expected_seconds(runs),
+        }
+        if source in CATEGORY_SCRAPERS:
+            supplier["splittable"] = [label for _, label in CATEGORY_SCRAPERS[source]]
+            supplier["category_seconds"] = schedule.category_seconds(runs)
+            configured = (config or {}).get("requests_per_second")
+            supplier["rate"] = float(configured) if configured else CATEGORY_SCRAPER_RATES[source]
+        suppliers.append(supplier)
+    return {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "shards": count,
+        "units": shards.balance(suppliers, count),
+    }
+
+
+def _log_shard_plan(plan: dict):
+    """Log what each shard of `plan` scrapes, and for about how long."""
+    for shard in range(1, plan["shards"] + 1):
+        units = [u for u in plan["units"] if u["shard"] == shard]
+        names = [u["source"] for u in units if not u["split"]]
+        names += [f"{source} ({n} categories)"
+                  for source, n in Counter(u["source"] for u in units if u["split"]).items()]
+        minutes = sum(u["seconds"] for u in units) / 60
+        logger.info(f"Shard {shard}/{plan['shards']}: ~{minutes:.0f} min - {', '.join(names) or 'nothing'}")
+
+
+def _finalize_split(source: str, full: bool, share_shards: set, parts: list, started_at: str,
+                    min_completeness: float):
+    """Combine the shares of one supplier split across shards; see finalize_shards."""
+    store = get_store()
+    mode = "full" if full else "partial"
+    log = {
+        "source": source,
+        "started_at": min((p["started_at"] for p in parts), default=started_at),
+        "sync_mode": mode,
+        **shards.combine_stats(parts),
+    }
+
+    def fail(status: str):
+        logger.error(f"Failed to finalize {source}: {status}; keeping stored products")
+        store.discard(source)
+        store.log_run({**log, "product_count": 0, "products_with_price": 0, "status": f"error: {status}"})
+
+    missing = sorted(share_shards - {p["shard"] for p in parts if p["status"] == "success"})
+    if missing:
+        errors = [p["status"] for p in parts if p["status"] != "success"]
+        fail(f"shard {', '.join(map(str, missing))} did not finish" + (f" ({errors[0]})" if errors else ""))
+        return
+
+    # By url: shares overlap where a product is listed in categories of several
+    seen = set().union(*(p["urls"] for p in parts))
+    priced = set().union(*(p["priced"] for p in parts))
+    inserted = set().union(*(p["inserted"] for p in parts))
+    counts = {
+        "inserted": len(inserted),
+        # Written by a share that loaded the catalog after another inserted it
+        "updated": len(set().union(*(p["updated"] for p in parts)) - inserted),
+        "price_changes": len(set().union(*(p["price_changed"] for p in parts))),
+    }
+    existing = _fetch_existing(source)
+    if full:
+        last_count = _last_product_count(source)
+        if min_completeness and last_count and len(seen) < last_count * min_completeness:
+            fail(f"found {len(seen)} products, last successful scrape had {last_count}")
+            return
+        removed_ids = [entry[0] for url, entry in existing.items() if url not in seen]
+        product_count, with_price = len(seen), len(priced)
+    else:
+        removed_ids = []
+        unchanged = [entry for url, entry in existing.items() if url not in seen]
+        product_count = len(unchanged) + len(seen)
+        with_price = sum(1 for entry in unchanged if entry[3]) + len(priced)
+
+    store.finish(source, removed_ids, {
+        **log,
+        "product_count": product_count,
+        "products_with_price": with_price,
+        "inserted_count": counts["inserted"],
+        "updated_count": counts["updated"],
+        "removed_count": len(removed_ids),
+        "status": "success",
+    })
+    logger.info(f"Done: {source} ({len(parts)} shards, {mode}) - {product_count} products ({with_price} with price); "
+                f"{counts['inserted']} inserted, {counts['updated']} updated, {len(removed_ids)} removed, "
+                f"{counts['price_changes']} price changes")
+
+
+def finalize_shards(directory: str = shards.SHARD_DIR, min_completeness: float = MIN_COMPLETENESS) -> bool:
+    """Finish the suppliers split across the shards of the run planned in
+    `directory`: once all their shares have succeeded, remove the products
+    none of them saw and log the run, otherwise log an error and keep the
+    stored products. False if there is no current plan there."""
+    plan = shards.load_plan(directory)
+    if plan is None:
+        logger.error(f"No current shard plan in {directory}")
+        return False
+    parts = shards.load_results(plan, directory)
+    split = {}
+    for unit in plan["units"]:
+        if unit["split"]:
+            split.setdefault(unit["source"], (unit["full"], set()))[1].add(unit["shard"])
+    for source, (full, share_shards) in split.items():
+        try:
+            _finalize_split(source, full, share_shards, [p for p in parts if p["source"] == source],
+                            plan["created_at"], min_completeness)
+        except Exception as e:
+            logger.exception(f"Failed to finalize {source}: {e}")
+    shards.clear(directory)
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scrape flooring supplier prices into Supabase.")
+    parser.add_argument("sources", nargs="*", help="supplier keys to scrape (default: all enabled)")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                        help="max number of supplier hosts scraped at once")
+    parser.add_argument("--cache", default=CACHE_PATH, help="HTTP cache file")
+    parser.add_argument("--no-cache", action="store_true", help="fetch everything from scratch")
+    parser.add_argument("--no-resume", action="store_true",
+                        help="ignore checkpoints left by an interrupted run")
+    parser.add_argument("--sync", choices=("auto", "full", "incremental"), default="auto",
+                        help="incremental sync with periodic full sweeps (auto), or force one mode")
+    parser.add_argument("--allow-shrink", action="store_true",
+                        help="accept scrapes much smaller than the last successful one")
+    parser.add_argument("--no-matching", action="store_true",
+                        help="don't recompute product_matches and insight_summary after scraping")
+    parser.add_argument("--no-snapshot", action="store_true",
+                        help="don't publish the catalog snapshot after scraping")
+    parser.add_argument("--snapshot-dir", help="also write the snapshot to this directory")
+    parser.add_argument("--profile", action="store_true",
+                        help="print a per-supplier time and traffic breakdown at the end")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="scrape the built-in suppliers without reading or writing Supabase")
+    parser.add_argument("--output", help="with --dry-run (implied), write products to this JSON lines file")
+    parser.add_argument("--storage", choices=storage.STORES, default=STORE,
+                        help="where products are written (default: rest, or SCRAPE_STORAGE)")
+    parser.add_argument("--schedule", action="store_true",
+                        help="scrape only the suppliers (Kevmor: categories) due by their change rate, "
+                             "most stale first")
+    parser.add_argument("--budget", type=float, metavar="MINUTES",
+                        help="with --schedule, defer the least stale suppliers beyond this much "
+                             "expected scraping time")
+    sharding = parser.add_mutually_exclusive_group()
+    sharding.add_argument("--shard", type=shards.parse_shard, metavar="I/N",
+                          help="scrape only shard I of N of a cost-balanced plan (see shards.py)")
+    sharding.add_argument("--plan-shards", type=int, metavar="N",
+                          help="save a plan for N shards to --shard-dir and exit")
+    sharding.add_argument("--finalize", action="store_true",
+                          help="combine the shards' results, then rebuild matches and the snapshot")
+    parser.add_argument("--shard-dir", default=shards.SHARD_DIR,
+                        help="shard plan and results, shared by the shards and --finalize")
+    args = parser.parse_args()
+    dry_run = args.dry_run or args.output is not None
+    shard_count = args.plan_shards or (args.shard[1] if args.shard else None)
+    if (args.schedule or shard_count or args.finalize) and dry_run:
+        parser.error("--schedule and sharded runs use the store's scrape history and can't be "
+                     "combined with --dry-run")
+    # A SQLite run is local: built-in suppliers, no Supabase reads or post-processing
+    offline = dry_run or args.storage == "sqlite"
+
+    # Plugin modules that import scrape get this module, not a second copy
+    sys.modules.setdefault("scrape", sys.modules[__name__])
+
+    global http_cache
+    if not args.no_cache:
+        http_cache = HttpCache(args.cache)
+
+    if not dry_run:
+        set_store(storage.open_store(args.storage, get_supabase, DATABASE_URL, SQLITE_PATH))
+
+    db_suppliers = {}
+    if not offline:
+        # Load supplier configuration from database
+        logger.info("Loading supplier configuration from database...")
+        try:
+            response = get_supabase().table("supplier_config").select("*").eq("enabled", True).execute()
+            db_suppliers = {s["key"]: s for s in response.data}
+            logger.info(f"Loaded {len(db_suppliers)} enabled suppliers from database")
+        except Exception as e:
+            logger.error(f"Failed to load supplier config from database: {e}")
+            logger.info("Falling back to built-in suppliers")
+
+    # Allow command-line override for specific suppliers
+    if args.sources:
+        targets = args.sources
+    else:
+        # Use database suppliers if available, otherwise fall back to the built-in list
+        targets = list(db_suppliers.keys()) if db_suppliers else list(BUILTIN_SUPPLIERS.keys())
+
+    job_opts = {source: {} for source in targets}
+    # Shards started after the plan was saved take their share from it as is
+    plan = shards.load_plan(args.shard_dir, shard_count) if args.shard else None
+    due = None
+    if args.schedule and plan is None and not args.finalize:
+        plans = plan_scrapes(targets, db_suppliers)
+        for p in plans:
+            logger.info(f"Schedule: {p['source']} {'due' if p['due'] else 'skipped'} - {p['reason']}")
+        due = [p for p in plans if p["due"]]
+        if args.budget is not None and due:
+            # A sharded run has every shard's workers to spend it on
+            due, deferred = schedule.within_budget(due, args.budget * 60, args.concurrency * (shard_count or 1))
+            for p in deferred:
+                logger.info(f"Schedule: {p['source']} deferred - over the {args.budget:g} min budget "
+                            f"(~{(p['seconds'] or 0) / 60:.0f} min expected)")
+        # Most stale first, so they reach the workers first
+        targets = [p["source"] for p in due]
+        job_opts = {p["source"]: {"categories": _categories(p["source"], p["categories"])}
+                    if p["categories"] is not None else {} for p in due}
+        if not targets:
+            logger.info("Schedule: nothing due")
+
+    if shard_count and plan is None:
+        plan = plan_shards(targets, db_suppliers, shard_count, due)
+        if shards.save_plan(plan, args.shard_dir):
+            _log_shard_plan(plan)
+            # Every share of a split supplier stages into the same tables, so start them empty
+            for source in {u["source"] for u in plan["units"] if u["split"]}:
+                get_store().discard(source)
         else:
-            logger.error(f"Unknown source: {source}")
-            continue
+            plan = shards.load_plan(args.shard_dir, shard_count)
+    if args.shard:
+        index = args.shard[0]
+        results = shards.ShardResults(plan, index, args.shard_dir)
+        targets, job_opts, labels = [], {}, {}
+        for unit in plan["units"]:
+            if unit["shard"] != index:
+                continue
+            source = unit["source"]
+            if source not in job_opts:
+                targets.append(source)
+                job_opts[source] = {}
+            if unit["categories"] is not None:
+                labels.setdefault(source, []).extend(unit["categories"])
+            if unit["split"]:
+                job_opts[source]["part"] = results
+                if unit.get("rate"):
+                    job_opts[source]["rate"] = unit["rate"]
+        for source, chosen in labels.items():
+            job_opts[source]["categories"] = _categories(source, chosen)
+        logger.info(f"Shard {index}/{shard_count}: {', '.join(targets) or 'nothing to scrape'}")
+
+    all_stats = []
+    output = None
+    by_host = {}
+    if args.finalize:
+        finalize_shards(args.shard_dir, 0 if args.allow_shrink else MIN_COMPLETENESS)
+    elif not args.plan_shards:
+        # Group suppliers by host so each site is only scraped by one worker
+        for source in targets:
+            resolved = _resolve_scraper(source, db_suppliers)
+            if resolved is None:
+                continue
+            scraper_func, host = resolved
+            by_host.setdefault(host, []).append((source, scraper_func, job_opts[source]))
+
+    if by_host:
+        workers = max(1, min(args.concurrency, len(by_host)))
+        logger.info(f"Scraping {len(by_host)} hosts with {workers} workers")
+        with ExitStack() as stack:
+            if dry_run:
+                output = stack.enter_context(ProductFile(args.output))
+                run_supplier = functools.partial(_dry_run_supplier, output=output)
+            else:
+                run_supplier = functools.partial(
+                    _run_supplier,
+                    resume=not args.no_resume,
+                    min_completeness=0 if args.allow_shrink else MIN_COMPLETENESS,
+                    sync=args.sync,
+                )
+            pool = stack.enter_context(ThreadPoolExecutor(max_workers=workers, thread_name_prefix="scrape"))
+            futures = {pool.submit(_run_host, host, jobs, run_supplier): host for host, jobs in by_host.items()}
+            for future in as_completed(futures):
+                host = futures[future]
+                try:
+                    all_stats.extend(future.result())
+                except Exception as e:
+                    logger.exception(f"Worker for {host} crashed: {e}")
+
+    # Matches, insights and the snapshot cover every supplier, so a sharded
+    # run rebuilds them once, in --finalize
+    post_process = not offline and (args.finalize or (by_host and not args.shard))
+    if output is not None:
+        total = sum(output.counts.values())
+        logger.info(f"Dry run: {total} products" + (f" written to {args.output}" if args.output else ""))
+    elif post_process and not args.no_matching:
+        matches = None
+        try:
+            matches = update_product_matches()
+        except Exception as e:
+            logger.exception(f"Failed to update product matches: {e}")
+        try:
+            update_insight_summary(matches)
+        except Exception as e:
+            logger.exception(f"Failed to update insight summary: {e}")
 
-        # Execute scrape
-        started = datetime.now(timezone.utc)
+    if post_process and not args.no_snapshot:
+        meta = {key: {k: cfg.get(k) for k in ("name", "color", "url")} for key, cfg in db_suppliers.items()}
         try:
-            products = scraper_func()
-            upsert_products(source, products, started)
+            publish_snapshot(meta, args.snapshot_dir)
         except Exception as e:
-            logger.exception(f"Failed to scrape {source}: {e}")
-            supabase.table("scrape_log").insert({
-                "source": source,
-                "product_count": 0,
-                "products_with_price": 0,
-                "started_at": started.isoformat(),
-                "status": f"error: {e}",
-            }).execute()
+            logger.exception(f"Failed to publish snapshot: {e}")
+
+    if http_cache is not None:
+        logger.info(f"HTTP cache: {http_cache.summary()}")
+        evicted = http_cache.evict(max_bytes=CACHE_MAX_MB * 2**20, max_age_days=CACHE_MAX_AGE_DAYS)
+        if evicted:
+            logger.info(f"HTTP cache: evicted {evicted} entries")
+        http_cache.close()
+
+    if not dry_run:
+        get_store().close()
+
+    if args.profile:
+        print_profile(all_stats)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,220 @@
+"""
+Cost-balanced sharding of a scrape run (scrape.py --shard I/N).
+
+A single scrape.py process handles every supplier, and a GitHub Actions job
+stops after 30 minutes. A sharded run spreads the suppliers over N processes
+or matrix jobs instead:
+
+  1. A plan (--plan-shards N, or the first --shard to start) divides the
+     suppliers into N shards of about equal expected duration, from their
+     logged wall times. Suppliers sharing a host stay in one shard. A
+     supplier crawled by category (Kevmor) whose run would take longer than
+     a shard's share is split by category, weighted by the crawl times in
+     scrape_log.category_seconds. The plan is saved in the shard directory,
+     so every shard and the finalize step work from the same assignment.
+  2. Each shard (--shard I/N) scrapes its share. Whole suppliers are written
+     and logged as usual. A split supplier's share is merged into the
+     catalog without removing anything, and the products it saw are recorded
+     in shard-I.json.
+  3. The finalize step (--finalize) combines the shares of each split
+     supplier. Once every share has succeeded, products none of them saw
+     are removed and one scrape_log row is written for the whole run; with
+     the Postgres store that happens in the transaction that merges the
+     staged rows, so readers see one consistent catalog. If a share failed
+     or never reported, the stored products are left as they were.
+     product_matches, insight_summary and the snapshot are then rebuilt once.
+
+The shard directory must be shared by the shards and the finalize step: a
+local directory for processes on one machine, or an artifact passed between
+jobs.
+"""
+
+import os
+import json
+import statistics
+import tempfile
+import threading
+from collections import Counter
+from datetime import datetime, timezone
+
+SHARD_DIR = os.environ.get(
+    "SCRAPE_SHARD_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".shards"))
+
+# A plan older than this is from an earlier run and is replaced
+PLAN_MAX_AGE_HOURS = 6
+
+# Expected duration of a supplier (or category) with no logged runs, when
+# no other supplier has any either
+DEFAULT_UNIT_SECONDS = 60.0
+
+# scrape_log telemetry columns summed across a split supplier's shares
+SUMMED_COLUMNS = ("request_count", "bytes_downloaded", "session_resets", "retry_count",
+                  "throttle_seconds", "fetch_seconds", "parse_seconds", "write_seconds")
+
+
+def parse_shard(text: str) -> tuple:
+    """"I/N" -> (I, N), for argparse; shards are numbered from 1."""
+    try:
+        index, count = (int(part) for part in text.split("/"))
+    except ValueError:
+        raise ValueError(f"expected I/N, e.g. 1/3, not '{text}'") from None
+    if not 1 <= index <= count:
+        raise ValueError(f"shard {index} is outside 1..{count}")
+    return index, count
+
+
+def _unit(supplier: dict, categories: list, split: bool, seconds: float) -> dict:
+    # "full": the supplier's run is a full sweep, so finalize removes delisted products
+    return {"source": supplier["source"], "categories": categories, "split": split,
+            "full": supplier["categories"] is None, "seconds": seconds, "rate": None}
+
+
+def _split(supplier: dict) -> list:
+    """A unit per category of a supplier, costed by its share of the logged
+    category crawl times (a category with none counts as the median)."""
+    logged = supplier.get("category_seconds") or {}
+    categories = supplier["categories"] or supplier["splittable"]
+    known = [float(logged[c]) for c in categories if c in logged]
+    fallback = statistics.median(known) if known else 1.0
+    weights = [float(logged.get(c, fallback)) for c in categories]
+    total = sum(weights)
+    return [_unit(supplier, [c], True, supplier["seconds"] * w / total) for c, w in zip(categories, weights)]
+
+
+def balance(suppliers: list, shards: int) -> list:
+    """Assign `suppliers` to `shards`, longest first to the least loaded shard.
+
+    Each supplier is a dict of "source", "host", "seconds" (expected, or
+    None) and "categories" (labels to crawl, or None for all). Those crawled
+    by category also have "splittable", every category label,
+    "category_seconds", their logged crawl times, and "rate", their allowed
+    requests/sec. Returns units of "source", "categories", "split", "full",
+    "seconds", "rate" and "shard". The shares of a split supplier run at
+    the same time, so each gets its rate divided by the shards it spans and
+    the host sees no more than the supplier's rate; "rate" is None for the
+    units of whole suppliers.
+    """
+    known = [s["seconds"] for s in suppliers if s["seconds"]]
+    fallback = statistics.median(known) if known else DEFAULT_UNIT_SECONDS
+    suppliers = [{**s, "seconds": float(s["seconds"] or fallback)} for s in suppliers]
+    share = sum(s["seconds"] for s in suppliers) / shards
+
+    # Units placed together: the suppliers of one host, or one category of a split supplier
+    groups = {}
+    for s in suppliers:
+        if s.get("splittable") and s["seconds"] > share and len(s["categories"] or s["splittable"]) > 1:
+            for unit in _split(s):
+                groups[(s["source"], unit["categories"][0])] = [unit]
+        else:
+            groups.setdefault(s["host"], []).append(_unit(s, s["categories"], False, s["seconds"]))
+
+    load = [0.0] * shards
+    units = []
+    for group in sorted(groups.values(), key=lambda g: sum(u["seconds"] for u in g), reverse=True):
+        shard = min(range(shards), key=load.__getitem__)
+        load[shard] += sum(u["seconds"] for u in group)
+        units.extend({**u, "seconds": round(u["seconds"], 1), "shard": shard + 1} for u in group)
+
+    spanned = {}
+    for u in units:
+        if u["split"]:
+            spanned.setdefault(u["source"], set()).add(u["shard"])
+    rates = {s["source"]: s.get("rate") for s in suppliers}
+    for u in units:
+        if u["split"] and rates[u["source"]]:
+            u["rate"] = rates[u["source"]] / len(spanned[u["source"]])
+    return units
+
+
+def _write_json(path: str, data) -> str:
+    """Write `data` to a temporary file beside `path` and return its name."""
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    with os.fdopen(fd, "w") as f:
+        json.dump(data, f)
+    return tmp
+
+
+def save_plan(plan: dict, directory: str = SHARD_DIR) -> bool:
+    """Save `plan` unless a current plan for as many shards is already there
+    (another shard got there first); True if `plan` was saved."""
+    if load_plan(directory, plan["shards"]) is not None:
+        return False
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, "plan.json")
+    tmp = _write_json(path, plan)
+    try:
+        os.link(tmp, path)
+    except FileExistsError:
+        # A stale plan, or one a concurrent shard has just saved
+        if load_plan(directory, plan["shards"]) is not None:
+            os.remove(tmp)
+            return False
+        os.replace(tmp, path)
+        return True
+    os.remove(tmp)
+    return True
+
+
+def load_plan(directory: str = SHARD_DIR, shards: int = None):
+    """The current plan in `directory` (for `shards` shards), or None."""
+    try:
+        with open(os.path.join(directory, "plan.json")) as f:
+            plan = json.load(f)
+    except (OSError, ValueError):
+        return None
+    age = datetime.now(timezone.utc) - datetime.fromisoformat(plan["created_at"])
+    if age.total_seconds() > PLAN_MAX_AGE_HOURS * 3600 or shards not in (None, plan["shards"]):
+        return None
+    return plan
+
+
+class ShardResults:
+    """What one shard saw of each split supplier share it scraped, in
+    shard-I.json; rewritten after every share so finalize sees finished
+    shares even if the shard dies later."""
+
+    def __init__(self, plan: dict, shard: int, directory: str = SHARD_DIR):
+        self.path = os.path.join(directory, f"shard-{shard}.json")
+        self.plan = plan["created_at"]
+        self.shard = shard
+        self.parts = []
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def add(self, part: dict):
+        with self._lock:
+            self.parts.append({"plan": self.plan, "shard": self.shard, **part})
+            os.replace(_write_json(self.path, self.parts), self.path)
+
+
+def load_results(plan: dict, directory: str = SHARD_DIR) -> list:
+    """Every share the shards in `directory` recorded under `plan`."""
+    parts = []
+    for name in sorted(os.listdir(directory)):
+        if name.startswith("shard-") and name.endswith(".json"):
+            with open(os.path.join(directory, name)) as f:
+                parts.extend(p for p in json.load(f) if p["plan"] == plan["created_at"])
+    return parts
+
+
+def combine_stats(parts: list) -> dict:
+    """scrape_log telemetry of a split supplier from its shares' stats. The
+    shares run side by side, so the wall time is the longest one."""
+    stats = [part["stats"] for part in parts]
+    combined = {col: sum(s.get(col) or 0 for s in stats) for col in SUMMED_COLUMNS}
+    statuses = Counter()
+    categories = {}
+    for s in stats:
+        statuses.update(s.get("status_counts") or {})
+        categories.update(s.get("category_seconds") or {})
+    combined["status_counts"] = dict(sorted(statuses.items()))
+    combined["category_seconds"] = categories or None
+    combined["wall_seconds"] = max((s.get("wall_seconds") or 0 for s in stats), default=0)
+    return combined
+
+
+def clear(directory: str = SHARD_DIR):
+    """Remove the plan and shard results once a run is finalized."""
+    for name in os.listdir(directory):
+        if name == "plan.json" or (name.startswith("shard-") and name.endswith(".json")):
+            os.remove(os.path.join(directory, name))
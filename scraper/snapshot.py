@@ -0,0 +1,137 @@
+"""
+Compact, sharded catalog snapshots.
+
+A snapshot is one shard per supplier plus a small manifest. Each shard lists
+its products as arrays under a shared column list. Categories and URL / image
+directory prefixes are dictionary-encoded, so the long repeated strings that
+bloat data.json are stored once per shard. Shards are named by content hash
+and pre-gzipped; gzip is what snapshot.js can inflate with
+DecompressionStream, so no other encodings are written. Clients compare
+manifest hashes with what they already hold and download only the shards
+that changed. snapshot.js decodes them in the browser.
+
+Manifest layout:
+    {
+      "format": 1,
+      "version": "<hash of all shard hashes>",
+      "generated_at": "2026-02-11T07:23:49+00:00",
+      "shards": {
+        "kevmor": {"path": "shards/kevmor.<hash16>.json", "hash": "<sha256>",
+                   "count": 1215, "bytes": 231072, "gzip_bytes": 30412,
+                   "name": "Kevmor", "color": "#f97316", "url": "https://kevmor.com.au"},
+        ...
+      }
+    }
+"""
+
+import gzip
+import json
+import hashlib
+from datetime import datetime, timezone
+
+FORMAT = 1
+
+# Row layout; *_prefix and category hold indexes into the shard dictionaries
+COLUMNS = ("id", "name", "price", "price_display", "url_prefix", "url",
+           "image_prefix", "image", "category", "sku")
+
+
+def _split_prefix(value: str):
+    """Split a URL after its last '/' into (directory prefix, remainder)."""
+    i = value.rfind("/") + 1
+    return value[:i], value[i:]
+
+
+def _dumps(obj) -> bytes:
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def build_shard(source: str, products: list) -> dict:
+    """Encode one supplier's products (dicts with the products table columns)."""
+    categories = {}
+    prefixes = {}
+
+    def intern(table: dict, value: str) -> int:
+        idx = table.get(value)
+        if idx is None:
+            idx = table[value] = len(table)
+        return idx
+
+    rows = []
+    for p in products:
+        url_prefix, url = _split_prefix(p.get("url") or "")
+        image_prefix, image = _split_prefix(p.get("image") or "")
+        price = p.get("price")
+        rows.append([
+            p.get("id"),
+            p["name"],
+            float(price) if price is not None else None,
+            p.get("price_display") or "",
+            intern(prefixes, url_prefix),
+            url,
+            intern(prefixes, image_prefix),
+            image,
+            intern(categories, p.get("category") or ""),
+            p.get("sku") or "",
+        ])
+    return {
+        "format": FORMAT,
+        "source": source,
+        "columns": list(COLUMNS),
+        "categories": list(categories),
+        "prefixes": list(prefixes),
+        "products": rows,
+    }
+
+
+def decode_shard(shard: dict) -> list:
+    """Inverse of build_shard: product dicts with full URLs and category names."""
+    categories, prefixes = shard["categories"], shard["prefixes"]
+    products = []
+    for row in shard["products"]:
+        p = dict(zip(shard["columns"], row))
+        p["url"] = prefixes[p.pop("url_prefix")] + p["url"]
+        p["image"] = prefixes[p.pop("image_prefix")] + p["image"]
+        p["category"] = categories[p["category"]]
+        p["source"] = shard["source"]
+        products.append(p)
+    return products
+
+
+def build_snapshot(products_by_source: dict, meta: dict = None) -> tuple:
+    """Build every shard and the manifest.
+
+    `meta` maps source -> supplier_config-style {"name", "color", "url"}.
+    Returns (manifest, files) where files maps relative path -> bytes,
+    including the .gz variant of every shard.
+    """
+    meta = meta or {}
+    files = {}
+    shards = {}
+    for source in sorted(products_by_source):
+        raw = _dumps(build_shard(source, products_by_source[source]))
+        digest = hashlib.sha256(raw).hexdigest()
+        path = f"shards/{source}.{digest[:16]}.json"
+        files[path] = raw
+        files[path + ".gz"] = gzip.compress(raw, compresslevel=9, mtime=0)
+        info = meta.get(source, {})
+        shards[source] = {
+            "path": path,
+            "hash": digest,
+            "count": len(products_by_source[source]),
+            "bytes": len(raw),
+            "gzip_bytes": len(files[path + ".gz"]),
+            **{k: info[k] for k in ("name", "color", "url") if info.get(k)},
+        }
+    version = hashlib.sha256("".join(s["hash"] for s in shards.values()).encode()).hexdigest()[:16]
+    manifest = {
+        "format": FORMAT,
+        "version": version,
+        "generated_at": datetime.now(timezone.utc).isoformat(),
+        "shards": shards,
+    }
+    return manifest, files
+
+
+def manifest_bytes(manifest: dict) -> bytes:
+    return json.dumps(manifest, indent=1).encode("utf-8")
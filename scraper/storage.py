@@ -0,0 +1,487 @@
+"""
+Storage backends for the scraper's product writer.
+
+ProductWriter (scrape.py) diffs each scraped batch against the stored
+catalog. A Store does the I/O around that diff. It loads a supplier's stored
+products, writes the new and changed rows with their price_history entries,
+and finishes the run by removing delisted products and logging it to
+scrape_log. It also reads back scrape_log and price_history for the scheduler
+and price_series(). Three backends are available:
+
+  RestStore      Supabase REST (PostgREST), in JSON batches of 500. The
+                 default; needs only SUPABASE_URL / SUPABASE_SERVICE_KEY.
+                 PostgREST has no transaction spanning requests, so each
+                 batch is upserted as it's written, and a run that fails or
+                 is rejected as too small (IncompleteScrapeError) keeps the
+                 rows it already upserted. It only skips the deletions and
+                 the success log.
+  PostgresStore  Direct Postgres connections from a pool (psycopg 3 with
+                 psycopg_pool, from requirements-postgres.txt). Batches are COPYed into
+                 the unlogged products_staging / price_history_staging tables
+                 while the scrape runs. finish() merges them into products
+                 and price_history, deletes delisted rows and writes the log
+                 entry in one transaction, so readers see a supplier's whole
+                 run at once.
+  SqliteStore    A local SQLite file with the same tables, for offline runs
+                 and benchmarks. Like PostgresStore, it stages batches and
+                 applies a supplier's run in finish().
+
+Usage:
+    store = open_store("postgres", database_url="postgresql://...")
+    scrape.set_store(store)
+"""
+
+import os
+import json
+import sqlite3
+import threading
+
+# PostgREST caps a single select at 1000 rows
+SELECT_PAGE_SIZE = 1000
+
+# REST rows per request
+REST_BATCH_SIZE = 500
+
+# products columns written by the scraper; id and search_vector are the database's
+PRODUCT_COLUMNS = ("source", "url", "name", "price", "price_display", "image", "category", "sku",
+                   "description", "search_name", "scraped_at")
+
+HISTORY_COLUMNS = ("source", "url", "price", "price_display", "observed_at")
+
+# scrape_log columns returned by successful_runs()
+RUN_COLUMNS = ("started_at", "sync_mode", "product_count", "inserted_count", "updated_count",
+               "removed_count", "wall_seconds", "category_seconds")
+
+DEFAULT_POOL_SIZE = 4
+
+
+def select_all(build_query) -> list:
+    """Every row of a select, paged past the PostgREST row cap.
+
+    `build_query` returns a fresh, ordered query builder for each page.
+    """
+    rows = []
+    offset = 0
+    while True:
+        resp = build_query().range(offset, offset + SELECT_PAGE_SIZE - 1).execute()
+        rows.extend(resp.data)
+        if len(resp.data) < SELECT_PAGE_SIZE:
+            return rows
+        offset += SELECT_PAGE_SIZE
+
+
+class Store:
+    """Where ProductWriter keeps products, price history and the scrape log.
+
+    Timestamps go in and come out as ISO 8601 strings.
+    """
+
+    name = "store"
+
+    def load_products(self, source: str, columns: tuple) -> list:
+        """Stored products of `source` as dicts of id, url and `columns`."""
+        raise NotImplementedError
+
+    def begin(self, source: str, resume: bool):
+        """Start writing `source`; `resume` continues an interrupted run."""
+
+    def write(self, source: str, rows: list, history: list):
+        """Write new and changed products rows and their price_history rows."""
+        raise NotImplementedError
+
+    def finish(self, source: str, removed_ids: list, log: dict):
+        """Complete a run: remove `removed_ids` and add the scrape_log row."""
+        raise NotImplementedError
+
+    def discard(self, source: str):
+        """Drop anything written for `source` that finish() hasn't applied."""
+
+    def log_run(self, log: dict):
+        """Add a scrape_log row for a run that didn't finish."""
+        raise NotImplementedError
+
+    def successful_runs(self, source: str, limit: int) -> list:
+        """The latest successful scrape_log rows of `source`, newest first,
+        as dicts of RUN_COLUMNS."""
+        raise NotImplementedError
+
+    def price_series(self, source: str, url: str = None, since: str = None) -> list:
+        """price_history rows of `source` (or of one product, by `url`),
+        observed at or after `since`, as dicts of url, price, price_display
+        and observed_at, ordered by url then time."""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class RestStore(Store):
+    """Supabase REST; `client` returns the supabase-py client to use.
+
+    Writes are not staged: discard() can't undo batches already upserted.
+    """
+
+    name = "rest"
+
+    def __init__(self, client):
+        self.client = client
+
+    def load_products(self, source: str, columns: tuple) -> list:
+        return select_all(lambda: self.client().table("products")
+                          .select("id, url, " + ", ".join(columns))
+                          .eq("source", source)
+                          .order("id"))
+
+    def write(self, source: str, rows: list, history: list):
+        for i in range(0, len(rows), REST_BATCH_SIZE):
+            # Rows may be Products (see product.py); the request body needs dicts
+            self.client().table("products").upsert(
+                [dict(row) for row in rows[i:i + REST_BATCH_SIZE]], on_conflict="source,url"
+            ).execute()
+        for i in range(0, len(history), REST_BATCH_SIZE):
+            self.client().table("price_history").insert(history[i:i + REST_BATCH_SIZE]).execute()
+
+    def finish(self, source: str, removed_ids: list, log: dict):
+        for i in range(0, len(removed_ids), REST_BATCH_SIZE):
+            self.client().table("products").delete().in_("id", removed_ids[i:i + REST_BATCH_SIZE]).execute()
+        self.log_run(log)
+
+    def log_run(self, log: dict):
+        self.client().table("scrape_log").insert(log).execute()
+
+    def successful_runs(self, source: str, limit: int) -> list:
+        return (self.client().table("scrape_log")
+                .select(", ".join(RUN_COLUMNS))
+                .eq("source", source)
+                .eq("status", "success")
+                .order("started_at", desc=True)
+                .limit(limit)
+                .execute()).data
+
+    def price_series(self, source: str, url: str = None, since: str = None) -> list:
+        def query():
+            q = (self.client().table("price_history")
+                 .select("url, price, price_display, observed_at")
+                 .eq("source", source))
+            if url is not None:
+                q = q.eq("url", url)
+            if since is not None:
+                q = q.gte("observed_at", since)
+            return q.order("url").order("observed_at").order("id")
+        return select_all(query)
+
+
+# Latest staged copy of each product (a batch re-sent after a crash is staged twice)
+MERGE_PRODUCTS = """
+INSERT INTO products ({columns})
+SELECT DISTINCT ON (url) {columns} FROM products_staging
+WHERE source = %(source)s
+ORDER BY url, id DESC
+ON CONFLICT (source, url) DO UPDATE SET {updates}
+""".format(columns=", ".join(PRODUCT_COLUMNS),
+           updates=", ".join(f"{c} = EXCLUDED.{c}" for c in PRODUCT_COLUMNS[2:]))
+
+MERGE_HISTORY = """
+INSERT INTO price_history ({columns})
+SELECT DISTINCT ON (url) {columns} FROM price_history_staging
+WHERE source = %(source)s
+ORDER BY url, id DESC
+""".format(columns=", ".join(HISTORY_COLUMNS))
+
+
+class PostgresStore(Store):
+    """Pooled direct connections with COPY staging and a per-supplier merge."""
+
+    name = "postgres"
+
+    def __init__(self, database_url: str, pool_size: int = DEFAULT_POOL_SIZE):
+        try:
+            from psycopg_pool import ConnectionPool
+        except ImportError as e:
+            raise ImportError("the postgres store needs psycopg 3: "
+                              "pip install -r scraper/requirements-postgres.txt") from e
+        self.pool = ConnectionPool(database_url, min_size=1, max_size=pool_size, open=True)
+
+    def load_products(self, source: str, columns: tuple) -> list:
+        from psycopg.rows import dict_row
+
+        with self.pool.connection() as conn, conn.cursor(row_factory=dict_row) as cur:
+            cur.execute(f"SELECT id, url, {', '.join(columns)} FROM products WHERE source = %s ORDER BY id",
+                        (source,))
+            return cur.fetchall()
+
+    def begin(self, source: str, resume: bool):
+        if not resume:
+            self.discard(source)
+
+    def write(self, source: str, rows: list, history: list):
+        with self.pool.connection() as conn, conn.cursor() as cur:
+            with cur.copy(f"COPY products_staging ({', '.join(PRODUCT_COLUMNS)}) FROM STDIN") as copy:
+                for row in rows:
+                    copy.write_row([row.get(c) for c in PRODUCT_COLUMNS])
+            if history:
+                with cur.copy(f"COPY price_history_staging ({', '.join(HISTORY_COLUMNS)}) FROM STDIN") as copy:
+                    for row in history:
+                        copy.write_row([row.get(c) for c in HISTORY_COLUMNS])
+
+    def finish(self, source: str, removed_ids: list, log: dict):
+        with self.pool.connection() as conn:
+            conn.execute(MERGE_PRODUCTS, {"source": source})
+            conn.execute(MERGE_HISTORY, {"source": source})
+            if removed_ids:
+                conn.execute("DELETE FROM products WHERE id = ANY(%s)", (removed_ids,))
+            self._insert_log(conn, log)
+            self._clear_staging(conn, source)
+
+    def discard(self, source: str):
+        with self.pool.connection() as conn:
+            self._clear_staging(conn, source)
+
+    def log_run(self, log: dict):
+        with self.pool.connection() as conn:
+            self._insert_log(conn, log)
+
+    def successful_runs(self, source: str, limit: int) -> list:
+        from psycopg.rows import dict_row
+
+        with self.pool.connection() as conn, conn.cursor(row_factory=dict_row) as cur:
+            cur.execute(f"SELECT {', '.join(RUN_COLUMNS)} FROM scrape_log "
+                        "WHERE source = %s AND status = 'success' ORDER BY started_at DESC LIMIT %s",
+                        (source, limit))
+            return [{**run, "started_at": run["started_at"].isoformat()} for run in cur]
+
+    def price_series(self, source: str, url: str = None, since: str = None) -> list:
+        from psycopg.rows import dict_row
+
+        sql, params = ["SELECT url, price, price_display, observed_at FROM price_history WHERE source = %s"], [source]
+        if url is not None:
+            sql.append("AND url = %s")
+            params.append(url)
+        if since is not None:
+            sql.append("AND observed_at >= %s")
+            params.append(since)
+        sql.append("ORDER BY url, observed_at, id")
+        with self.pool.connection() as conn, conn.cursor(row_factory=dict_row) as cur:
+            cur.execute(" ".join(sql), params)
+            return [{**row, "observed_at": row["observed_at"].isoformat()} for row in cur]
+
+    @staticmethod
+    def _insert_log(conn, log: dict):
+        from psycopg.types.json import Jsonb
+
+        values = [Jsonb(v) if isinstance(v, dict) else v for v in log.values()]
+        conn.execute(f"INSERT INTO scrape_log ({', '.join(log)}) VALUES ({', '.join(['%s'] * len(log))})",
+                     values)
+
+    @staticmethod
+    def _clear_staging(conn, source: str):
+        conn.execute("DELETE FROM products_staging WHERE source = %s", (source,))
+        conn.execute("DELETE FROM price_history_staging WHERE source = %s", (source,))
+
+    def close(self):
+        self.pool.close()
+
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS products (
+    id INTEGER PRIMARY KEY,
+    source TEXT NOT NULL,
+    url TEXT NOT NULL DEFAULT '',
+    name TEXT NOT NULL,
+    price REAL,
+    price_display TEXT,
+    image TEXT,
+    category TEXT,
+    sku TEXT,
+    description TEXT,
+    search_name TEXT,
+    scraped_at TEXT NOT NULL,
+    UNIQUE (source, url)
+);
+CREATE TABLE IF NOT EXISTS price_history (
+    id INTEGER PRIMARY KEY,
+    source TEXT NOT NULL,
+    url TEXT NOT NULL,
+    price REAL,
+    price_display TEXT,
+    observed_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_price_history_product ON price_history(source, url, observed_at);
+CREATE TABLE IF NOT EXISTS products_staging (
+    id INTEGER PRIMARY KEY,
+    source TEXT NOT NULL,
+    url TEXT NOT NULL DEFAULT '',
+    name TEXT NOT NULL,
+    price REAL,
+    price_display TEXT,
+    image TEXT,
+    category TEXT,
+    sku TEXT,
+    description TEXT,
+    search_name TEXT,
+    scraped_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_products_staging_source ON products_staging(source, url);
+CREATE TABLE IF NOT EXISTS price_history_staging (
+    id INTEGER PRIMARY KEY,
+    source TEXT NOT NULL,
+    url TEXT NOT NULL,
+    price REAL,
+    price_display TEXT,
+    observed_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_price_history_staging_source ON price_history_staging(source, url);
+CREATE TABLE IF NOT EXISTS scrape_log (
+    id INTEGER PRIMARY KEY,
+    source TEXT NOT NULL,
+    product_count INTEGER NOT NULL,
+    products_with_price INTEGER NOT NULL DEFAULT 0,
+    started_at TEXT NOT NULL,
+    completed_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now')),
+    status TEXT NOT NULL DEFAULT 'success',
+    inserted_count INTEGER,
+    updated_count INTEGER,
+    removed_count INTEGER,
+    sync_mode TEXT,
+    request_count INTEGER,
+    bytes_downloaded INTEGER,
+    status_counts TEXT,
+    session_resets INTEGER,
+    retry_count INTEGER,
+    wall_seconds REAL,
+    throttle_seconds REAL,
+    fetch_seconds REAL,
+    parse_seconds REAL,
+    write_seconds REAL,
+    category_seconds TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_scrape_log_source ON scrape_log(source, started_at);
+"""
+
+# Columns added to SQLITE_SCHEMA since it was first released, for older files
+SQLITE_ADDED_COLUMNS = (("scrape_log", "category_seconds", "TEXT"),)
+
+STAGE_PRODUCT = "INSERT INTO products_staging ({columns}) VALUES ({params})".format(
+    columns=", ".join(PRODUCT_COLUMNS), params=", ".join("?" * len(PRODUCT_COLUMNS)))
+
+STAGE_HISTORY = "INSERT INTO price_history_staging ({columns}) VALUES ({params})".format(
+    columns=", ".join(HISTORY_COLUMNS), params=", ".join("?" * len(HISTORY_COLUMNS)))
+
+# Latest staged copy of each product, as MERGE_PRODUCTS
+SQLITE_MERGE_PRODUCTS = """
+INSERT INTO products ({columns})
+SELECT {columns} FROM products_staging AS s
+WHERE source = ? AND id = (SELECT MAX(id) FROM products_staging WHERE source = s.source AND url = s.url)
+ORDER BY id
+ON CONFLICT (source, url) DO UPDATE SET {updates}
+""".format(columns=", ".join(PRODUCT_COLUMNS),
+           updates=", ".join(f"{c} = excluded.{c}" for c in PRODUCT_COLUMNS[2:]))
+
+SQLITE_MERGE_HISTORY = """
+INSERT INTO price_history ({columns})
+SELECT {columns} FROM price_history_staging AS h
+WHERE source = ? AND id = (SELECT MAX(id) FROM price_history_staging WHERE source = h.source AND url = h.url)
+ORDER BY id
+""".format(columns=", ".join(HISTORY_COLUMNS))
+
+
+class SqliteStore(Store):
+    """The writer's tables in a local SQLite file, safe to share between threads."""
+
+    name = "sqlite"
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SQLITE_SCHEMA)
+        for table, column, kind in SQLITE_ADDED_COLUMNS:
+            if column not in {row["name"] for row in self._conn.execute(f"PRAGMA table_info({table})")}:
+                self._conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {kind}")
+        self._lock = threading.Lock()
+
+    def load_products(self, source: str, columns: tuple) -> list:
+        with self._lock:
+            cur = self._conn.execute(
+                f"SELECT id, url, {', '.join(columns)} FROM products WHERE source = ? ORDER BY id", (source,))
+            return [dict(row) for row in cur]
+
+    def begin(self, source: str, resume: bool):
+        if not resume:
+            self.discard(source)
+
+    def write(self, source: str, rows: list, history: list):
+        with self._lock, self._conn:
+            self._conn.executemany(STAGE_PRODUCT, ([row.get(c) for c in PRODUCT_COLUMNS] for row in rows))
+            self._conn.executemany(STAGE_HISTORY, ([row.get(c) for c in HISTORY_COLUMNS] for row in history))
+
+    def finish(self, source: str, removed_ids: list, log: dict):
+        with self._lock, self._conn:
+            self._conn.execute(SQLITE_MERGE_PRODUCTS, (source,))
+            self._conn.execute(SQLITE_MERGE_HISTORY, (source,))
+            self._conn.executemany("DELETE FROM products WHERE id = ?", ((i,) for i in removed_ids))
+            self._insert_log(log)
+            self._clear_staging(source)
+
+    def discard(self, source: str):
+        with self._lock, self._conn:
+            self._clear_staging(source)
+
+    def log_run(self, log: dict):
+        with self._lock, self._conn:
+            self._insert_log(log)
+
+    def successful_runs(self, source: str, limit: int) -> list:
+        with self._lock:
+            cur = self._conn.execute(
+                f"SELECT {', '.join(RUN_COLUMNS)} FROM scrape_log "
+                "WHERE source = ? AND status = 'success' ORDER BY started_at DESC LIMIT ?", (source, limit))
+            runs = [dict(row) for row in cur]
+        for run in runs:
+            if run["category_seconds"] is not None:
+                run["category_seconds"] = json.loads(run["category_seconds"])
+        return runs
+
+    def price_series(self, source: str, url: str = None, since: str = None) -> list:
+        sql, params = ["SELECT url, price, price_display, observed_at FROM price_history WHERE source = ?"], [source]
+        if url is not None:
+            sql.append("AND url = ?")
+            params.append(url)
+        if since is not None:
+            sql.append("AND observed_at >= ?")
+            params.append(since)
+        sql.append("ORDER BY url, observed_at, id")
+        with self._lock:
+            return [dict(row) for row in self._conn.execute(" ".join(sql), params)]
+
+    def _insert_log(self, log: dict):
+        values = [json.dumps(v) if isinstance(v, dict) else v for v in log.values()]
+        self._conn.execute(
+            f"INSERT INTO scrape_log ({', '.join(log)}) VALUES ({', '.join('?' * len(log))})", values)
+
+    def _clear_staging(self, source: str):
+        self._conn.execute("DELETE FROM products_staging WHERE source = ?", (source,))
+        self._conn.execute("DELETE FROM price_history_staging WHERE source = ?", (source,))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+STORES = ("rest", "postgres", "sqlite")
+
+
+def open_store(kind: str, client=None, database_url: str = None, sqlite_path: str = None,
+               pool_size: int = DEFAULT_POOL_SIZE) -> Store:
+    """A Store of `kind` (one of STORES); `client` is RestStore's client factory."""
+    if kind == "rest":
+        return RestStore(client)
+    if kind == "postgres":
+        if not database_url:
+            raise ValueError("the postgres store needs a database URL (SUPABASE_DB_URL)")
+        return PostgresStore(database_url, pool_size)
+    if kind == "sqlite":
+        path = sqlite_path or os.path.join(os.path.dirname(os.path.abspath(__file__)), "scrape.sqlite")
+        return SqliteStore(path)
+    raise ValueError(f"unknown store '{kind}' (expected one of {', '.join(STORES)})")
@@ -0,0 +1,13 @@
+"""
+Tests for the scraper's pure logic, run from the repository root with:
+
+    python -m pytest scraper/tests
+
+The scraper's modules import each other by bare name, as scrape.py runs
+them from this directory, so it is put on sys.path here.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
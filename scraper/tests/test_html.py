@@ -0,0 +1,63 @@
+import os
+import random
+
+import pytest
+from bs4 import BeautifulSoup
+
+import replay
+import scrape
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def soup_text(html):
+    return BeautifulSoup(html, "html.parser").get_text(strip=True)
+
+
+def page(name):
+    with open(os.path.join(ROOT, name), encoding="utf-8") as f:
+        return f.read()
+
+
+@pytest.mark.parametrize("html", [
+    replay.DESCRIPTION,
+    replay.kevmor_page(range(12)),
+    page("index.html"),
+    page("insights.html"),
+    page("login.html"),
+], ids=["description", "kevmor", "index", "insights", "login"])
+def test_pages_match_beautifulsoup(html):
+    assert scrape.html_to_text(html) == soup_text(html)
+
+
+@pytest.mark.parametrize("html", [
+    "",
+    "  plain text  ",
+    "a &amp; b <b>x</b>",
+    # Character references: unknown names stay literal, controls are kept
+    "&foo;&amp&ampx &copy;",
+    "&#1;x&#0;&#150;&#x110000;&#xd800;",
+    "<p>a</p>&#x41",
+    # An unfinished tag at the end is kept verbatim, references and all
+    "<p&#169;<p<p",
+    "<table><tr><td></&b",
+    "x </3 y <3 z",
+    "<p>a</ b>c",
+    "<script>var a = '<p>';</script>after",
+    "<style>p{}</style><template><p>t</p></template>shown",
+    "<![CDATA[kept]]><!-- dropped --><!DOCTYPE html><?pi?>",
+    "<b>bold<i>both</b>after</i>",
+])
+def test_malformed_markup_matches_beautifulsoup(html):
+    assert scrape.html_to_text(html) == soup_text(html)
+
+
+def test_random_markup_matches_beautifulsoup():
+    pieces = ["<p>", "</p>", "<", "</", "&", "&#169;", "&amp", "&foo;", ";", "p", "b", "<br/>",
+              "<script>", "</script>", "<!--", "-->", "<![CDATA[x]]>", "<!DOCTYPE html>", " ",
+              "\n", "<table>", "<td>", "</td>", "<style>", "x>", "<?pi?>", "&#x41", "<b", ">",
+              "'", '"', "=", "<a href='x'>", "</a>", "<template>", "</template>"]
+    rng = random.Random(1)
+    for _ in range(2000):
+        html = "".join(rng.choice(pieces) for _ in range(rng.randint(1, 12)))
+        assert scrape.html_to_text(html) == soup_text(html), html
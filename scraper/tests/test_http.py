@@ -0,0 +1,106 @@
+import itertools
+import random
+import time
+
+import pytest
+import requests
+
+import replay
+import scrape
+
+
+@pytest.fixture(autouse=True)
+def fresh_hosts(monkeypatch):
+    monkeypatch.setattr(scrape, "_host_buckets", {})
+    monkeypatch.setattr(scrape, "_host_breakers", {})
+
+
+def test_second_supplier_on_a_host_keeps_its_backoff():
+    bucket = scrape.host_bucket("https://gibbontrade.com.au/shop", 4.0)
+    bucket.throttle()
+    # gibbon_web starts on the same host while gibbon is backed off
+    assert scrape.host_bucket("https://www.gibbontrade.com.au/", 4.0) is bucket
+    assert bucket.rate == 2.0 and bucket.max_rate == 4.0
+    # A lower configured rate still applies at once
+    scrape.host_bucket("https://gibbontrade.com.au/", 1.0)
+    assert bucket.rate == 1.0 and bucket.max_rate == 1.0
+
+
+def first_failing_seed(error_rate):
+    """A StubServer seed whose first request fails and second succeeds."""
+    for seed in itertools.count():
+        rng = random.Random(seed)
+        if rng.random() < error_rate <= rng.random():
+            return seed
+
+
+@pytest.fixture(scope="module")
+def fixture():
+    return replay.generate("shopify", pages=1, per_page=2)
+
+
+def products_url(stub):
+    return stub.url("shop") + "/products.json?limit=250&page=1"
+
+
+def test_retry_after_is_honoured_then_rate_recovers(fixture):
+    with replay.StubServer({"shop": fixture}, error_rate=0.5, error_status=429, retry_after=0.3,
+                           seed=first_failing_seed(0.5)) as stub:
+        bucket = scrape.TokenBucket(10.0)
+        stats = scrape.ScrapeStats("shop")
+        t0 = time.monotonic()
+        r = scrape.http_get(requests.Session(), products_url(stub), bucket, stats)
+        elapsed = time.monotonic() - t0
+
+    assert r.status_code == 200
+    assert elapsed >= 0.3
+    assert stats.retries == 1 and stats.statuses == {429: 1, 200: 1}
+    # Halved by the 429, then a step back towards 10/s for the success
+    assert bucket.rate == pytest.approx(5.0 + 10.0 * scrape.RATE_RECOVERY_STEP)
+
+
+def test_breaker_opens_and_lets_one_trial_through(fixture, monkeypatch):
+    monkeypatch.setattr(scrape, "RETRY_BASE_DELAY", 0.01)
+    with replay.StubServer({"shop": fixture}, error_rate=1.0, error_status=500) as stub:
+        url = products_url(stub)
+        host = scrape._host_of(url)
+        breaker = scrape._host_breakers[host] = scrape.CircuitBreaker(host, threshold=3, cooldown=0.2)
+        stats = scrape.ScrapeStats("shop")
+        session = requests.Session()
+
+        with pytest.raises(scrape.CircuitOpenError):
+            scrape.http_get(session, url, stats=stats, retries=5)
+        assert stats.requests == 3
+        # Still cooling down: fails without a request
+        with pytest.raises(scrape.CircuitOpenError):
+            scrape.http_get(session, url, stats=stats)
+        assert stats.requests == 3
+
+        time.sleep(0.25)
+        # The trial request fails, so the circuit opens again at once
+        assert scrape.http_get(session, url, stats=stats, retries=0).status_code == 500
+        assert stats.requests == 4
+        with pytest.raises(scrape.CircuitOpenError):
+            scrape.http_get(session, url, stats=stats)
+
+    time.sleep(0.25)
+    breaker.before_request()
+    # Only one trial at a time
+    with pytest.raises(scrape.CircuitOpenError):
+        breaker.before_request()
+    breaker.record(True)
+    breaker.before_request()
+    assert breaker.failures == 0
+
+
+def test_removed_kevmor_category_is_skipped():
+    fixture = replay.generate("kevmor", pages=2, per_page=3, categories=2)
+    with replay.StubServer({"kevmor": fixture}) as stub:
+        base = stub.url("kevmor")
+        categories = fixture.category_urls(base)
+        categories.insert(1, (base + "/99-removed", "Removed"))
+        stats = scrape.ScrapeStats("kevmor")
+        batches = list(scrape.scrape_kevmor(concurrency=2, rate=100.0, stats=stats, categories=categories))
+
+    assert [(idx, len(batch)) for idx, batch in batches] == [(1, 6), (2, 0), (3, 6)]
+    assert stats.statuses == {200: 4, 404: 1}
@@ -0,0 +1,114 @@
+import pytest
+import requests
+
+import httpcache
+from httpcache import HttpCache
+
+
+class FakeSession:
+    """Serves `pages` (url -> (body, headers)), answering a matching
+    If-None-Match with a bodiless 304 as a real server would."""
+
+    def __init__(self, pages: dict):
+        self.pages = pages
+        self.sent = []
+
+    def get(self, url, headers=None, **kwargs):
+        self.sent.append(dict(headers or {}))
+        r = requests.Response()
+        r.url = url
+        if url not in self.pages:
+            r.status_code, r._content = 404, b"Not found"
+            return r
+        body, page_headers = self.pages[url]
+        r.headers.update(page_headers)
+        if headers and "ETag" in page_headers and headers.get("If-None-Match") == page_headers["ETag"]:
+            r.status_code, r._content = 304, b""
+        else:
+            r.status_code, r._content = 200, body
+        return r
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = HttpCache(str(tmp_path / "cache.sqlite"))
+    yield cache
+    cache.close()
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(httpcache.time, "time", lambda: now[0])
+    return now
+
+
+URL = "https://shop.example/products.json?page=1"
+
+
+def test_304_serves_the_cached_body_and_headers(cache):
+    session = FakeSession({URL: (b'{"products": [1]}', {"ETag": '"v1"', "X-WP-TotalPages": "3"})})
+    first = cache.get(session, URL)
+    assert (first.cache_status, first.content) == ("miss", b'{"products": [1]}')
+    assert "If-None-Match" not in session.sent[0]
+
+    # The server's 304 carries neither the body nor X-WP-TotalPages
+    session.pages[URL] = (b"", {"ETag": '"v1"'})
+    second = cache.get(session, URL)
+    assert session.sent[1]["If-None-Match"] == '"v1"'
+    assert (second.status_code, second.cache_status) == (200, "revalidated")
+    assert second.content == b'{"products": [1]}'
+    assert second.headers["X-WP-TotalPages"] == "3"
+    assert second.content_hash == first.content_hash
+    assert cache.stats["revalidated"] == 1 and cache.stats["bytes_saved"] == len(first.content)
+
+
+def test_unchanged_body_reuses_the_parse(cache):
+    # No validators, so every request is a full 200
+    session = FakeSession({URL: (b"<p>page</p>", {})})
+    calls = []
+
+    def parse(r):
+        calls.append(r.url)
+        return {"products": [r.text]}
+
+    assert cache.parse(cache.get(session, URL), parse) == {"products": ["<p>page</p>"]}
+    r = cache.get(session, URL)
+    assert r.cache_status == "unchanged"
+    assert cache.parse(r, parse) == {"products": ["<p>page</p>"]}
+    assert len(calls) == 1 and cache.stats["parse_reused"] == 1
+
+    # Parsed again under a different context, or once the body changes
+    cache.parse(r, parse, "categories v2")
+    session.pages[URL] = (b"<p>new page</p>", {})
+    r = cache.get(session, URL)
+    assert r.cache_status == "miss"
+    assert cache.parse(r, parse, "categories v2") == {"products": ["<p>new page</p>"]}
+    assert len(calls) == 3
+
+
+def test_errors_are_not_cached(cache):
+    session = FakeSession({})
+    r = cache.get(session, URL)
+    assert (r.status_code, r.cache_status, r.content_hash) == (404, "miss", None)
+    assert cache.parse(r, lambda r: "parsed") == "parsed"
+    cache.get(session, URL)
+    assert session.sent[1] == {}
+
+
+def test_evict_by_age_then_least_recently_used(cache, clock):
+    urls = [f"https://shop.example/p/{i}" for i in range(4)]
+    session = FakeSession({url: (b"x" * 100, {"ETag": f'"{url}"'}) for url in urls})
+    for url in urls:
+        cache.get(session, url)
+        clock[0] += 86400
+    # Revalidating the oldest entry counts as a use
+    assert cache.get(session, urls[0]).cache_status == "revalidated"
+
+    # urls[1] was last used 3 days ago, the rest more recently
+    assert cache.evict(max_age_days=2.5) == 1
+    assert cache.get(session, urls[1]).cache_status == "miss"
+
+    # Over 250 bytes: least recently used first, so urls[2] then urls[3]
+    assert cache.evict(max_bytes=250) == 2
+    assert [cache.get(session, url).cache_status for url in urls] == ["revalidated", "revalidated", "miss", "miss"]
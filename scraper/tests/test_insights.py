@@ -0,0 +1,162 @@
+import random
+
+import pytest
+
+import insights
+import matching
+
+SOURCES = ("gibbon", "gibbon_web", "kevmor", "intafloors", "marques")
+
+# Gibbon's own catalogs in the fixture; every other source is a competitor
+HOME_SOURCES = ("gibbon", "gibbon_web")
+
+
+@pytest.fixture
+def catalog():
+    rnd = random.Random(3)
+    words = [f"w{i}" for i in range(40)] + ["oak", "grey", "natural", "timber", "vinyl"]
+    by_source = {}
+    pid = 0
+    for source in SOURCES:
+        for _ in range(150):
+            pid += 1
+            by_source.setdefault(source, []).append({
+                "id": pid,
+                "source": source,
+                "name": " ".join(rnd.sample(words, rnd.randint(2, 5))),
+                "price": rnd.choice([None, 0, 10.0, round(rnd.uniform(5, 60), 2)]),
+                "url": "",
+            })
+    # Gibbon's web catalog lists much of what gibbon does, under the same names
+    for p in by_source["gibbon"][::2]:
+        pid += 1
+        by_source["gibbon_web"].append({**p, "id": pid, "source": "gibbon_web"})
+    for products in by_source.values():
+        products.sort(key=lambda p: (p["name"], p["id"]))
+    return by_source
+
+
+def brute_force(by_source, match_rows, home=insights.HOME_SOURCE):
+    """The statistics as insights.html runAnalysis() derives them, pair by pair,
+    for every supplier rather than gibbon against kevmor and intafloors.
+
+    Members of HOME_SOURCES are one seller, so never each other's rivals, and
+    every other source is a competitor.
+    """
+    def seller(p):
+        return home if p["source"] in HOME_SOURCES else p["source"]
+
+    products = {p["id"]: p for ps in by_source.values() for p in ps if not matching.is_replacement_part(p)}
+    groups = {}
+    for m in match_rows:
+        groups.setdefault(m["group_id"], []).append(products[m["product_id"]])
+    stats = {s: {"compared": 0, "cheapest": 0, "most_expensive": 0, "middle": 0,
+                 "advantages": [], "disadvantages": []} for s in by_source}
+    for group in groups.values():
+        for me in group:
+            others = [p["price"] for p in group if seller(p) != seller(me) and p["price"]]
+            if not me["price"] or not others:
+                continue
+            s = stats[me["source"]]
+            s["compared"] += 1
+            if me["price"] <= min(others):
+                s["cheapest"] += 1
+                if min(others) - me["price"] > insights.PRICE_MARGIN:
+                    s["advantages"].append(me["id"])
+            elif me["price"] >= max(others):
+                s["most_expensive"] += 1
+                if me["price"] - max(others) > insights.PRICE_MARGIN:
+                    s["disadvantages"].append(me["id"])
+            else:
+                s["middle"] += 1
+
+    tokens = {i: matching.tokenize(p["name"]) for i, p in products.items()}
+
+    def best(i, against):
+        return max((matching.similarity(tokens[i], tokens[j]) for j in against), default=0.0)
+
+    home_ids = [i for i, p in products.items() if p["source"] == home]
+    competitor_ids = [i for i, p in products.items() if p["source"] not in HOME_SOURCES]
+    for source, s in stats.items():
+        if source == home:
+            s["unique_count"] = sum(best(i, competitor_ids) < insights.GAP_THRESHOLD for i in home_ids)
+        elif source not in HOME_SOURCES:
+            s["gap_product_ids"] = sorted(i for i in competitor_ids if products[i]["source"] == source
+                                          and best(i, home_ids) < insights.GAP_THRESHOLD)
+    return stats
+
+
+@pytest.mark.parametrize("max_pairs", [insights.MAX_PAIRS, 500])
+def test_build_insight_rows_equals_brute_force(catalog, monkeypatch, max_pairs):
+    # A small MAX_PAIRS splits the coverage join into many chunks
+    monkeypatch.setattr(insights, "MAX_PAIRS", max_pairs)
+    match_rows = matching.build_match_rows(catalog)
+    rows = {r["source"]: r for r in insights.build_insight_rows(catalog, match_rows, home_sources=HOME_SOURCES)}
+    expected = brute_force(catalog, match_rows)
+
+    assert sorted(rows) == sorted(SOURCES)
+    assert {m["source"] for m in match_rows} == set(SOURCES)
+    for source, e in expected.items():
+        r = rows[source]
+        assert r["compared"] > 0, source
+        for key in ("compared", "cheapest", "most_expensive", "middle"):
+            assert r[key] == e[key], (source, key)
+        assert sorted(a["product_id"] for a in r["price_advantages"]) == sorted(e["advantages"])
+        assert sorted(d["product_id"] for d in r["price_disadvantages"]) == sorted(e["disadvantages"])
+        if source == insights.HOME_SOURCE:
+            assert r["unique_count"] == e["unique_count"]
+        elif source not in HOME_SOURCES:
+            assert sorted(r["gap_product_ids"]) == e["gap_product_ids"]
+            assert r["covered"] + r["gaps"] == r["product_count"]
+        else:
+            assert (r["covered"], r["gaps"], r["gap_product_ids"]) == (None, None, [])
+
+
+def test_own_catalogs_are_not_competitors():
+    def product(pid, source, name, price=10.0):
+        return {"id": pid, "source": source, "name": name, "price": price, "url": ""}
+
+    by_source = {
+        "gibbon": [product(1, "gibbon", "Oak Hybrid Flooring")],
+        "gibbon_web": [product(2, "gibbon_web", "Oak Hybrid Flooring", 12.0)],
+        "kevmor": [product(3, "kevmor", "Carpet Adhesive")],
+        # Not in any code: a supplier added through supplier_config
+        "newco": [product(4, "newco", "Oak Hybrid Flooring", 11.0)],
+    }
+    rows = {r["source"]: r for r in insights.build_insight_rows(by_source, matching.build_match_rows(by_source))}
+    assert rows["gibbon"]["unique_count"] == 0
+    assert (rows["gibbon_web"]["covered"], rows["gibbon_web"]["gaps"]) == (None, None)
+    assert rows["kevmor"]["gap_product_ids"] == [3]
+    assert (rows["newco"]["covered"], rows["newco"]["gaps"]) == (1, 0)
+    # gibbon and gibbon_web are one seller: each is only ranked against newco
+    assert [(rows[s]["compared"], rows[s]["cheapest"], rows[s]["most_expensive"])
+            for s in ("gibbon", "gibbon_web", "newco")] == [(1, 1, 0), (1, 0, 1), (1, 0, 0)]
+    assert rows["newco"]["middle"] == 1
+
+    del by_source["newco"]
+    rows = {r["source"]: r for r in insights.build_insight_rows(by_source, matching.build_match_rows(by_source))}
+    assert rows["gibbon"]["unique_count"] == 1
+    assert rows["gibbon"]["compared"] == rows["gibbon_web"]["compared"] == 0
+
+
+def test_price_lists_largest_difference_first():
+    def product(pid, source, name, price):
+        return {"id": pid, "source": source, "name": name, "price": price, "url": ""}
+
+    by_source = {
+        "gibbon": [product(1, "gibbon", "Grey Vinyl", 30.0), product(2, "gibbon", "Natural Timber", 5.0),
+                   product(3, "gibbon", "Oak Hybrid", 10.0), product(4, "gibbon", "Wool Carpet", 15.0)],
+        "kevmor": [product(5, "kevmor", "Grey Vinyl", 20.0), product(6, "kevmor", "Natural Timber", 25.0),
+                   product(7, "kevmor", "Oak Hybrid", 10.25), product(8, "kevmor", "Wool Carpet", 20.0)],
+    }
+    match_rows = matching.build_match_rows(by_source)
+    rows = {r["source"]: r for r in insights.build_insight_rows(by_source, match_rows)}
+    gibbon = rows["gibbon"]
+    assert (gibbon["compared"], gibbon["cheapest"], gibbon["most_expensive"]) == (4, 3, 1)
+    # Oak Hybrid is cheaper by less than PRICE_MARGIN, so not listed
+    assert gibbon["price_advantages"] == [
+        {"product_id": 2, "name": "Natural Timber", "price": 5.0, "other_price": 25.0, "diff": 20.0},
+        {"product_id": 4, "name": "Wool Carpet", "price": 15.0, "other_price": 20.0, "diff": 5.0},
+    ]
+    assert [d["product_id"] for d in gibbon["price_disadvantages"]] == [1]
+    assert [a["product_id"] for a in rows["kevmor"]["price_advantages"]] == [5]
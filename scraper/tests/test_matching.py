@@ -0,0 +1,79 @@
+import random
+
+import matching
+
+
+def all_pairs_groups(products, threshold=matching.MATCH_THRESHOLD):
+    """The greedy grouping of insights.html runAnalysis(), scoring every pair."""
+    tokens = [matching.tokenize(p["name"]) for p in products]
+    used = [False] * len(products)
+    groups = []
+    for i in range(len(products)):
+        if used[i]:
+            continue
+        used[i] = True
+        group = [(i, 1.0)]
+        sources = {products[i]["source"]}
+        for j in range(i + 1, len(products)):
+            if used[j] or products[j]["source"] in sources:
+                continue
+            score = matching.similarity(tokens[i], tokens[j])
+            if score >= threshold:
+                group.append((j, score))
+                used[j] = True
+                sources.add(products[j]["source"])
+        if len(group) > 1:
+            groups.append(group)
+    return groups
+
+
+def random_catalog(seed, n=600):
+    rnd = random.Random(seed)
+    words = [f"w{i}" for i in range(40)] + ["oak", "grey", "natural", "timber", "vinyl", "the", "mm"]
+    products = [{"source": rnd.choice(matching.MATCH_SOURCES),
+                 "name": " ".join(rnd.sample(words, rnd.randint(1, 6)))} for _ in range(n)]
+    products.sort(key=lambda p: p["name"])
+    return products
+
+
+def test_match_groups_equals_all_pairs():
+    for seed in range(5):
+        products = random_catalog(seed)
+        for threshold in (0.25, matching.MATCH_THRESHOLD, 0.6):
+            assert matching.match_groups(products, threshold) == all_pairs_groups(products, threshold)
+
+
+def test_match_groups_one_product_per_source():
+    products = [
+        {"source": "gibbon", "name": "Oak Hybrid Flooring 6mm"},
+        {"source": "gibbon", "name": "Oak Hybrid Flooring 8mm"},
+        {"source": "kevmor", "name": "Hybrid Flooring Oak"},
+        {"source": "intafloors", "name": "Carpet Adhesive"},
+    ]
+    assert matching.match_groups(products) == [[(0, 1.0), (2, 0.75)]]
+
+
+def test_build_match_rows_excludes_replacement_parts():
+    by_source = {
+        "gibbon": [{"id": 1, "source": "gibbon", "name": "Floor Scraper", "url": ""},
+                   {"id": 2, "source": "gibbon", "name": "Floor Scraper Blade", "url": ""}],
+        "kevmor": [{"id": 3, "source": "kevmor", "name": "Floor Scraper Blade", "url": ""}],
+    }
+    rows = matching.build_match_rows(by_source)
+    assert [(r["group_id"], r["position"], r["product_id"]) for r in rows] == []
+    by_source["kevmor"].append({"id": 4, "source": "kevmor", "name": "Scraper Floor", "url": ""})
+    rows = matching.build_match_rows(by_source)
+    assert [(r["group_id"], r["position"], r["product_id"], r["score"]) for r in rows] == [
+        (1, 0, 1, 1.0), (1, 1, 4, 1.0)]
+
+
+def test_every_source_is_matched_after_the_page_sources():
+    assert matching.match_order(["marques", "kevmor", "gibbon_web", "gibbon"]) == \
+        ["gibbon", "kevmor", "gibbon_web", "marques"]
+    # Sources matched after the page's leave its groups as they were
+    products = random_catalog(1)
+    extra = [{"source": rnd_source, "name": p["name"]}
+             for rnd_source, p in zip(("marques", "homely") * 300, products)]
+    groups = matching.match_groups(products + extra)
+    page = [[m for m in g if m[0] < len(products)] for g in groups]
+    assert [g for g in page if len(g) > 1] == matching.match_groups(products)
@@ -0,0 +1,46 @@
+import pytest
+
+from product import Product, canonical_url
+
+
+@pytest.mark.parametrize("url, expected", [
+    ("", ""),
+    ("https://kevmor.com.au/adhesives/12-bond#/339-available_in-15_lt", "https://kevmor.com.au/adhesives/12-bond"),
+    ("https://kevmor.com.au/p?id=4#", "https://kevmor.com.au/p?id=4"),
+    # Tracking parameters go, in any case and position; the rest keep their order
+    ("https://a.com/p?utm_source=x&id=4&utm_medium=y", "https://a.com/p?id=4"),
+    ("https://a.com/p?FBCLID=1&size=2&gclid=3&colour=red", "https://a.com/p?size=2&colour=red"),
+    ("https://a.com/p?mc_cid=1&mc_eid=2", "https://a.com/p"),
+    ("https://a.com/p?Utm_Campaign", "https://a.com/p"),
+    # Only a prefix match on the parameter name, never on its value
+    ("https://a.com/p?ref=utm_x&gclidx=1", "https://a.com/p?ref=utm_x"),
+    # Left as written, not re-encoded
+    ("https://a.com/p?q=grey%20oak&x=a+b", "https://a.com/p?q=grey%20oak&x=a+b"),
+    # Default ports only
+    ("http://a.com:80/p", "http://a.com/p"),
+    ("https://a.com:443/p", "https://a.com/p"),
+    ("https://a.com:80/p", "https://a.com:80/p"),
+    ("http://a.com:8080/p", "http://a.com:8080/p"),
+    # Scheme and host are case-insensitive, the path isn't
+    ("HTTPS://Kevmor.COM.au/Adhesives/Bond", "https://kevmor.com.au/Adhesives/Bond"),
+])
+def test_canonical_url(url, expected):
+    assert canonical_url(url) == expected
+
+
+def test_canonical_url_is_idempotent():
+    url = "HTTPS://A.com:443/p?utm_source=x&id=4#top"
+    assert canonical_url(canonical_url(url)) == canonical_url(url)
+
+
+def test_product_reads_as_a_row():
+    p = Product.from_dict({"source": "kevmor", "name": "Bond", "price": 12.5,
+                           "url": "https://kevmor.com.au/bond#/1-size-2", "category": "Adhesives"})
+    assert p["url"] == "https://kevmor.com.au/bond"
+    assert p.get("sku") == "" and p.get("scraped_at") is None
+    assert p.get("updated_at", "missing") == "missing"
+    assert "updated_at" not in p and "search_name" in p
+    with pytest.raises(KeyError):
+        p["updated_at"]
+    assert dict(p)["price"] == 12.5
+    assert len(p) == len(dict(p))
@@ -0,0 +1,94 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import schedule
+
+NOW = datetime(2026, 10, 17, 6, 0, tzinfo=timezone.utc)
+
+
+def run(hours_ago, changed=0, products=1000, mode="full", **extra):
+    return {"started_at": (NOW - timedelta(hours=hours_ago)).isoformat(), "sync_mode": mode,
+            "product_count": products, "inserted_count": changed, "updated_count": 0,
+            "removed_count": 0, **extra}
+
+
+def daily_runs(changed, days=10, since=24):
+    """Successful runs a day apart, newest `since` hours ago, each changing `changed` products."""
+    return [run(since + 24 * d, changed) for d in range(days)]
+
+
+def test_change_rate_per_hour():
+    # 24 of 1000 products changed per 24h run: 0.1% an hour
+    assert schedule.change_rate(daily_runs(24), NOW) == pytest.approx(0.001)
+
+
+def test_change_rate_ignores_partial_runs_and_needs_two_runs():
+    runs = [run(1, 500, mode="partial")] + daily_runs(24)
+    assert schedule.change_rate(runs, NOW) == pytest.approx(0.001)
+    assert schedule.change_rate(daily_runs(24, days=1), NOW) is None
+
+
+def test_never_scraped_is_due():
+    plan = schedule.plan_supplier("a", [], NOW)
+    assert plan["due"] and plan["priority"] == 1.0
+
+
+def test_minimum_interval_wins_over_change_rate():
+    # Churning fast, but scraped 10h ago with a 20h minimum
+    plan = schedule.plan_supplier("a", daily_runs(500, since=10), NOW, min_hours=20)
+    assert not plan["due"]
+    assert "minimum" in plan["reason"]
+
+
+def test_maximum_interval_wins_over_change_rate():
+    # Nothing ever changes, but the last run is older than the maximum
+    plan = schedule.plan_supplier("a", daily_runs(0, since=100), NOW, min_hours=20, max_hours=96)
+    assert plan["due"]
+    assert "maximum" in plan["reason"]
+
+
+def test_rarely_changing_supplier_backs_off():
+    # 2 of 1000 products a day: 1% stale (DUE_STALENESS) after 120 hours
+    runs = daily_runs(2, since=48)
+    assert not schedule.plan_supplier("a", runs, NOW)["due"]
+    runs = daily_runs(2, since=130)
+    assert schedule.plan_supplier("a", runs, NOW)["due"]
+
+
+def test_fast_changing_supplier_is_due_after_the_minimum():
+    plan = schedule.plan_supplier("a", daily_runs(100, since=21), NOW, min_hours=20)
+    assert plan["due"]
+    assert plan["priority"] > schedule.DUE_STALENESS
+
+
+def test_supplier_config_intervals_are_respected():
+    runs = daily_runs(100, since=30)
+    assert not schedule.plan_supplier("a", runs, NOW, min_hours=48)["due"]
+    assert schedule.plan_supplier("a", daily_runs(0, since=30), NOW, min_hours=1, max_hours=24)["due"]
+
+
+def test_plan_categories_crawls_only_changing_categories():
+    categories = ["Adhesives", "Blades"]
+    runs = [run(24 * d + 24, category_seconds={"Adhesives": 10, "Blades": 5}) for d in range(5)]
+    # Half of Adhesives changed within the window, no Blades did
+    products = [{"category": "Adhesives", "scraped_at": (NOW - timedelta(hours=30)).isoformat()}] * 10 + \
+               [{"category": "Adhesives", "scraped_at": (NOW - timedelta(days=20)).isoformat()}] * 10 + \
+               [{"category": "Blades", "scraped_at": (NOW - timedelta(days=20)).isoformat()}] * 10
+    plan = schedule.plan_categories("kevmor", categories, runs, products, NOW)
+    assert plan["due"] and plan["categories"] == ["Adhesives"]
+
+
+def test_plan_categories_full_sweep_after_maximum():
+    runs = [run(200)]
+    plan = schedule.plan_categories("kevmor", ["Adhesives"], runs, [], NOW, max_hours=168)
+    assert plan["due"] and plan["categories"] is None
+
+
+def test_within_budget_defers_least_stale():
+    plans = [{"source": "a", "priority": 0.5, "seconds": 600},
+             {"source": "b", "priority": 0.9, "seconds": 600},
+             {"source": "c", "priority": 0.1, "seconds": 600}]
+    kept, deferred = schedule.within_budget(plans, budget_seconds=1200, workers=1)
+    assert [p["source"] for p in kept] == ["b", "a"]
+    assert [p["source"] for p in deferred] == ["c"]
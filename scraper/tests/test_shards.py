@@ -0,0 +1,115 @@
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import shards
+
+CATEGORIES = [f"Category {i}" for i in range(12)]
+
+
+def supplier(source, seconds, host=None, **extra):
+    return {"source": source, "host": host or source, "seconds": seconds, "categories": None, **extra}
+
+
+def kevmor(seconds, categories=None, rate=2.0):
+    return supplier("kevmor", seconds, categories=categories, splittable=CATEGORIES,
+                    category_seconds={c: 10 * (i + 1) for i, c in enumerate(CATEGORIES)}, rate=rate)
+
+
+def loads(units, count):
+    load = [0.0] * count
+    for u in units:
+        load[u["shard"] - 1] += u["seconds"]
+    return load
+
+
+def test_parse_shard():
+    assert shards.parse_shard("2/3") == (2, 3)
+    for text in ("0/3", "4/3", "x", "1-3"):
+        with pytest.raises(ValueError):
+            shards.parse_shard(text)
+
+
+def test_balance_spreads_cost():
+    suppliers = [supplier(f"s{i}", seconds) for i, seconds in enumerate([500, 400, 300, 300, 200, 100, 100])]
+    units = shards.balance(suppliers, 3)
+    load = loads(units, 3)
+    assert sum(load) == 1900
+    # Longest first onto the least loaded shard stays within one unit of even
+    assert max(load) - min(load) <= 100
+    assert sorted(u["source"] for u in units) == sorted(s["source"] for s in suppliers)
+
+
+def test_balance_keeps_hosts_together():
+    suppliers = [supplier("gibbon", 300, host="gibbon.com.au"), supplier("gibbon_web", 300, host="gibbon.com.au"),
+                 supplier("a", 300), supplier("b", 300)]
+    units = {u["source"]: u["shard"] for u in shards.balance(suppliers, 3)}
+    assert units["gibbon"] == units["gibbon_web"]
+
+
+def test_balance_splits_a_dominant_category_supplier():
+    units = shards.balance([kevmor(3000), supplier("a", 300), supplier("b", 300)], 3)
+    split = [u for u in units if u["source"] == "kevmor"]
+    assert all(u["split"] and u["full"] for u in split)
+    # Every category is assigned exactly once
+    assert Counter(c for u in split for c in u["categories"]) == Counter(CATEGORIES)
+    assert sum(u["seconds"] for u in split) == pytest.approx(3000, abs=1)
+    load = loads(units, 3)
+    assert max(load) - min(load) <= max(u["seconds"] for u in units)
+
+
+def test_balance_splits_only_the_planned_categories():
+    planned = CATEGORIES[:4]
+    units = shards.balance([kevmor(2000, planned), supplier("a", 100)], 2)
+    split = [u for u in units if u["source"] == "kevmor"]
+    assert sorted(c for u in split for c in u["categories"]) == sorted(planned)
+    assert not any(u["full"] for u in split)
+
+
+def test_balance_divides_rate_between_shards():
+    units = shards.balance([kevmor(3000), supplier("a", 300)], 3)
+    spanned = {u["shard"] for u in units if u["source"] == "kevmor"}
+    for u in units:
+        if u["source"] == "kevmor":
+            assert u["rate"] == pytest.approx(2.0 / len(spanned))
+        else:
+            assert u["rate"] is None
+
+
+def test_balance_keeps_a_small_category_supplier_whole():
+    units = shards.balance([kevmor(100), supplier("a", 300), supplier("b", 300)], 3)
+    kevmor_units = [u for u in units if u["source"] == "kevmor"]
+    assert len(kevmor_units) == 1 and not kevmor_units[0]["split"]
+    assert kevmor_units[0]["rate"] is None
+
+
+def test_balance_costs_unknown_durations_as_the_median():
+    units = shards.balance([supplier("a", 100), supplier("b", 300), supplier("c", None)], 2)
+    assert {u["source"]: u["seconds"] for u in units}["c"] == 200
+
+
+def test_plan_is_saved_once_and_expires(tmp_path):
+    now = datetime.now(timezone.utc)
+    plan = {"created_at": now.isoformat(), "shards": 2, "units": []}
+    assert shards.save_plan(plan, str(tmp_path))
+    assert not shards.save_plan({**plan, "created_at": (now + timedelta(seconds=1)).isoformat()}, str(tmp_path))
+    assert shards.load_plan(str(tmp_path), 2)["created_at"] == plan["created_at"]
+    assert shards.load_plan(str(tmp_path), 3) is None
+
+    stale = (now - timedelta(hours=shards.PLAN_MAX_AGE_HOURS + 1)).isoformat()
+    (tmp_path / "plan.json").write_text(f'{{"created_at": "{stale}", "shards": 2, "units": []}}')
+    assert shards.load_plan(str(tmp_path)) is None
+    assert shards.save_plan(plan, str(tmp_path))
+
+
+def test_combine_stats():
+    parts = [{"stats": {"request_count": 10, "wall_seconds": 50, "status_counts": {"200": 10},
+                        "category_seconds": {"A": 20}}},
+             {"stats": {"request_count": 5, "wall_seconds": 80, "status_counts": {"200": 4, "304": 1},
+                        "category_seconds": {"B": 30}}}]
+    combined = shards.combine_stats(parts)
+    assert combined["request_count"] == 15
+    assert combined["wall_seconds"] == 80
+    assert combined["status_counts"] == {"200": 14, "304": 1}
+    assert combined["category_seconds"] == {"A": 20, "B": 30}
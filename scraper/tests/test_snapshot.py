@@ -0,0 +1,78 @@
+import gzip
+import json
+
+import pytest
+
+import memdb
+import scrape
+import snapshot
+from memdb import MemorySupabase
+
+
+def product(i, source="acme", **extra):
+    return {"id": i, "source": source, "name": f"Product {i}", "price": 10.0 + i,
+            "price_display": f"${10 + i:.2f}", "url": f"https://{source}.example/p/{i}",
+            "image": f"https://cdn.example/{source}/{i}.jpg", "category": f"Category {i % 2}",
+            "sku": f"SKU-{i}", **extra}
+
+
+def test_shard_round_trip():
+    products = [product(1), product(2), product(3, price=None, price_display="", image="", category="",
+                                                  sku="", url="https://acme.example/")]
+    shard = snapshot.build_shard("acme", products)
+    # Repeated categories and directory prefixes are stored once
+    assert shard["categories"] == ["Category 1", "Category 0", ""]
+    assert shard["prefixes"] == ["https://acme.example/p/", "https://cdn.example/acme/",
+                                 "https://acme.example/", ""]
+    assert snapshot.decode_shard(json.loads(json.dumps(shard))) == products
+
+
+def test_manifest_is_stable_for_identical_input():
+    by_source = {"acme": [product(1), product(2)], "other": [product(3, "other")]}
+    first, files = snapshot.build_snapshot(by_source, {"acme": {"name": "Acme", "color": "#000"}})
+    second, again = snapshot.build_snapshot({"other": [product(3, "other")], "acme": [product(1), product(2)]},
+                                            {"acme": {"name": "Acme", "color": "#000"}})
+    assert first["version"] == second["version"]
+    assert {k: s["hash"] for k, s in first["shards"].items()} == {k: s["hash"] for k, s in second["shards"].items()}
+    assert files == again
+    assert gzip.decompress(files[first["shards"]["acme"]["path"] + ".gz"]) == files[first["shards"]["acme"]["path"]]
+
+    changed, _ = snapshot.build_snapshot({**by_source, "acme": [product(1), product(2, price=9.0)]})
+    assert changed["version"] != first["version"]
+    assert changed["shards"]["other"]["hash"] == first["shards"]["other"]["hash"]
+
+
+@pytest.fixture
+def db(monkeypatch):
+    client = MemorySupabase()
+    monkeypatch.setattr(scrape, "_supabase", client)
+    return client
+
+
+def test_unchanged_shards_are_not_uploaded_again(db, monkeypatch):
+    uploads = []
+    upload = memdb._Bucket.upload
+
+    def record(bucket, path, data, file_options=None):
+        uploads.append(path)
+        upload(bucket, path, data, file_options)
+
+    monkeypatch.setattr(memdb._Bucket, "upload", record)
+    db.table("products").insert([product(1), product(2), product(3, "other")]).execute()
+    first = scrape.publish_snapshot({})
+    assert sorted(uploads) == sorted(["manifest.json"] + [s["path"] + ext for s in first["shards"].values()
+                                                           for ext in ("", ".gz")])
+
+    uploads.clear()
+    db.table("products").upsert([product(2, price=9.0)], on_conflict="id").execute()
+    second = scrape.publish_snapshot({})
+    acme = second["shards"]["acme"]["path"]
+    assert sorted(uploads) == sorted(["manifest.json", acme, acme + ".gz"])
+    # The superseded acme shard is removed, the unchanged one kept
+    objects = db.storage.buckets[scrape.SNAPSHOT_BUCKET]
+    assert sorted(objects) == sorted(["manifest.json"] + [s["path"] + ext for s in second["shards"].values()
+                                                          for ext in ("", ".gz")])
+
+    uploads.clear()
+    scrape.publish_snapshot({})
+    assert uploads == ["manifest.json"]
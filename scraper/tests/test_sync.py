@@ -0,0 +1,114 @@
+import functools
+import json
+from datetime import datetime, timedelta, timezone
+from urllib.parse import quote
+
+import pytest
+
+import replay
+import scrape
+import storage
+from memdb import MemorySupabase
+
+NOW = datetime.now(timezone.utc).replace(microsecond=0)
+LAST_RUN = NOW - timedelta(hours=2)
+SINCE = LAST_RUN - scrape.SYNC_OVERLAP
+OLD = (NOW - timedelta(days=3)).isoformat()
+RECENT = (NOW - timedelta(minutes=30)).isoformat()
+
+
+@pytest.fixture
+def store(monkeypatch, tmp_path):
+    client = MemorySupabase()
+    store = storage.RestStore(lambda: client)
+    monkeypatch.setattr(scrape, "_store", store)
+    monkeypatch.setattr(scrape, "CHECKPOINT_DIR", str(tmp_path / "checkpoints"))
+    monkeypatch.setattr(scrape, "_host_buckets", {})
+    monkeypatch.setattr(scrape, "_host_breakers", {})
+    return store
+
+
+def log(store, hours_ago, mode="full"):
+    store.log_run({"source": "shop", "product_count": 10, "products_with_price": 10, "status": "success",
+                   "started_at": (NOW - timedelta(hours=hours_ago)).isoformat(), "sync_mode": mode})
+
+
+def test_sync_since(store):
+    assert scrape._sync_since("shop") is None  # Never scraped
+    log(store, 30, "full")
+    log(store, 2, "incremental")
+    assert scrape._sync_since("shop") == SINCE
+    assert scrape._sync_since("shop", "full") is None
+
+
+def test_full_sweep_due_after_full_sync_days(store):
+    log(store, 24 * scrape.FULL_SYNC_DAYS + 1, "full")
+    log(store, 2, "incremental")
+    assert scrape._sync_since("shop") is None
+    assert scrape._sync_since("shop", "incremental") == SINCE
+
+
+def shopify_product(i, updated_at, price=None):
+    p = replay._shopify_product(i)
+    if price is not None:
+        p["variants"][0]["price"] = f"{price:.2f}"
+    return {**p, "updated_at": updated_at}
+
+
+def shopify_fixture(full, changed):
+    fixture = replay.Fixture("shopify", "https://shop.example")
+    headers = {"Content-Type": "application/json"}
+    fixture.add(f"{replay.SHOPIFY_PRODUCTS_PATH}?limit=250&page=1", 200, headers,
+                json.dumps({"products": full}))
+    fixture.add(f"{replay.SHOPIFY_PRODUCTS_PATH}?limit=250&updated_at_min={quote(SINCE.isoformat())}&page=1",
+                200, headers, json.dumps({"products": changed}))
+    return fixture
+
+
+def test_incremental_run_merges_and_full_sweep_removes(store):
+    stored = [shopify_product(i, OLD) for i in range(3)]
+    changed = [
+        shopify_product(1, OLD, price=1.0),       # Not updated; the storefront ignored updated_at_min
+        shopify_product(2, RECENT, price=200.0),
+        shopify_product(3, RECENT),
+    ]
+    with replay.StubServer({"shop": shopify_fixture(changed[1:], changed)}) as stub:
+        base_url = stub.url("shop")
+        scrape.upsert_products("shop", [scrape.Product.from_dict(scrape._parse_shopify_product(p, base_url, "shop"))
+                                        for p in stored], LAST_RUN)
+        scraper = functools.partial(scrape._scrape_shopify, base_url, "shop", concurrency=1)
+
+        scrape._run_supplier("shop", scraper)
+        run = store.successful_runs("shop", 1)[0]
+        assert run["sync_mode"] == "incremental"
+        # Counts describe the merged catalog; nothing is removed
+        assert (run["product_count"], run["inserted_count"], run["updated_count"], run["removed_count"]) \
+            == (4, 1, 1, 0)
+        prices = {row["url"].rsplit("/", 1)[1]: row["price"]
+                  for row in store.load_products("shop", ("price",))}
+        assert len(prices) == 4
+        assert prices[changed[0]["handle"]] != 1.0
+        assert prices[changed[1]["handle"]] == 200.0
+
+        scrape._run_supplier("shop", scraper, sync="full")
+        run = store.successful_runs("shop", 1)[0]
+        assert (run["sync_mode"], run["product_count"], run["removed_count"]) == ("full", 2, 2)
+        assert len(store.load_products("shop", ("price",))) == 2
+
+
+def test_woocommerce_first_page_400_is_an_error():
+    fixture = replay.generate("woocommerce", pages=2, per_page=3)
+    fixture.add(f"{replay.WOOCOMMERCE_PRODUCTS_PATH}per_page=100&page=1", 400,
+                {"Content-Type": "application/json"}, '{"code": "rest_invalid_param"}')
+    with replay.StubServer({"woo": fixture}) as stub:
+        with pytest.raises(scrape.ScrapeError, match="page 1: HTTP 400"):
+            list(scrape._scrape_woocommerce(stub.url("woo"), "woo"))
+
+
+def test_woocommerce_400_past_the_last_page_ends_the_catalog():
+    fixture = replay.generate("woocommerce", pages=2, per_page=3)
+    # Without a page count, pages are requested until the Store API rejects one
+    del fixture.responses[f"{replay.WOOCOMMERCE_PRODUCTS_PATH}per_page=100&page=1"]["headers"]["X-WP-TotalPages"]
+    with replay.StubServer({"woo": fixture}) as stub:
+        batches = list(scrape._scrape_woocommerce(stub.url("woo"), "woo", concurrency=1))
+    assert [len(rows) for _, rows in batches] == [3, 3]
@@ -0,0 +1,200 @@
+import os
+from datetime import datetime, timezone
+
+import pytest
+
+import scrape
+import storage
+from memdb import MemorySupabase
+
+
+@pytest.fixture
+def db(monkeypatch, tmp_path):
+    client = MemorySupabase()
+    monkeypatch.setattr(scrape, "_supabase", client)
+    monkeypatch.setattr(scrape, "_store", storage.RestStore(lambda: client))
+    monkeypatch.setattr(scrape, "CHECKPOINT_DIR", str(tmp_path / "checkpoints"))
+    return client
+
+
+def products(n, price=10.0, start=0):
+    return [scrape.Product("acme", f"Product {i}", price, f"${price:.2f}", f"https://acme.example/p/{i}")
+            for i in range(start, start + n)]
+
+
+def stored_urls(db, source="acme"):
+    return sorted(row["url"] for row in db.tables.get("products", []) if row["source"] == source)
+
+
+def log_rows(db):
+    return db.tables.get("scrape_log", [])
+
+
+def scraper(*batches):
+    """A scraper function yielding `batches`, resumable by batch index."""
+    def scrape_func(stats=None, start=0):
+        for i, batch in enumerate(batches[start:], start + 1):
+            yield i, batch
+    return scrape_func
+
+
+def test_shrunken_catalog_keeps_stored_products(db):
+    scrape.upsert_products("acme", products(10), datetime.now(timezone.utc))
+    before = stored_urls(db)
+
+    scrape._run_supplier("acme", scraper(products(4)))
+    assert stored_urls(db) == before
+    assert log_rows(db)[-1]["status"].startswith("error: acme: found 4 products")
+
+    # --allow-shrink
+    scrape._run_supplier("acme", scraper(products(4)), min_completeness=0)
+    assert stored_urls(db) == sorted(p.url for p in products(4))
+    assert (log_rows(db)[-1]["status"], log_rows(db)[-1]["removed_count"]) == ("success", 6)
+
+
+def test_shrink_guard_raises_from_close(db):
+    scrape.upsert_products("acme", products(10), datetime.now(timezone.utc))
+    writer = scrape.ProductWriter("acme", datetime.now(timezone.utc))
+    writer.put(None, products(4))
+    with pytest.raises(scrape.IncompleteScrapeError):
+        writer.close()
+    assert len(stored_urls(db)) == 10
+
+
+@pytest.fixture(params=["rest", "sqlite"])
+def store(request, monkeypatch, tmp_path):
+    if request.param == "rest":
+        client = MemorySupabase()
+        store = storage.RestStore(lambda: client)
+    else:
+        store = storage.SqliteStore(str(tmp_path / "scrape.sqlite"))
+    monkeypatch.setattr(scrape, "_store", store)
+    monkeypatch.setattr(scrape, "CHECKPOINT_DIR", str(tmp_path / "checkpoints"))
+    yield store
+    store.close()
+
+
+def stored(store, source="acme"):
+    return {row["url"]: row for row in store.load_products(source, ("name", "price"))}
+
+
+def last_run(store, source="acme"):
+    return store.successful_runs(source, 1)[0]
+
+
+def test_rerun_writes_only_changed_rows_and_removes_unseen(store, monkeypatch):
+    scrape.upsert_products("acme", products(10), datetime.now(timezone.utc))
+    ids = {url: row["id"] for url, row in stored(store).items()}
+
+    written = []
+    write = store.write
+    monkeypatch.setattr(store, "write", lambda source, rows, history: (
+        written.append(([r["url"] for r in rows], [h["url"] for h in history])), write(source, rows, history)))
+    # Product 0 repriced, 1-7 unchanged, 8-9 delisted, 10 new
+    rerun = products(1, price=12.0) + products(7, start=1) + products(1, start=10)
+    scrape.upsert_products("acme", rerun, datetime.now(timezone.utc))
+
+    changed = [products(1)[0].url, products(1, start=10)[0].url]
+    assert written == [(changed, changed)]
+    rows = stored(store)
+    assert sorted(rows) == sorted(p.url for p in rerun)
+    assert rows[changed[0]]["price"] == 12.0
+    # Updated in place, not re-inserted
+    assert all(rows[url]["id"] == ids[url] for url in ids if url in rows)
+    run = last_run(store)
+    assert (run["product_count"], run["inserted_count"], run["updated_count"], run["removed_count"]) == (9, 1, 1, 2)
+
+
+def test_resumed_run_keeps_products_written_before_the_crash(store):
+    first, second = products(5), products(5, start=5)
+    scrape.upsert_products("acme", first + second, datetime.now(timezone.utc))
+    # Both halves change, so the interrupted run writes the first
+    first, second = products(5, price=11.0), products(5, price=11.0, start=5)
+
+    def crashing(stats=None, start=0):
+        yield 1, first
+        raise scrape.ScrapeError("connection lost")
+
+    scrape._run_supplier("acme", crashing)
+    assert last_run(store)["product_count"] == 10  # Only the first, complete run succeeded
+
+    # Resumes after the first batch; its urls, restored from the checkpoint, count as seen
+    scrape._run_supplier("acme", scraper(first, second))
+    rows = stored(store)
+    assert sorted(rows) == sorted(p.url for p in first + second)
+    assert all(row["price"] == 11.0 for row in rows.values())
+    run = last_run(store)
+    assert (run["product_count"], run["updated_count"], run["removed_count"]) == (10, 10, 0)
+    assert not os.path.exists(os.path.join(scrape.CHECKPOINT_DIR, "acme.jsonl"))
+
+
+def test_price_history_records_first_sighting_and_price_changes(store):
+    scrape.upsert_products("acme", products(3), datetime.now(timezone.utc))
+    first = scrape.price_series("acme")
+    assert sorted(first) == sorted(p.url for p in products(3))
+    assert all([point[1:] for point in points] == [(10.0, "$10.00")] for points in first.values())
+
+    rerun = products(3)
+    rerun[0].price, rerun[0].price_display = 12.0, "$12.00"
+    rerun[1].description = "Now with a description"  # Not a price change
+    scrape.upsert_products("acme", rerun, datetime.now(timezone.utc))
+
+    series = scrape.price_series("acme")
+    assert [point[1] for point in series[rerun[0].url]] == [10.0, 12.0]
+    assert all(len(series[p.url]) == 1 for p in rerun[1:])
+    assert scrape.price_series("acme", url=rerun[0].url) == {rerun[0].url: series[rerun[0].url]}
+    changed_at = datetime.fromisoformat(series[rerun[0].url][1][0])
+    assert scrape.price_series("acme", since=changed_at) == {rerun[0].url: series[rerun[0].url][1:]}
+
+
+def test_sqlite_store_applies_nothing_from_a_rejected_run(tmp_path, monkeypatch):
+    store = storage.SqliteStore(str(tmp_path / "scrape.sqlite"))
+    monkeypatch.setattr(scrape, "_store", store)
+    scrape.upsert_products("acme", products(10), datetime.now(timezone.utc))
+
+    writer = scrape.ProductWriter("acme", datetime.now(timezone.utc))
+    writer.put(None, products(4, price=99.0))
+    with pytest.raises(scrape.IncompleteScrapeError):
+        writer.close()
+    assert all(row["price"] == 10.0 for row in stored(store).values())
+    assert all(len(points) == 1 for points in scrape.price_series("acme").values())
+    # The discarded rows don't resurface with the next complete run
+    scrape.upsert_products("acme", products(10), datetime.now(timezone.utc))
+    assert all(row["price"] == 10.0 for row in stored(store).values())
+    store.close()
+
+
+def test_rest_store_keeps_rows_upserted_by_a_rejected_run(db):
+    scrape.upsert_products("acme", products(10), datetime.now(timezone.utc))
+
+    writer = scrape.ProductWriter("acme", datetime.now(timezone.utc))
+    writer.put(None, products(4, price=99.0))
+    with pytest.raises(scrape.IncompleteScrapeError):
+        writer.close()
+    # Nothing is deleted or logged as a success, but the batch is already written
+    prices = sorted(row["price"] for row in stored(scrape._store).values())
+    assert prices == [10.0] * 6 + [99.0] * 4
+    assert not any(row["status"] == "success" for row in log_rows(db)[1:])
+
+
+def test_finalize_counts_a_product_two_shares_saw_once(db):
+    scrape.upsert_products("acme", products(6), datetime.now(timezone.utc))
+    started = datetime.now(timezone.utc)
+    # Both shares load the catalog before either writes, as when run side by side
+    shares = [scrape.ProductWriter("acme", started, deferred=True) for _ in range(2)]
+    shares[0].put(None, products(1, price=12.0, start=1) + products(6, start=2))  # 1 repriced, 6-7 new
+    shares[1].put(None, products(4, start=6))                                     # 6-7 again, 8-9 new
+    parts = []
+    for shard, writer in enumerate(shares, 1):
+        writer.close()
+        parts.append({"shard": shard, "status": "success", "started_at": started.isoformat(),
+                      "urls": list(writer.seen), "priced": list(writer.priced),
+                      "inserted": list(writer.inserted), "updated": list(writer.updated),
+                      "price_changed": list(writer.price_changed), "stats": writer.stats.log_columns()})
+
+    scrape._finalize_split("acme", True, {1, 2}, parts, started.isoformat(), scrape.MIN_COMPLETENESS)
+    run = log_rows(db)[-1]
+    assert run["status"] == "success"
+    assert (run["product_count"], run["inserted_count"], run["updated_count"], run["removed_count"]) \
+        == (9, 4, 1, 1)
+    assert stored_urls(db) == sorted(p.url for p in products(9, start=1))
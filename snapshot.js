@@ -0,0 +1,76 @@
+// Sharded catalog snapshot loader
+// The scraper publishes one content-hashed shard per supplier plus a manifest
+// (see scraper/snapshot.py). Shards already in the browser cache under the
+// same hash are reused; only changed shards are downloaded.
+
+const SNAPSHOT_CACHE = 'gibbon-snapshot-v1';
+
+async function fetchSnapshotFile(baseUrl, path, headers) {
+    const res = await fetch(`${baseUrl}/${path}`, { headers, cache: 'no-store' });
+    if (!res.ok) throw new Error(`Snapshot ${path}: HTTP ${res.status}`);
+    return res;
+}
+
+async function readShard(baseUrl, info, headers, cache) {
+    // Shard paths contain their content hash, so a cached copy is never stale
+    const key = `${baseUrl}/${info.path}`;
+    let res = cache ? await cache.match(key) : null;
+    if (!res) {
+        let body;
+        if (typeof DecompressionStream !== 'undefined') {
+            const gz = await fetchSnapshotFile(baseUrl, info.path + '.gz', headers);
+            body = await new Response(gz.body.pipeThrough(new DecompressionStream('gzip'))).text();
+        } else {
+            body = await (await fetchSnapshotFile(baseUrl, info.path, headers)).text();
+        }
+        res = new Response(body, { headers: { 'Content-Type': 'application/json' } });
+        if (cache) await cache.put(key, res.clone());
+    }
+    return res.json();
+}
+
+function decodeShard(source, shard) {
+    const col = Object.fromEntries(shard.columns.map((c, i) => [c, i]));
+    return shard.products.map(r => ({
+        id: r[col.id],
+        source,
+        name: r[col.name],
+        price: r[col.price],
+        price_display: r[col.price_display],
+        url: shard.prefixes[r[col.url_prefix]] + r[col.url],
+        image: shard.prefixes[r[col.image_prefix]] + r[col.image],
+        category: shard.categories[r[col.category]],
+        sku: r[col.sku],
+    }));
+}
+
+// Returns { version, timestamp, products } with products shaped like rows of
+// the products table, grouped by source and sorted by name within each.
+async function loadSnapshot(baseUrl, headers = {}) {
+    const manifest = await (await fetchSnapshotFile(baseUrl, 'manifest.json', headers)).json();
+    const cache = ('caches' in window) ? await caches.open(SNAPSHOT_CACHE).catch(() => null) : null;
+
+    const entries = Object.entries(manifest.shards);
+    const shards = await Promise.all(entries.map(([, info]) => readShard(baseUrl, info, headers, cache)));
+
+    if (cache) {
+        // Drop shards superseded by this manifest
+        const live = new Set(entries.map(([, info]) => `${baseUrl}/${info.path}`));
+        for (const req of await cache.keys()) {
+            if (req.url.startsWith(baseUrl) && !live.has(req.url)) await cache.delete(req);
+        }
+    }
+
+    const products = [];
+    entries.forEach(([source], i) => products.push(...decodeShard(source, shards[i])));
+    return { version: manifest.version, timestamp: manifest.generated_at, products };
+}
+
+// True when products were written after the snapshot was generated, given
+// the latest write timestamps (products.scraped_at, scrape_log.completed_at):
+// a scrape that didn't republish it, or an out-of-band write such as an
+// import, which the snapshot wouldn't show until the next scrape.
+function snapshotIsStale(snapshot, writes) {
+    const generated = Date.parse(snapshot.timestamp);
+    return writes.some(t => t && Date.parse(t) > generated);
+}
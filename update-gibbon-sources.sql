@@ -22,5 +22,8 @@ UPDATE supplier_config
 SET enabled = true, name = 'Gibbon Trade (Legacy)'
 WHERE key = 'gibbon';
 
+-- Both are Gibbon's own catalogs, not competitors (needs schema.sql's home column)
+UPDATE supplier_config SET home = true WHERE key IN ('gibbon', 'gibbon_csv', 'gibbon_web');
+
 -- Check the results
-SELECT key, name, enabled, color FROM supplier_config ORDER BY key;
+SELECT key, name, enabled, home, color FROM supplier_config ORDER BY key;